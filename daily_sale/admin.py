@@ -0,0 +1,53 @@
+# daily_sale/admin.py
+from django.contrib import admin
+from django.utils import timezone
+from .models import DailySummary, MonthlySummary, YearlySummary
+from .utils import correct_daily_summary, finalize_summary_dates
+
+
+class ReadOnlySummaryAdmin(admin.ModelAdmin):
+    """Summary rows are derived from transactions; they are never edited by hand."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailySummary)
+class DailySummaryAdmin(ReadOnlySummaryAdmin):
+    list_display = ("date", "total_sales", "total_purchases", "transactions_count", "total_outstanding", "is_final", "updated_at")
+    list_filter = ("is_final",)
+    date_hierarchy = "date"
+    ordering = ("-date",)
+    list_per_page = 50
+    actions = ["finalize_selected", "correct_selected"]
+
+    def finalize_selected(self, request, queryset):
+        today = timezone.now().date()
+        dates = list(queryset.filter(date__lt=today, is_final=False).values_list("date", flat=True))
+        finalized = finalize_summary_dates(dates) if dates else 0
+        self.message_user(request, f"{finalized} day(s) finalized.")
+    finalize_selected.short_description = "Close selected days (finalize)"
+
+    def correct_selected(self, request, queryset):
+        dates = list(queryset.filter(is_final=True).values_list("date", flat=True))
+        for target_date in dates:
+            correct_daily_summary(target_date)
+        self.message_user(request, f"{len(dates)} finalized day(s) recomputed.")
+    correct_selected.short_description = "Recompute selected finalized days (correction)"
+
+
+@admin.register(MonthlySummary)
+class MonthlySummaryAdmin(ReadOnlySummaryAdmin):
+    list_display = ("year", "month", "total_sales", "total_purchases", "transactions_count", "days_count", "is_final")
+    list_filter = ("is_final", "year")
+    ordering = ("-year", "-month")
+
+
+@admin.register(YearlySummary)
+class YearlySummaryAdmin(ReadOnlySummaryAdmin):
+    list_display = ("year", "total_sales", "total_purchases", "transactions_count", "days_count", "is_final")
+    list_filter = ("is_final",)
+    ordering = ("-year",)
@@ -0,0 +1,122 @@
+# daily_sale/autocomplete_index.py
+"""
+Optional in-process autocomplete index (``DAILY_SALE_AUTOCOMPLETE_INDEX``).
+
+Each worker lazily builds, per search target, a sorted array of normalized
+tokens (whole field values and their words) and answers prefix lookups with
+``bisect`` instead of a database round trip. A version counter in the shared
+cache is bumped by the model signals; a worker rebuilds a target's index the
+next time it sees a different version.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from django.core.cache import cache
+from .search import TARGETS, search_terms
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "daily_sale:autocomplete_version"
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def normalize(value):
+    return " ".join(str(value or "").casefold().split())
+
+
+class PrefixIndex:
+    def __init__(self, entries):
+        """``entries``: ``(result, field_values)`` pairs in display order."""
+        self.results = []
+        self.values = []
+        pairs = []
+        for position, (result, field_values) in enumerate(entries):
+            values = [v for v in map(normalize, field_values) if v]
+            tokens = set(values)
+            for value in values:
+                tokens.update(value.split())
+            pairs.extend((token, position) for token in tokens)
+            self.results.append(result)
+            self.values.append(values)
+        pairs.sort()
+        self.tokens = [token for token, _ in pairs]
+        self.positions = [position for _, position in pairs]
+
+    def _matching(self, term):
+        start = bisect_left(self.tokens, term)
+        end = bisect_left(self.tokens, term + "￿", start)
+        return set(self.positions[start:end])
+
+    def lookup(self, q, limit):
+        terms = [normalize(term) for term in search_terms(q)]
+        if not terms:
+            return self.results[:limit]
+        matches = None
+        for term in terms:
+            matches = self._matching(term) if matches is None else matches & self._matching(term)
+            if not matches:
+                return []
+        # Rows where a whole field starts with the query come first, then display order.
+        phrase = " ".join(terms)
+        ranked = sorted(
+            matches,
+            key=lambda p: (not any(value.startswith(phrase) for value in self.values[p]), p),
+        )
+        return [self.results[p] for p in ranked[:limit]]
+
+
+def _field_value(obj, path):
+    for part in path.split("__"):
+        obj = getattr(obj, part, None) if obj is not None else None
+    return obj
+
+
+def build_index(target):
+    started = time.perf_counter()
+    entries = [
+        ({"id": obj.pk, "text": target.text(obj)}, [_field_value(obj, field) for field in target.fields])
+        for obj in target.queryset().order_by(target.order_by).iterator(chunk_size=2000)
+    ]
+    index = PrefixIndex(entries)
+    logger.info(
+        f"Built autocomplete index '{target.kind}': {len(entries)} rows in {(time.perf_counter() - started) * 1000:.0f}ms"
+    )
+    return index
+
+
+def current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a counter lost from the cache never reuses an old value.
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+
+
+def get_index(kind):
+    version = current_version()
+    cached = _indexes.get(kind)
+    if cached and cached[0] == version:
+        return cached[1]
+    with _lock:
+        cached = _indexes.get(kind)
+        if cached and cached[0] == version:
+            return cached[1]
+        index = build_index(TARGETS[kind])
+        _indexes[kind] = (version, index)
+        return index
+
+
+def lookup(kind, q, limit):
+    """``[{id, text}]`` for ``kind`` from this worker's index."""
+    return get_index(kind).lookup(q, limit)
@@ -0,0 +1,162 @@
+# daily_sale/item_autofill.py
+"""
+Cached invoice-line autofill payloads for ``ajax_item_autofill``.
+
+Each item's payload is built from one ``.values()`` projection over the item,
+its container and the container's company, and kept in Django's cache under a
+per-item key together with an ETag derived from the payload, so every worker
+hands out the same validator for the same data. Signals drop the key when the
+item, its container or that container's company changes.
+"""
+import hashlib
+import json
+import logging
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from containers.models import Inventory_List
+
+logger = logging.getLogger(__name__)
+
+AUTOFILL_KEY = "daily_sale:item_autofill:{}"
+MAX_AUTOFILL_ITEMS = 100
+AUTOFILL_FIELDS = (
+    "id", "product_name", "code", "make", "model", "description", "date_added",
+    "unit_price", "price", "sold_price", "in_stock_qty", "total_sold_qty", "total_sold_count",
+    "container_id", "container__name", "container__container_number",
+    "container__company_id", "container__company__name", "container__company__address",
+    "container__company__phone", "container__company__email",
+)
+
+
+def _timeout():
+    return getattr(settings, "DAILY_SALE_LOOKUP_CACHE_TIMEOUT", 60 * 60)
+
+
+def _key(item_id):
+    return AUTOFILL_KEY.format(item_id)
+
+
+def parse_item_ids(values):
+    """Valid item UUIDs from ``item_ids`` values (repeated and/or comma separated), in order, capped."""
+    item_ids = []
+    for value in values:
+        for part in value.split(","):
+            try:
+                item_id = str(uuid.UUID(part.strip()))
+            except ValueError:
+                continue
+            if item_id not in item_ids:
+                item_ids.append(item_id)
+    return item_ids[:MAX_AUTOFILL_ITEMS]
+
+
+def _number(value):
+    return float(value) if value else 0.0
+
+
+def _payload(row):
+    container = company = None
+    container_name = container_identifier = company_name = None
+    if row["container_id"]:
+        container_name = row["container__name"] or row["container__container_number"]
+        container_identifier = row["container__container_number"]
+        container = {
+            "id": str(row["container_id"]),
+            "text": container_name,
+            "name": container_name,
+            "identifier": container_identifier,
+        }
+    if row["container__company_id"]:
+        company_name = row["container__company__name"]
+        company = {
+            "id": str(row["container__company_id"]),
+            "text": company_name,
+            "name": company_name,
+            "address": row["container__company__address"] or "",
+            "phone": row["container__company__phone"] or "",
+            "email": row["container__company__email"] or "",
+        }
+
+    unit_price = row["unit_price"]
+    in_stock = row["in_stock_qty"]
+    return {
+        "id": str(row["id"]),
+        "unit_price": _number(unit_price),
+        "price": _number(row["price"]),
+        "sold_price": _number(row["sold_price"]),
+        "available_quantity": _number(in_stock),
+        "total_sold_qty": _number(row["total_sold_qty"]),
+        "total_sold_count": row["total_sold_count"] or 0,
+        "container": container,
+        "container_id": container and container["id"],
+        "container_name": container_name,
+        "container_identifier": container_identifier,
+        "company": company,
+        "company_id": company and company["id"],
+        "company_name": company_name,
+        "product_name": row["product_name"],
+        "model": row["model"] or "",
+        "description": row["description"] or "",
+        "code": row["code"] or "",
+        "make": row["make"] or "",
+        "date_added": row["date_added"].strftime('%Y-%m-%d') if row["date_added"] else "",
+        "display_info": {
+            "product": f"{row['code']} - {row['product_name']}" if row["code"] else row["product_name"],
+            "container": (
+                f"{container_name} ({container_identifier})"
+                if container_name and container_identifier and container_name != container_identifier
+                else container_name or ""
+            ),
+            "company": company_name or "",
+            "price": f"AED {unit_price:,.0f}" if unit_price else "AED 0",
+            "stock": f"{in_stock:,.0f} in stock" if in_stock else "Out of stock",
+        },
+    }
+
+
+def _entry(data):
+    body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return {"data": data, "etag": hashlib.md5(body.encode()).hexdigest()}
+
+
+def autofill_entries(item_ids):
+    """
+    ``{item_id: {data, etag}}`` for the existing items among
+    ``item_ids``; cache misses are filled with one query.
+    """
+    keys = {item_id: _key(item_id) for item_id in item_ids}
+    cached = cache.get_many(list(keys.values()))
+    entries = {item_id: cached[key] for item_id, key in keys.items() if key in cached}
+
+    missing = [item_id for item_id in item_ids if item_id not in entries]
+    if missing:
+        fresh = {}
+        for row in Inventory_List.objects.filter(pk__in=missing).values(*AUTOFILL_FIELDS):
+            entry = _entry(_payload(row))
+            fresh[entry["data"]["id"]] = entry
+        if fresh:
+            cache.set_many({_key(item_id): entry for item_id, entry in fresh.items()}, _timeout())
+        entries.update(fresh)
+    return entries
+
+
+def combined_etag(entries, item_ids):
+    """Strong ETag for a response covering ``item_ids``, missing ids included."""
+    parts = [f"{item_id}:{entries[item_id]['etag'] if item_id in entries else '-'}" for item_id in item_ids]
+    return '"{}"'.format(hashlib.md5("|".join(parts).encode()).hexdigest())
+
+
+def invalidate_item_autofill(item_ids):
+    keys = [_key(item_id) for item_id in item_ids]
+    if keys:
+        cache.delete_many(keys)
+
+
+def container_item_ids(container_id):
+    return list(Inventory_List.objects.filter(container_id=container_id).values_list("pk", flat=True))
+
+
+def company_item_ids(company_id):
+    return list(Inventory_List.objects.filter(container__company_id=company_id).values_list("pk", flat=True))
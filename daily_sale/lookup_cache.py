@@ -0,0 +1,90 @@
+# daily_sale/lookup_cache.py
+"""
+Cached "active parties" index: customers and companies that appear on at
+least one DailySaleTransaction. Building it needs a DISTINCT join over the
+transactions table, so the result lives in Django's cache (any backend,
+locmem included) until a transaction signal invalidates it.
+"""
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from accounts.models import Company, UserProfile
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_CUSTOMERS_KEY = "daily_sale:active_customers"
+ACTIVE_COMPANIES_KEY = "daily_sale:active_companies"
+
+
+def _timeout():
+    return getattr(settings, "DAILY_SALE_LOOKUP_CACHE_TIMEOUT", 60 * 60)
+
+
+def _customer_entry(profile):
+    user = profile.user
+    text = profile.full_name or (user.get_full_name() if user else "") or str(profile)
+    search = " ".join(filter(None, [
+        user.first_name if user else "", user.last_name if user else "", user.email if user else "",
+        profile.first_name, profile.last_name, profile.phone,
+    ])).lower()
+    return {"id": str(profile.pk), "text": text, "phone": profile.phone, "search": search}
+
+
+def active_customers():
+    """Customers with transactions, ordered by first name, as ``{id, text, phone, search}`` dicts."""
+    entries = cache.get(ACTIVE_CUSTOMERS_KEY)
+    if entries is None:
+        profiles = UserProfile.objects.filter(
+            pk__in=_active_ids("customer_id")
+        ).select_related("user").order_by("user__first_name")
+        entries = [_customer_entry(p) for p in profiles]
+        cache.set(ACTIVE_CUSTOMERS_KEY, entries, _timeout())
+    return entries
+
+
+def active_companies():
+    """Companies with transactions, ordered by name, as ``{id, text, search}`` dicts."""
+    entries = cache.get(ACTIVE_COMPANIES_KEY)
+    if entries is None:
+        companies = Company.objects.filter(pk__in=_active_ids("company_id")).order_by("name")
+        entries = [{"id": str(c.pk), "text": c.name, "search": c.name.lower()} for c in companies]
+        cache.set(ACTIVE_COMPANIES_KEY, entries, _timeout())
+    return entries
+
+
+def _active_ids(field):
+    from .models import DailySaleTransaction
+    return DailySaleTransaction.objects.filter(**{f"{field}__isnull": False}).order_by().values(field)
+
+
+def search_entries(entries, q, limit):
+    """Substring match on the cached ``search`` text, keeping the cached order."""
+    q = (q or "").strip().lower()
+    results = []
+    for entry in entries:
+        if not q or q in entry["search"]:
+            results.append({"id": entry["id"], "text": entry["text"]})
+            if len(results) >= limit:
+                break
+    return results
+
+
+def invalidate_active_parties():
+    cache.delete_many([ACTIVE_CUSTOMERS_KEY, ACTIVE_COMPANIES_KEY])
+
+
+def note_transaction_parties(customer_ids=(), company_ids=()):
+    """
+    Called after transaction writes: drop the cached index only when a party
+    is missing from it (new customer/company on the books).
+    """
+    try:
+        for key, ids in ((ACTIVE_CUSTOMERS_KEY, customer_ids), (ACTIVE_COMPANIES_KEY, company_ids)):
+            ids = {str(i) for i in ids if i}
+            if not ids:
+                continue
+            entries = cache.get(key)
+            if entries is not None and not ids <= {entry["id"] for entry in entries}:
+                cache.delete(key)
+    except Exception as e:
+        logger.exception(f"Error updating active parties cache: {str(e)}")
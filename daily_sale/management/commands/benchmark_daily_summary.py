@@ -0,0 +1,47 @@
+# daily_sale/management/commands/benchmark_daily_summary.py
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from daily_sale.models import DailySaleTransaction
+from daily_sale.utils import recompute_daily_summary_for_date
+
+
+class Command(BaseCommand):
+    help = "Measure queries and time spent by recompute_daily_summary_for_date."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="YYYY-MM-DD (defaults to the busiest day)")
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def handle(self, *args, **options):
+        if options["date"]:
+            try:
+                target_date = date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError("--date must be YYYY-MM-DD")
+        else:
+            busiest = (
+                DailySaleTransaction.objects.order_by().values("date")
+                .annotate(n=Count("id")).order_by("-n").first()
+            )
+            if not busiest:
+                raise CommandError("No transactions to benchmark.")
+            target_date = busiest["date"]
+
+        day_size = DailySaleTransaction.objects.filter(date=target_date).count()
+        repeat = max(options["repeat"], 1)
+        queries = 0
+        started = time.perf_counter()
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                recompute_daily_summary_for_date(target_date)
+            queries += len(ctx.captured_queries)
+        elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+
+        self.stdout.write(
+            f"{target_date}: {day_size} transactions, "
+            f"{queries / repeat:.1f} queries and {elapsed_ms:.2f} ms per recompute"
+        )
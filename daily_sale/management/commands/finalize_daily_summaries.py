@@ -0,0 +1,42 @@
+# daily_sale/management/commands/finalize_daily_summaries.py
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from daily_sale.utils import correct_daily_summary, finalize_daily_summaries
+
+
+class Command(BaseCommand):
+    help = "Close past days: recompute and freeze DailySummary (and finished month/year rollups)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--up-to", help="YYYY-MM-DD, last day to close (defaults to yesterday)")
+        parser.add_argument("--start", help="YYYY-MM-DD, first day to recompute before closing")
+        parser.add_argument(
+            "--correct", action="append", default=[], metavar="YYYY-MM-DD",
+            help="Rebuild an already finalized day from current transactions (repeatable)",
+        )
+
+    def _parse(self, value, name):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"--{name} must be YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        if options["correct"]:
+            for value in options["correct"]:
+                target_date = self._parse(value, "correct")
+                correct_daily_summary(target_date)
+                self.stdout.write(f"Corrected {target_date}")
+            return
+
+        yesterday = timezone.now().date() - timedelta(days=1)
+        up_to = self._parse(options["up_to"], "up-to") if options["up_to"] else yesterday
+        if up_to > yesterday:
+            raise CommandError("Only past days can be finalized.")
+        start = self._parse(options["start"], "start") if options["start"] else None
+
+        days, months, years = finalize_daily_summaries(up_to, start_date=start)
+        self.stdout.write(self.style.SUCCESS(
+            f"Finalized up to {up_to}: {days} day(s), {months} month(s), {years} year(s)"
+        ))
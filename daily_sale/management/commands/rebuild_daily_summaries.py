@@ -0,0 +1,48 @@
+# daily_sale/management/commands/rebuild_daily_summaries.py
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from daily_sale.utils import recompute_daily_summaries_for_range, summary_date_bounds
+
+
+class Command(BaseCommand):
+    help = "Rebuild DailySummary rows for a date range with grouped queries and one bulk upsert per chunk."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="YYYY-MM-DD (defaults to the earliest transaction or summary)")
+        parser.add_argument("--end", help="YYYY-MM-DD (defaults to the latest transaction or summary)")
+        parser.add_argument("--chunk-days", type=int, default=0, help="Days per grouped query (0 = whole range)")
+
+    def _parse(self, value, name):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"--{name} must be YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        first, last = summary_date_bounds()
+        start = self._parse(options["start"], "start") if options["start"] else first
+        end = self._parse(options["end"], "end") if options["end"] else last
+        if start is None or end is None:
+            raise CommandError("Nothing to rebuild; pass --start and --end.")
+        if start > end:
+            raise CommandError("--start must not be after --end")
+
+        days = (end - start).days + 1
+        chunk_days = max(options["chunk_days"], 0) or days
+        written = deleted = 0
+        started = time.perf_counter()
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end)
+            chunk_written, chunk_deleted = recompute_daily_summaries_for_range(chunk_start, chunk_end)
+            written += chunk_written
+            deleted += chunk_deleted
+            chunk_start = chunk_end + timedelta(days=1)
+        elapsed = time.perf_counter() - started
+
+        rate = days / elapsed if elapsed else float("inf")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {start}..{end} ({days} day(s)) in {elapsed:.2f}s: "
+            f"{written} summaries written, {deleted} removed, {rate:,.0f} days/s"
+        ))
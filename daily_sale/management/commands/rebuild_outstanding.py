@@ -0,0 +1,25 @@
+# daily_sale/management/commands/rebuild_outstanding.py
+import time
+from django.core.management.base import BaseCommand
+from daily_sale.utils import rebuild_outstanding, rebuild_clearances
+
+
+class Command(BaseCommand):
+    help = "Rebuild the OutstandingCustomer and CustomerClearance tables from transactions with grouped queries and bulk upserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size", type=int, default=0,
+            help="Customers per grouped query/upsert (0 = everything in one pass)",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = max(options["chunk_size"], 0) or None
+        started = time.perf_counter()
+        upserted, deleted = rebuild_outstanding(chunk_size=chunk_size)
+        cleared, uncleared = rebuild_clearances()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Outstanding ledger rebuilt in {elapsed:.2f}s: {upserted} customer(s) upserted, {deleted} stale row(s) removed; "
+            f"{cleared} cleared customer(s) upserted, {uncleared} removed"
+        ))
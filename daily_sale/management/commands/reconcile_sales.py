@@ -0,0 +1,193 @@
+# daily_sale/management/commands/reconcile_sales.py
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction as db_transaction
+from accounts.models import UserProfile
+from daily_sale.models import DailySaleTransaction, DailySummary
+from daily_sale.reconcile import (
+    clearance_drift,
+    customer_chunks,
+    outstanding_drift,
+    repair_clearances,
+    repair_outstanding,
+    repair_summaries,
+    repair_transactions,
+    summary_drift,
+    transaction_drift,
+)
+from daily_sale.utils import summary_date_bounds
+
+CHECKS = ("transactions", "summaries", "customers")
+
+
+class Command(BaseCommand):
+    help = (
+        "Detect drift in denormalized sales data (transaction payment fields, DailySummary, "
+        "OutstandingCustomer, CustomerClearance) and optionally repair it with bulk writes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Repair what is found (default: report only)")
+        parser.add_argument(
+            "--only", action="append", choices=CHECKS, default=[],
+            help="Run only this check (repeatable); checks always run in the order listed",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Transactions/customers per chunk")
+        parser.add_argument("--chunk-days", type=int, default=31, help="Days per summary chunk")
+        parser.add_argument("--start", help="YYYY-MM-DD, first summary day (defaults to the earliest data)")
+        parser.add_argument("--end", help="YYYY-MM-DD, last summary day (defaults to the latest data)")
+        parser.add_argument(
+            "--include-final", action="store_true",
+            help="Also repair finalized DailySummary days (they are always reported)",
+        )
+
+    def _parse(self, value, name):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise CommandError(f"--{name} must be YYYY-MM-DD")
+
+    def _progress(self, label, done, total):
+        # Redraws one line in a terminal; redirected output only gets the per-check totals.
+        if self.verbosity < 1 or not self.stdout.isatty():
+            return
+        width = 30
+        filled = int(width * done / total) if total else width
+        percent = 100 * done / total if total else 100
+        self.stdout.write(f"\r{label:<13} [{'#' * filled}{'.' * (width - filled)}] {percent:5.1f}% ({done}/{total})", ending="")
+        self._bar_open = done < total
+        if not self._bar_open:
+            self.stdout.write("")
+
+    def _sample(self, label, drift):
+        if self.verbosity < 2 or not drift:
+            return
+        if self._bar_open:
+            self.stdout.write("")
+            self._bar_open = False
+        for key, fields in list(drift.items())[:20]:
+            self.stdout.write(f"  {label} {key}: {', '.join(fields)}")
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        self._bar_open = False
+        self.fix = options["fix"]
+        self.left_final = 0
+        self.chunk_size = max(options["chunk_size"], 1)
+        checks = [check for check in CHECKS if not options["only"] or check in options["only"]]
+
+        started = time.perf_counter()
+        found = 0
+        if "transactions" in checks:
+            found += self.check_transactions()
+        if "summaries" in checks:
+            found += self.check_summaries(options)
+        if "customers" in checks:
+            found += self.check_customers()
+        elapsed = time.perf_counter() - started
+
+        if not found and not self.left_final:
+            self.stdout.write(self.style.SUCCESS(f"No drift found ({elapsed:.2f}s)"))
+        elif self.fix:
+            message = f"Repaired {found} drifted row(s) in {elapsed:.2f}s"
+            if self.left_final:
+                message += f"; {self.left_final} finalized day(s) left as they are"
+            self.stdout.write(self.style.SUCCESS(message))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"Found {found} drifted row(s) in {elapsed:.2f}s; run with --fix to repair"
+            ))
+
+    def check_transactions(self):
+        total = DailySaleTransaction.objects.count()
+        drifted = done = 0
+        last_pk = None
+        while True:
+            pks = DailySaleTransaction.objects.order_by("pk")
+            if last_pk is not None:
+                pks = pks.filter(pk__gt=last_pk)
+            pks = list(pks.values_list("pk", flat=True)[:self.chunk_size])
+            if not pks:
+                break
+            with db_transaction.atomic():
+                rows = list(transaction_drift(DailySaleTransaction.objects.filter(pk__in=pks)))
+                if rows and self.fix:
+                    repair_transactions(rows)
+            self._sample("transaction", {
+                tx.invoice_number or tx.pk: [
+                    f"{field} {getattr(tx, field)} -> {getattr(tx, expected)}"
+                    for field, expected in (("advance", "expected_advance"), ("balance", "expected_balance"),
+                                            ("payment_status", "expected_status"))
+                ]
+                for tx in rows
+            })
+            drifted += len(rows)
+            done += len(pks)
+            last_pk = pks[-1]
+            self._progress("transactions", min(done, total), total)
+        self.stdout.write(f"Transactions: {drifted} with drifted payment fields")
+        return drifted
+
+    def check_summaries(self, options):
+        first, last = summary_date_bounds()
+        start = self._parse(options["start"], "start") if options["start"] else first
+        end = self._parse(options["end"], "end") if options["end"] else last
+        if start is None or end is None:
+            self.stdout.write("Daily summaries: nothing to check")
+            return 0
+        if start > end:
+            raise CommandError("--start must not be after --end")
+
+        include_final = options["include_final"]
+        chunk_days = max(options["chunk_days"], 1)
+        days = (end - start).days + 1
+        drifted = skipped = repaired = 0
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end)
+            drift = summary_drift(chunk_start, chunk_end)
+            if drift:
+                final_days = set(
+                    DailySummary.objects.filter(date__in=list(drift), is_final=True).values_list("date", flat=True)
+                )
+                if not include_final:
+                    skipped += len(final_days)
+                if self.fix:
+                    repaired += repair_summaries(chunk_start, chunk_end, drift, force=include_final)
+                self._sample("summary", {
+                    f"{day}{' (final)' if day in final_days else ''}": fields for day, fields in drift.items()
+                })
+                drifted += len(drift)
+            self._progress("summaries", (chunk_end - start).days + 1, days)
+            chunk_start = chunk_end + timedelta(days=1)
+
+        message = f"Daily summaries: {drifted} drifted day(s) in {start}..{end}"
+        if skipped:
+            message += f", {skipped} finalized (repair with --include-final)"
+        self.stdout.write(message)
+        if self.fix:
+            # Only rows that were rewritten count as repaired.
+            self.left_final += drifted - repaired
+            return repaired
+        return drifted
+
+    def check_customers(self):
+        total = UserProfile.objects.count()
+        outstanding = cleared = done = 0
+        for customer_ids in customer_chunks(self.chunk_size):
+            outstanding_rows = outstanding_drift(customer_ids)
+            clearance_rows = clearance_drift(customer_ids)
+            if self.fix:
+                if outstanding_rows:
+                    repair_outstanding(outstanding_rows)
+                if clearance_rows:
+                    repair_clearances(clearance_rows)
+            self._sample("outstanding", outstanding_rows)
+            self._sample("clearance", clearance_rows)
+            outstanding += len(outstanding_rows)
+            cleared += len(clearance_rows)
+            done += len(customer_ids)
+            self._progress("customers", min(done, total), total)
+        self.stdout.write(f"Customers: {outstanding} drifted outstanding row(s), {cleared} drifted clearance row(s)")
+        return outstanding + cleared
@@ -0,0 +1,49 @@
+# daily_sale/management/commands/run_summary_worker.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from daily_sale.summary_queue import claim_jobs, run_job
+
+
+def _run(job, max_attempts, backoff):
+    try:
+        return run_job(job, max_attempts=max_attempts, backoff_seconds=backoff)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = "Drain the SummaryJob queue (used when DAILY_SALE_SUMMARY_ASYNC is enabled)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--batch", type=int, default=50, help="Jobs claimed per poll")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Seconds to wait when the queue is empty")
+        parser.add_argument("--max-attempts", type=int, default=5)
+        parser.add_argument("--backoff", type=int, default=5, help="Base retry delay in seconds")
+        parser.add_argument("--once", action="store_true", help="Exit when no due jobs are left")
+
+    def handle(self, *args, **options):
+        threads = max(options["threads"], 1)
+        self.stdout.write(f"Summary worker started with {threads} thread(s)")
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while True:
+                jobs = claim_jobs(options["batch"])
+                if not jobs:
+                    if options["once"]:
+                        break
+                    close_old_connections()
+                    time.sleep(options["sleep"])
+                    continue
+                results = pool.map(
+                    lambda job: _run(job, options["max_attempts"], options["backoff"]), jobs
+                )
+                for ok in results:
+                    if ok:
+                        done += 1
+                    else:
+                        failed += 1
+                self.stdout.write(f"Processed {len(jobs)} job(s): {done} done, {failed} failed so far")
+        self.stdout.write(self.style.SUCCESS(f"Summary worker finished: {done} done, {failed} failed"))
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('daily_sale', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('kind', models.CharField(choices=[('daily_summary', 'Daily Summary'), ('outstanding', 'Outstanding Customer')], max_length=32)),
+                ('target', models.CharField(max_length=64)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('run_after', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('failed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('enqueued_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Summary Job',
+                'verbose_name_plural': 'Summary Jobs',
+                'ordering': ['run_after'],
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='dailysummary',
+            options={'ordering': ['-date'], 'verbose_name': 'Daily Summary ', 'verbose_name_plural': 'Daily Summary '},
+        ),
+    ]
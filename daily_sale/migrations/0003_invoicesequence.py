@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('daily_sale', '0002_summaryjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(default='INV', max_length=16)),
+                ('day', models.DateField()),
+                ('last_number', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Invoice Sequence',
+                'verbose_name_plural': 'Invoice Sequences',
+                'constraints': [models.UniqueConstraint(fields=('prefix', 'day'), name='unique_invoice_sequence_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:27
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('daily_sale', '0003_invoicesequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YearlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_sales', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('total_purchases', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('total_profit', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('net_balance', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('transactions_count', models.PositiveIntegerField(default=0)),
+                ('items_sold', models.PositiveIntegerField(default=0)),
+                ('total_tax', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('total_discount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('paid_transactions', models.PositiveIntegerField(default=0)),
+                ('partial_transactions', models.PositiveIntegerField(default=0)),
+                ('unpaid_transactions', models.PositiveIntegerField(default=0)),
+                ('total_outstanding', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('days_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_final', models.BooleanField(default=False)),
+                ('year', models.PositiveIntegerField(unique=True)),
+            ],
+            options={
+                'verbose_name': 'Yearly Summary',
+                'verbose_name_plural': 'Yearly Summaries',
+                'ordering': ['-year'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_sales', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('total_purchases', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('total_profit', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('net_balance', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('transactions_count', models.PositiveIntegerField(default=0)),
+                ('items_sold', models.PositiveIntegerField(default=0)),
+                ('total_tax', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('total_discount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('paid_transactions', models.PositiveIntegerField(default=0)),
+                ('partial_transactions', models.PositiveIntegerField(default=0)),
+                ('unpaid_transactions', models.PositiveIntegerField(default=0)),
+                ('total_outstanding', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('days_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('is_final', models.BooleanField(default=False)),
+                ('year', models.PositiveIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Monthly Summary',
+                'verbose_name_plural': 'Monthly Summaries',
+                'ordering': ['-year', '-month'],
+                'constraints': [models.UniqueConstraint(fields=('year', 'month'), name='unique_monthly_summary_period')],
+            },
+        ),
+    ]
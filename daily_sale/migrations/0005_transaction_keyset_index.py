@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('containers', '0001_initial'),
+        ('daily_sale', '0004_monthly_yearly_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailysaletransaction',
+            index=models.Index(fields=['-date', '-created_at', '-id'], name='dst_list_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-17 06:38
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('daily_sale', '0005_transaction_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerClearance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_cleared_amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=24)),
+                ('transactions_count', models.PositiveIntegerField(default=0)),
+                ('first_transaction_date', models.DateField(blank=True, null=True)),
+                ('last_payment_date', models.DateField(blank=True, db_index=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='clearance', to='accounts.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Customer Clearance',
+                'verbose_name_plural': 'Customer Clearances',
+                'ordering': ['-last_payment_date'],
+            },
+        ),
+    ]
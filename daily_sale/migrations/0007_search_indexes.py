@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db import migrations
+
+
+# (app_label, model, columns) searched by daily_sale.search
+SEARCH_COLUMNS = [
+    ("containers", "Inventory_List", ["product_name", "code", "model"]),
+    ("containers", "Container", ["name", "container_number"]),
+    ("accounts", "Company", ["name"]),
+    ("accounts", "UserProfile", ["first_name", "last_name", "phone"]),
+    (*settings.AUTH_USER_MODEL.split("."), ["first_name", "last_name", "email"]),
+]
+FTS_TABLE = "daily_sale_search_fts"
+
+
+def _trigram_indexes(apps):
+    for app_label, model_name, columns in SEARCH_COLUMNS:
+        table = apps.get_model(app_label, model_name)._meta.db_table
+        for column in columns:
+            # Django renders icontains/istartswith as UPPER(col::text) LIKE UPPER(...)
+            yield f"{table}_{column}_trgm"[:63], table, column
+
+
+def create_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for name, table, column in _trigram_indexes(apps):
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+            )
+    elif connection.vendor == "sqlite":
+        inventory = apps.get_model("containers", "Inventory_List")._meta.db_table
+        container = apps.get_model("containers", "Container")._meta.db_table
+        company = apps.get_model("accounts", "Company")._meta.db_table
+        profile = apps.get_model("accounts", "UserProfile")._meta.db_table
+        user = apps.get_model(*settings.AUTH_USER_MODEL.split("."))._meta.db_table
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(kind UNINDEXED, object_id UNINDEXED, body, tokenize='trigram')"
+        )
+        # Same field order as daily_sale.search.TARGETS
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (kind, object_id, body) "
+            f"SELECT 'items', id, product_name || ' ' || code || ' ' || model FROM {inventory}"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (kind, object_id, body) "
+            f"SELECT 'containers', id, name || ' ' || container_number FROM {container}"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (kind, object_id, body) SELECT 'companies', id, name FROM {company}"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (kind, object_id, body) "
+            f"SELECT 'customers', p.id, COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '') || ' ' "
+            f"|| p.first_name || ' ' || p.last_name || ' ' || COALESCE(u.email, '') || ' ' || p.phone "
+            f"FROM {profile} p LEFT JOIN {user} u ON u.id = p.user_id"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        for name, _, _ in _trigram_indexes(apps):
+            schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+    elif connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("containers", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("daily_sale", "0006_customer_clearance"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
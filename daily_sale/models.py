@@ -1,7 +1,7 @@
 # daily_sale/models.py
 from uuid import uuid4
 from decimal import Decimal, ROUND_HALF_UP
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.utils import timezone
 from django.conf import settings
 from django.core.validators import MinValueValidator
@@ -55,6 +55,7 @@ class DailySaleTransaction(models.Model):
             models.Index(fields=["date"]),
             models.Index(fields=["transaction_type"]),
             models.Index(fields=["customer"]),
+            models.Index(fields=["-date", "-created_at", "-id"], name="dst_list_keyset_idx"),
         ]
 
     def __str__(self):
@@ -69,41 +70,63 @@ class DailySaleTransaction(models.Model):
             advance=self.advance
         )
 
-    def save(self, *args, **kwargs):
-        if self.pk: 
-            items = self.items.all()
-            if items.exists():
-                subtotal = Decimal('0')
-                tax_amount = Decimal('0')
-                discount_total = Decimal('0')
-                
-                for item in items:
-                    subtotal += item.subtotal or Decimal('0')
-                    tax_amount += item.tax_amount or Decimal('0')
-                    discount_total += item.discount or Decimal('0')
-                    
-                self.subtotal = subtotal
-                self.tax_amount = tax_amount
-                self.total_amount = (subtotal - discount_total + tax_amount).quantize(
+    # Fields that feed the computed totals; saves that leave them untouched skip recalculation.
+    TOTALS_SOURCE_FIELDS = ("quantity", "unit_price", "discount", "tax")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_amounts = instance._amounts_snapshot()
+        return instance
+
+    def _amounts_snapshot(self):
+        # Only read loaded attributes so deferred fields are not fetched here.
+        return {
+            field: self.__dict__[field]
+            for field in self.TOTALS_SOURCE_FIELDS + ("advance",)
+            if field in self.__dict__
+        }
+
+    def _changed_amounts(self):
+        loaded = getattr(self, "_loaded_amounts", None)
+        if loaded is None:
+            return set(self.TOTALS_SOURCE_FIELDS + ("advance",))
+        return {
+            field for field in self.TOTALS_SOURCE_FIELDS + ("advance",)
+            if field not in loaded or loaded[field] != getattr(self, field)
+        }
+
+    def _apply_balance(self):
+        self.balance = max(self.total_amount - self.advance, Decimal('0'))
+        if self.balance <= Decimal("0") and self.total_amount > Decimal("0"):
+            self.payment_status = "paid"
+        elif self.advance > Decimal("0"):
+            self.payment_status = "partial"
+        else:
+            self.payment_status = "unpaid"
+
+    def recalculate_totals(self):
+        """
+        Refresh subtotal/tax/total/balance from the line items with a single
+        aggregate query, or from the header fields when there are no items.
+        Does not save.
+        """
+        agg = self.items.aggregate(
+            lines=models.Count("id"),
+            subtotal=models.Sum("subtotal"),
+            tax_amount=models.Sum("tax_amount"),
+            discount=models.Sum("discount"),
+        ) if not self._state.adding else {"lines": 0}
+
+        if agg["lines"]:
+            subtotal = agg["subtotal"] or Decimal('0')
+            tax_amount = agg["tax_amount"] or Decimal('0')
+            self.subtotal = subtotal
+            self.tax_amount = tax_amount
+            self.total_amount = (subtotal - (agg["discount"] or Decimal('0')) + tax_amount).quantize(
                 Decimal("0.01"), rounding=ROUND_HALF_UP
-                )
-                self.balance = max(self.total_amount - self.advance, Decimal('0'))
-                
-                if self.balance <= Decimal("0") and self.total_amount > Decimal("0"):
-                    self.payment_status = "paid"
-                elif self.advance > Decimal("0"):
-                    self.payment_status = "partial"
-                else:
-                    self.payment_status = "unpaid"
-                    
-            else:
-                amounts = self.calculate_amounts()
-                self.subtotal = amounts["subtotal"]
-                self.tax_amount = amounts["tax_amount"]
-                self.total_amount = amounts["total_amount"]
-                self.balance = amounts["balance"]
-                self.payment_status = amounts["payment_status"]
-                
+            )
+            self._apply_balance()
         else:
             amounts = self.calculate_amounts()
             self.subtotal = amounts["subtotal"]
@@ -111,9 +134,31 @@ class DailySaleTransaction(models.Model):
             self.total_amount = amounts["total_amount"]
             self.balance = amounts["balance"]
             self.payment_status = amounts["payment_status"]
-            
+
+    def apply_payments(self):
+        """
+        Make ``advance``/``paid`` equal to the sum of recorded payments and
+        save only the payment fields. Used by Payment instead of a full save.
+        """
+        paid = self.payments.aggregate(total=models.Sum("amount"))["total"] or Decimal('0')
+        if paid == self.advance and paid == self.paid:
+            return False
+        self.advance = paid
+        self.paid = paid
+        self._apply_balance()
+        self.save(update_fields=["advance", "paid", "balance", "payment_status", "updated_at"])
+        return True
+
+    def save(self, *args, **kwargs):
+        changed = self._changed_amounts()
+        if self._state.adding or changed.intersection(self.TOTALS_SOURCE_FIELDS):
+            self.recalculate_totals()
+        elif "advance" in changed:
+            self._apply_balance()
+
         self.paid = self.advance
         super().save(*args, **kwargs)
+        self._loaded_amounts = self._amounts_snapshot()
 
     @property
     def taxable_amount(self):
@@ -186,6 +231,24 @@ class DailySaleTransactionItem(models.Model):
         super().save(*args, **kwargs)
 
 
+class InvoiceSequence(models.Model):
+    """Per-day invoice counter; see InvoiceNumberService."""
+    prefix = models.CharField(max_length=16, default="INV")
+    day = models.DateField()
+    last_number = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Invoice Sequence"
+        verbose_name_plural = "Invoice Sequences"
+        constraints = [
+            models.UniqueConstraint(fields=["prefix", "day"], name="unique_invoice_sequence_day")
+        ]
+
+    def __str__(self):
+        return f"{self.prefix}-{self.day:%Y%m%d}: {self.last_number}"
+
+
 class Payment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     transaction = models.ForeignKey(DailySaleTransaction, on_delete=models.CASCADE, related_name="payments")
@@ -203,8 +266,16 @@ class Payment(models.Model):
         return f"{self.transaction.invoice_number} - {self.amount}"
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        self.transaction.save()
+        with db_transaction.atomic():
+            super().save(*args, **kwargs)
+            self.transaction.apply_payments()
+
+    def delete(self, *args, **kwargs):
+        with db_transaction.atomic():
+            transaction = self.transaction
+            result = super().delete(*args, **kwargs)
+            transaction.apply_payments()
+        return result
 
 
 class DailySummary(models.Model):
@@ -263,6 +334,63 @@ class DailySummary(models.Model):
         return Decimal("0")
 
 
+class SummaryRollup(models.Model):
+    """
+    Totals of the DailySummary rows inside a period. Maintained from
+    DailySummary changes (see ``utils.apply_rollup_delta``; bulk rebuilds use
+    ``utils.refresh_rollups``) so long-range reports read a handful of rows
+    instead of scanning transactions.
+    """
+    total_sales = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal("0"))
+    total_purchases = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal("0"))
+    total_profit = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal("0"))
+    net_balance = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal("0"))
+    transactions_count = models.PositiveIntegerField(default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+    total_tax = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal("0"))
+    total_discount = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal("0"))
+    total_paid = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal("0"))
+    paid_transactions = models.PositiveIntegerField(default=0)
+    partial_transactions = models.PositiveIntegerField(default=0)
+    unpaid_transactions = models.PositiveIntegerField(default=0)
+    total_outstanding = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal("0"))
+    days_count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+    is_final = models.BooleanField(default=False)
+
+    class Meta:
+        abstract = True
+
+
+class MonthlySummary(SummaryRollup):
+    year = models.PositiveIntegerField()
+    month = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ["-year", "-month"]
+        constraints = [
+            models.UniqueConstraint(fields=["year", "month"], name="unique_monthly_summary_period"),
+        ]
+        verbose_name = "Monthly Summary"
+        verbose_name_plural = "Monthly Summaries"
+
+    def __str__(self):
+        return f"Monthly Summary {self.year}-{self.month:02d}"
+
+
+class YearlySummary(SummaryRollup):
+    year = models.PositiveIntegerField(unique=True)
+
+    class Meta:
+        ordering = ["-year"]
+        verbose_name = "Yearly Summary"
+        verbose_name_plural = "Yearly Summaries"
+
+    def __str__(self):
+        return f"Yearly Summary {self.year}"
+
+
 class OutstandingCustomer(models.Model):
     customer = models.OneToOneField(UserProfile, on_delete=models.CASCADE, related_name="outstanding")
     total_debt = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal("0"))
@@ -274,4 +402,56 @@ class OutstandingCustomer(models.Model):
         ordering = ["-total_debt"]
 
     def __str__(self):
-        return f"{getattr(self.customer, 'user', self.customer)} - {self.total_debt}"
\ No newline at end of file
+        return f"{getattr(self.customer, 'user', self.customer)} - {self.total_debt}"
+
+class CustomerClearance(models.Model):
+    """
+    Customers whose sales are all paid, kept in step with OutstandingCustomer
+    by the summary queue. Backs the "All Time" cleared customers page when
+    ``DAILY_SALE_CLEARANCE_TABLE`` is enabled.
+    """
+    customer = models.OneToOneField(UserProfile, on_delete=models.CASCADE, related_name="clearance")
+    total_cleared_amount = models.DecimalField(max_digits=24, decimal_places=2, default=Decimal("0"))
+    transactions_count = models.PositiveIntegerField(default=0)
+    first_transaction_date = models.DateField(null=True, blank=True)
+    last_payment_date = models.DateField(null=True, blank=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-last_payment_date"]
+        verbose_name = "Customer Clearance"
+        verbose_name_plural = "Customer Clearances"
+
+    def __str__(self):
+        return f"{getattr(self.customer, 'user', self.customer)} - {self.total_cleared_amount}"
+
+class SummaryJob(models.Model):
+    """
+    Pending summary recompute for the optional background worker
+    (``DAILY_SALE_SUMMARY_ASYNC``). One row per key, so repeated enqueues of
+    the same date or customer collapse into a single job.
+    """
+    KIND_DAILY_SUMMARY = "daily_summary"
+    KIND_OUTSTANDING = "outstanding"
+    KIND_CHOICES = [
+        (KIND_DAILY_SUMMARY, "Daily Summary"),
+        (KIND_OUTSTANDING, "Outstanding Customer"),
+    ]
+
+    key = models.CharField(max_length=100, unique=True)
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    target = models.CharField(max_length=64)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    enqueued_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["run_after"]
+        verbose_name = "Summary Job"
+        verbose_name_plural = "Summary Jobs"
+
+    def __str__(self):
+        return f"{self.key} (attempts: {self.attempts})"
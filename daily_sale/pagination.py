@@ -0,0 +1,136 @@
+# daily_sale/pagination.py
+"""
+Keyset (seek) pagination for the transaction list.
+
+Instead of ``COUNT(*)`` + ``OFFSET``, a page is fetched with a ``WHERE``
+on the sort key of the last row already shown, so deep pages cost the same
+as the first one. The position travels in an opaque, signed cursor token.
+"""
+import logging
+from datetime import date, datetime
+from uuid import UUID
+from django.core import signing
+from django.db import connection
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+CURSOR_SALT = "daily_sale.keyset"
+
+
+def _to_json(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def encode_cursor(values, direction):
+    return signing.dumps({"k": [_to_json(v) for v in values], "d": direction}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, model, fields):
+    """Return ``(values, direction)`` or ``(None, "next")`` for a missing/invalid token."""
+    if not token:
+        return None, "next"
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+        values = [model._meta.get_field(f).to_python(v) for f, v in zip(fields, data["k"])]
+        if len(values) != len(fields) or data["d"] not in ("next", "prev"):
+            raise ValueError("malformed cursor")
+        return values, data["d"]
+    except Exception as e:
+        logger.warning(f"Ignoring invalid pagination cursor: {str(e)}")
+        return None, "next"
+
+
+def _seek_filter(ordering, values, forward):
+    """Rows strictly after (``forward``) or before the given sort key."""
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") == forward else "gt"
+        condition |= Q(**equal, **{f"{name}__{lookup}": value})
+        equal[name] = value
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def keyset_page(queryset, cursor=None, per_page=25, ordering=("-date", "-created_at", "-id")):
+    """
+    One page of ``queryset`` ordered by ``ordering`` (which must end in a
+    unique field). ``cursor`` is a token from a previous page's
+    ``next_cursor``/``previous_cursor``.
+    """
+    fields = [f.lstrip("-") for f in ordering]
+    values, direction = decode_cursor(cursor, queryset.model, fields)
+    forward = direction == "next"
+
+    qs = queryset
+    if values is not None:
+        qs = qs.filter(_seek_filter(ordering, values, forward))
+    if forward:
+        qs = qs.order_by(*ordering)
+    else:
+        qs = qs.order_by(*[f[1:] if f.startswith("-") else f"-{f}" for f in ordering])
+
+    rows = list(qs[:per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    def key(obj):
+        return [getattr(obj, f) for f in fields]
+
+    has_next = more if forward else values is not None
+    has_previous = values is not None if forward else more
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(key(rows[-1]), "next") if rows and has_next else None,
+        previous_cursor=encode_cursor(key(rows[0]), "prev") if rows and has_previous else None,
+    )
+
+
+def estimated_count(queryset):
+    """
+    Planner row estimate (``pg_class.reltuples``) for an unfiltered queryset on
+    PostgreSQL; None when no cheap estimate is available.
+    """
+    if connection.vendor != "postgresql" or queryset.query.where:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+    except Exception as e:
+        logger.warning(f"Row estimate failed for {queryset.model._meta.db_table}: {str(e)}")
+        return None
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
@@ -0,0 +1,218 @@
+# daily_sale/reconcile.py
+"""
+Drift detection and repair for the denormalized sales data.
+
+Each check compares stored values with what the source rows imply, using
+set-based queries over one chunk at a time:
+
+* ``advance``/``paid``/``balance``/``payment_status`` on DailySaleTransaction
+  (recorded payments are authoritative when a transaction has any),
+* DailySummary rows against the grouped transaction/payment aggregates,
+* OutstandingCustomer and CustomerClearance against the per-customer groups.
+
+Checks only report; the ``repair_*`` functions fix a chunk with bulk writes
+that bypass the model signals, so ``repair_transactions`` recomputes the
+summaries and customer rows of what it touched itself. Run them in the order
+above (``manage.py reconcile_sales`` does).
+"""
+import logging
+from decimal import Decimal
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Abs, Coalesce, Greatest
+from django.utils import timezone
+from accounts.models import UserProfile
+from .models import DailySaleTransaction, DailySummary, OutstandingCustomer, CustomerClearance, Payment
+from .utils import (
+    CLEARANCE_FIELDS,
+    DAILY_SUMMARY_AGGREGATES,
+    _outstanding_rows,
+    cleared_customer_rows,
+    daily_summary_values_for_range,
+    payments_total_subquery,
+    recompute_clearance_for_customers,
+    recompute_daily_summaries_for_range,
+    recompute_daily_summary_for_date,
+    recompute_outstanding_for_customers,
+)
+
+logger = logging.getLogger(__name__)
+
+TRANSACTION_PAYMENT_FIELDS = ('advance', 'paid', 'balance', 'payment_status')
+SUMMARY_FIELDS = (*DAILY_SUMMARY_AGGREGATES, 'total_profit', 'net_balance', 'avg_transaction_value')
+OUTSTANDING_FIELDS = ('total_debt', 'transactions_count', 'last_transaction')
+CENT_TOLERANCE = Decimal('0.005')
+
+
+def _same(stored, expected):
+    if isinstance(stored, Decimal) or isinstance(expected, Decimal):
+        cents = Decimal('0.01')
+        return Decimal(stored or 0).quantize(cents) == Decimal(expected or 0).quantize(cents)
+    return stored == expected
+
+
+def _diff(stored, expected, fields):
+    return [field for field in fields if not _same(stored.get(field), expected.get(field))]
+
+
+# --------------------------
+# Transactions
+# --------------------------
+def transaction_drift(queryset=None):
+    """
+    Transactions whose payment fields disagree with their payments, annotated
+    with ``expected_advance``/``expected_balance``/``expected_status``.
+    Mirrors ``DailySaleTransaction._apply_balance`` in SQL.
+    """
+    money = DecimalField(max_digits=20, decimal_places=2)
+    payment_count = Payment.objects.filter(transaction=OuterRef('pk')).order_by().values(
+        'transaction'
+    ).annotate(c=Count('id')).values('c')
+    queryset = DailySaleTransaction.objects.all() if queryset is None else queryset
+
+    return queryset.annotate(
+        payments_count=Coalesce(Subquery(payment_count), Value(0)),
+        payments_total=payments_total_subquery(),
+    ).annotate(
+        expected_advance=Case(
+            When(payments_count__gt=0, then=F('payments_total')),
+            default=F('advance'), output_field=money,
+        ),
+    ).annotate(
+        expected_balance=Greatest(F('total_amount') - F('expected_advance'), Value(Decimal('0.00')), output_field=money),
+    ).annotate(
+        expected_status=Case(
+            When(expected_balance__lte=0, total_amount__gt=0, then=Value('paid')),
+            When(expected_advance__gt=0, then=Value('partial')),
+            default=Value('unpaid'),
+        ),
+        # Amounts are compared to the cent so backends without exact decimals do not report noise.
+        advance_gap=Abs(F('advance') - F('expected_advance'), output_field=money),
+        paid_gap=Abs(F('paid') - F('expected_advance'), output_field=money),
+        balance_gap=Abs(F('balance') - F('expected_balance'), output_field=money),
+    ).filter(
+        Q(advance_gap__gte=CENT_TOLERANCE)
+        | Q(paid_gap__gte=CENT_TOLERANCE)
+        | Q(balance_gap__gte=CENT_TOLERANCE)
+        | ~Q(payment_status=F('expected_status'))
+    )
+
+
+def repair_transactions(rows):
+    """
+    Write the expected payment fields of ``transaction_drift`` rows with one
+    bulk update, then recompute the DailySummary rows of their dates and
+    payment dates, and the OutstandingCustomer/CustomerClearance rows of
+    their customers.
+    """
+    cents = Decimal('0.01')
+    now = timezone.now()
+    for tx in rows:
+        tx.advance = tx.paid = Decimal(tx.expected_advance).quantize(cents)
+        tx.balance = Decimal(tx.expected_balance).quantize(cents)
+        tx.payment_status = tx.expected_status
+        tx.updated_at = now
+    DailySaleTransaction.objects.bulk_update(rows, (*TRANSACTION_PAYMENT_FIELDS, 'updated_at'))
+
+    dates = {tx.date for tx in rows}
+    dates.update(Payment.objects.filter(transaction__in=rows).order_by().values_list('date', flat=True).distinct())
+    for target_date in sorted(dates):
+        recompute_daily_summary_for_date(target_date, raise_errors=True)
+    customer_ids = {tx.customer_id for tx in rows if tx.customer_id}
+    recompute_outstanding_for_customers(customer_ids, raise_errors=True)
+    recompute_clearance_for_customers(customer_ids, raise_errors=True)
+    logger.info(f"Repaired payment fields of {len(rows)} transaction(s)")
+    return len(rows)
+
+
+# --------------------------
+# Daily summaries
+# --------------------------
+def summary_drift(start_date, end_date):
+    """
+    ``{date: [fields]}`` for DailySummary rows between the dates that differ
+    from the live aggregates; missing rows list every field and rows for days
+    without transactions are reported as ``['orphan']``.
+    """
+    expected = daily_summary_values_for_range(start_date, end_date)
+    stored = {
+        row['date']: row
+        for row in DailySummary.objects.filter(date__range=(start_date, end_date)).values('date', *SUMMARY_FIELDS)
+    }
+    drift = {}
+    for day, values in expected.items():
+        fields = _diff(stored[day], values, SUMMARY_FIELDS) if day in stored else list(SUMMARY_FIELDS)
+        if fields:
+            drift[day] = fields
+    for day in stored.keys() - expected.keys():
+        drift[day] = ['orphan']
+    return drift
+
+
+def repair_summaries(start_date, end_date, drift, force=False):
+    """
+    Rebuild the range (and its rollups) in bulk; finalized days only with
+    ``force``. Returns how many of the ``drift`` days were rewritten.
+    """
+    repaired = set(drift)
+    if not force:
+        repaired -= set(
+            DailySummary.objects.filter(date__in=list(repaired), is_final=True).values_list('date', flat=True)
+        )
+    recompute_daily_summaries_for_range(start_date, end_date, force=force)
+    return len(repaired)
+
+
+# --------------------------
+# Customers
+# --------------------------
+def customer_chunks(chunk_size):
+    """Keyset pages of UserProfile ids, for the per-customer checks."""
+    last_id = None
+    while True:
+        ids = UserProfile.objects.order_by('id')
+        if last_id is not None:
+            ids = ids.filter(id__gt=last_id)
+        ids = list(ids.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+def outstanding_drift(customer_ids):
+    """``{customer_id: [fields]}`` where OutstandingCustomer disagrees with the transactions."""
+    expected = _outstanding_rows(customer_ids)
+    stored = {
+        row['customer_id']: row
+        for row in OutstandingCustomer.objects.filter(customer_id__in=customer_ids).values('customer_id', *OUTSTANDING_FIELDS)
+    }
+    return _customer_drift(expected, stored, OUTSTANDING_FIELDS)
+
+
+def clearance_drift(customer_ids):
+    """``{customer_id: [fields]}`` where CustomerClearance disagrees with the sales."""
+    expected = {row['customer_id']: row for row in cleared_customer_rows().filter(customer_id__in=customer_ids)}
+    stored = {
+        row['customer_id']: row
+        for row in CustomerClearance.objects.filter(customer_id__in=customer_ids).values('customer_id', *CLEARANCE_FIELDS)
+    }
+    return _customer_drift(expected, stored, CLEARANCE_FIELDS)
+
+
+def _customer_drift(expected, stored, fields):
+    drift = {}
+    for customer_id, row in expected.items():
+        diff = _diff(stored[customer_id], row, fields) if customer_id in stored else ['missing']
+        if diff:
+            drift[customer_id] = diff
+    for customer_id in stored.keys() - expected.keys():
+        drift[customer_id] = ['stale']
+    return drift
+
+
+def repair_outstanding(customer_ids):
+    recompute_outstanding_for_customers(customer_ids, raise_errors=True)
+
+
+def repair_clearances(customer_ids):
+    recompute_clearance_for_customers(customer_ids, raise_errors=True)
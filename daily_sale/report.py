@@ -1,11 +1,16 @@
 # daily_sale/report.py
 from decimal import Decimal
-from datetime import date
-from django.db.models import Sum, Count, Q
+from datetime import date, timedelta
+from django.db.models import Sum, Count, Q, F, Max, Min, DateField
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek, TruncYear
 from .models import (
     DailySaleTransaction,
+    DailySummary,
+    MonthlySummary,
     OutstandingCustomer,
+    Payment,
 )
+from .services import SummaryService
 
 def parse_date_param(value):
     if not value:
@@ -23,64 +28,209 @@ def get_sales_summary(start_date=None, end_date=None):
     if end_date:
         qs = qs.filter(date__lte=end_date)
 
-    agg = qs.aggregate(
-        total_sales=Sum("total_amount", filter=Q(transaction_type="sale")),
-        total_purchases=Sum("total_amount", filter=Q(transaction_type="purchase")),
-        total_returns=Sum("total_amount", filter=Q(transaction_type="return")),
-        transactions_count=Count("id"),
-        items_sold=Sum("quantity", filter=Q(transaction_type="sale")),
-    )
+    agg = qs.aggregate(**SummaryService.transaction_aggregates(
+        "total_sales", "total_purchases", "total_returns", "transactions_count", "items_sold",
+    ))
 
-    total_sales = agg["total_sales"] or Decimal("0.00")
-    total_purchases = agg["total_purchases"] or Decimal("0.00")
-    total_returns = agg["total_returns"] or Decimal("0.00")
+    total_sales = agg["total_sales"]
+    total_purchases = agg["total_purchases"]
+    total_returns = agg["total_returns"]
 
     return {
         "total_sales": total_sales,
         "total_purchases": total_purchases,
         "total_returns": total_returns,
         "net_revenue": total_sales - total_purchases - total_returns,
-        "transactions_count": agg["transactions_count"] or 0,
-        "items_sold": agg["items_sold"] or 0,
+        "transactions_count": agg["transactions_count"],
+        "items_sold": agg["items_sold"],
     }
 
-def sales_timeseries(start_date=None, end_date=None, group_by="day"):
-    qs = DailySaleTransaction.objects.all()
+TIMESERIES_TRUNC = {
+    "day": TruncDay,
+    "week": TruncWeek,
+    "month": TruncMonth,
+    "year": TruncYear,
+}
 
-    if start_date:
-        qs = qs.filter(date__gte=start_date)
-    if end_date:
-        qs = qs.filter(date__lte=end_date)
+TIMESERIES_FIELDS = ("total_sales", "total_purchases", "transactions_count", "items_sold")
 
+
+def bucket_start(day, group_by="day"):
+    """First day of the ``group_by`` bucket containing ``day`` (weeks start on Monday)."""
+    if group_by == "week":
+        return day - timedelta(days=day.weekday())
     if group_by == "month":
-        return (
-            qs.annotate(
-                year=Q("date__year"),
-                month=Q("date__month"),
-            )
-            .values("year", "month")
-            .annotate(
-                total_sales=Sum("total_amount", filter=Q(transaction_type="sale")),
-                total_purchases=Sum("total_amount", filter=Q(transaction_type="purchase")),
-                total_returns=Sum("total_amount", filter=Q(transaction_type="return")),
-                transaction_count=Count("id"),
-                items_sold=Sum("quantity", filter=Q(transaction_type="sale")),
-            )
-            .order_by("year", "month")
-        )
+        return day.replace(day=1)
+    if group_by == "year":
+        return day.replace(month=1, day=1)
+    return day
 
-    return (
-        qs.values("date")
-        .annotate(
-            total_sales=Sum("total_amount", filter=Q(transaction_type="sale")),
-            total_purchases=Sum("total_amount", filter=Q(transaction_type="purchase")),
-            total_returns=Sum("total_amount", filter=Q(transaction_type="return")),
-            transaction_count=Count("id"),
-            items_sold=Sum("quantity", filter=Q(transaction_type="sale")),
-            customers_count=Count("customer", distinct=True),
-        )
-        .order_by("-date")
+
+def _next_bucket(day, group_by):
+    if group_by == "week":
+        return day + timedelta(days=7)
+    if group_by == "month":
+        return (day + timedelta(days=32)).replace(day=1)
+    if group_by == "year":
+        return day.replace(year=day.year + 1)
+    return day + timedelta(days=1)
+
+
+def sales_timeseries(start_date=None, end_date=None, group_by="day"):
+    """
+    Sales/purchase series for ``start_date..end_date`` in day, week, month or
+    year buckets, oldest first, with empty buckets zero-filled.
+
+    Finalized days are summed from DailySummary and the rest of the range is
+    aggregated from transactions, each with one grouped ``Trunc*`` query.
+    """
+    if group_by not in TIMESERIES_TRUNC:
+        raise ValueError(f"Unsupported group_by: {group_by}")
+    if start_date is None or end_date is None:
+        bounds = DailySaleTransaction.objects.aggregate(first=Min("date"), last=Max("date"))
+        start_date = start_date or bounds["first"]
+        end_date = end_date or bounds["last"]
+        if start_date is None or end_date is None:
+            return []
+
+    bucket = TIMESERIES_TRUNC[group_by]("date", output_field=DateField())
+    finalized = DailySummary.objects.filter(date__range=(start_date, end_date), is_final=True)
+    buckets = {}
+    for row in (
+        finalized.order_by().annotate(bucket=bucket).values("bucket")
+        .annotate(**{field: Sum(field) for field in TIMESERIES_FIELDS})
+    ):
+        buckets[row.pop("bucket")] = row
+    live = (
+        DailySaleTransaction.objects.filter(date__range=(start_date, end_date))
+        .exclude(date__in=finalized.values("date"))
+        .order_by()
+        .annotate(bucket=bucket)
+        .values("bucket")
+        .annotate(**SummaryService.transaction_aggregates(*TIMESERIES_FIELDS))
     )
+    for row in live:
+        totals = buckets.setdefault(row.pop("bucket"), dict.fromkeys(TIMESERIES_FIELDS, 0))
+        for field in TIMESERIES_FIELDS:
+            totals[field] = (totals[field] or 0) + (row[field] or 0)
+
+    series = []
+    current = bucket_start(start_date, group_by)
+    while current <= end_date:
+        totals = buckets.get(current, {})
+        series.append({
+            "date": current,
+            "total_sales": totals.get("total_sales") or Decimal("0.00"),
+            "total_purchases": totals.get("total_purchases") or Decimal("0.00"),
+            "transactions_count": totals.get("transactions_count") or 0,
+            "items_sold": totals.get("items_sold") or 0,
+        })
+        current = _next_bucket(current, group_by)
+    return series
+
+REPORT_DAY_FIELDS = (
+    "total_sales", "total_purchases", "transactions_count", "items_sold", "total_tax",
+    "paid_transactions", "partial_transactions", "unpaid_transactions", "total_outstanding",
+)
+
+
+def _summary_row(row):
+    # net_balance is stored as total_sales - payments received in the period
+    row["cash_in"] = row["total_sales"] - row.pop("net_balance")
+    return row
+
+
+def _live_report_rows(start_date, end_date, rows, exclude=None, trunc=None, payments_exclude=None):
+    """
+    Aggregate transactions and payments of ``start_date..end_date`` (minus
+    ``exclude``, or ``payments_exclude`` for payments) into ``rows``, one
+    grouped query each. Rows are keyed by date, or by the truncated period
+    start when ``trunc`` (e.g. TruncMonth) is given. Payments falling into an
+    existing row are added to its ``cash_in``.
+    """
+    period = trunc("date", output_field=DateField()) if trunc else F("date")
+    transactions = DailySaleTransaction.objects.filter(date__range=(start_date, end_date))
+    payments = Payment.objects.filter(date__range=(start_date, end_date))
+    if exclude is not None:
+        transactions = transactions.exclude(exclude)
+    if payments_exclude is None:
+        payments_exclude = exclude
+    if payments_exclude is not None:
+        payments = payments.exclude(payments_exclude)
+
+    live = (
+        transactions.order_by()
+        .annotate(period=period)
+        .values("period")
+        .annotate(**SummaryService.transaction_aggregates(*REPORT_DAY_FIELDS))
+    )
+    payments = dict(
+        payments.order_by()
+        .annotate(period=period)
+        .values("period")
+        .annotate(total=Sum("amount"))
+        .values_list("period", "total")
+    )
+    for row in live:
+        day = row.pop("period")
+        row["date"] = day
+        row["cash_in"] = payments.pop(day, None) or Decimal("0.00")
+        rows[day] = row
+    for day, total in payments.items():
+        if day in rows:
+            rows[day]["cash_in"] += total or Decimal("0.00")
+        else:
+            rows[day] = dict.fromkeys(REPORT_DAY_FIELDS, 0) | {"date": day, "cash_in": total or Decimal("0.00")}
+    return rows
+
+
+def daily_report_rows(start_date, end_date):
+    """
+    Per-day report figures for ``start_date..end_date`` keyed by date.
+
+    Finalized days are read from DailySummary; every other day is aggregated
+    live with one grouped transaction query and one grouped payment query,
+    so the cost does not grow with the number of days in the range.
+    Each row also carries ``cash_in`` (payments received that day).
+    """
+    finalized = DailySummary.objects.filter(date__range=(start_date, end_date), is_final=True)
+    rows = {
+        row["date"]: _summary_row(row)
+        for row in finalized.values("date", "net_balance", *REPORT_DAY_FIELDS)
+    }
+    return _live_report_rows(start_date, end_date, rows, exclude=Q(date__in=finalized.values("date")))
+
+
+def monthly_report_rows(start_date, end_date):
+    """
+    Per-month report figures for ``start_date..end_date`` keyed by the first
+    day of each month. Finalized MonthlySummary rows that lie fully inside
+    the range are used as-is; the rest is aggregated live by month.
+
+    DailySummary (and so the rollup) has no row for a day with payments but
+    no transactions, so those payments are still added to a finalized
+    month's ``cash_in``.
+    """
+    rows = {}
+    exclude = Q()
+    finalized = MonthlySummary.objects.filter(
+        year__range=(start_date.year, end_date.year), is_final=True
+    ).values("year", "month", "net_balance", *REPORT_DAY_FIELDS)
+    for row in finalized:
+        first_day = date(row.pop("year"), row.pop("month"), 1)
+        last_day = (first_day + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        if first_day < start_date or last_day > end_date:
+            continue
+        row["date"] = first_day
+        rows[first_day] = _summary_row(row)
+        exclude |= Q(date__range=(first_day, last_day))
+    if not rows:
+        return _live_report_rows(start_date, end_date, rows, trunc=TruncMonth)
+    summarized_days = Q(date__in=DailySummary.objects.filter(exclude).values("date"))
+    return _live_report_rows(
+        start_date, end_date, rows, exclude=exclude, trunc=TruncMonth, payments_exclude=summarized_days
+    )
+
 
 def outstanding_list():
     return (
@@ -0,0 +1,303 @@
+# daily_sale/search.py
+"""
+Search backends for the AJAX autocomplete endpoints.
+
+Every query is split into terms; a row matches when each term is found in at
+least one of the target's fields. Queries shorter than ``SHORT_QUERY_LENGTH``
+are too short for the trigram indexes and use the plain ``icontains`` match
+below. Results are ordered by relevance (prefix hits first) and never exceed
+``SEARCH_MAX_LIMIT``.
+
+* PostgreSQL: ``icontains`` is served by the ``pg_trgm`` GIN indexes created
+  in migration 0007, and results are ranked with ``TrigramSimilarity`` and a
+  prefix ``SearchVector`` query.
+* SQLite: an FTS5 table (trigram tokenizer, migration 0007), kept in step
+  by ``signals.py``, answers the substring match and ranks with bm25; a
+  query without FTS hits falls back to ``icontains``.
+* Anything else: plain ``icontains`` with prefix hits first.
+
+With ``DAILY_SALE_AUTOCOMPLETE_INDEX`` the lookups are answered from the
+per-worker prefix index in ``autocomplete_index.py`` instead (word prefixes,
+not substrings).
+"""
+import logging
+import re
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.contrib.auth.models import User
+from accounts.models import Company, UserProfile
+from containers.models import Container, Inventory_List
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MAX_LIMIT = 50
+SHORT_QUERY_LENGTH = 3
+FTS_TABLE = "daily_sale_search_fts"
+
+
+def parse_limit(value, default=25):
+    """``limit`` query parameter clamped to ``1..SEARCH_MAX_LIMIT``."""
+    try:
+        limit = int(value or default)
+    except (TypeError, ValueError):
+        limit = default
+    return min(max(limit, 1), SEARCH_MAX_LIMIT)
+
+
+def search_terms(q):
+    return [term for term in re.split(r"\s+", (q or "").strip()) if term]
+
+
+def _customer_text(profile):
+    return profile.user.get_full_name() if profile.user_id else str(profile)
+
+
+class SearchTarget:
+    def __init__(self, kind, model, fields, order_by, text, select_related=()):
+        self.kind = kind
+        self.model = model
+        self.fields = fields
+        self.order_by = order_by
+        self.text = text
+        self.select_related = select_related
+
+    def queryset(self):
+        qs = self.model.objects.all()
+        if self.select_related:
+            qs = qs.select_related(*self.select_related)
+        return qs
+
+    def match(self, terms, lookup):
+        """Every term in some field: ``AND`` over terms of ``OR`` over fields."""
+        condition = Q()
+        for term in terms:
+            any_field = Q()
+            for field in self.fields:
+                any_field |= Q(**{f"{field}__{lookup}": term})
+            condition &= any_field
+        return condition
+
+    def body(self, obj):
+        """Text indexed by the SQLite FTS table."""
+        values = []
+        for field in self.fields:
+            value = obj
+            for part in field.split("__"):
+                value = getattr(value, part, None) if value is not None else None
+            values.append(str(value or ""))
+        return " ".join(values)
+
+    def results(self, objects):
+        return [{"id": obj.pk, "text": self.text(obj)} for obj in objects]
+
+
+TARGETS = {
+    "items": SearchTarget(
+        "items", Inventory_List, ("product_name", "code", "model"), "product_name",
+        text=lambda item: item.product_name,
+    ),
+    "containers": SearchTarget(
+        "containers", Container, ("name", "container_number"), "name",
+        text=lambda container: container.name or str(container),
+    ),
+    "companies": SearchTarget(
+        "companies", Company, ("name",), "name",
+        text=lambda company: company.name,
+    ),
+    "customers": SearchTarget(
+        "customers", UserProfile,
+        ("user__first_name", "user__last_name", "first_name", "last_name", "user__email", "phone"),
+        "user__first_name", text=_customer_text, select_related=("user",),
+    ),
+}
+
+
+class SearchBackend:
+    """Portable backend: ``icontains`` match, prefix hits ranked first."""
+
+    def search(self, target, q, limit):
+        terms = search_terms(q)
+        qs = target.queryset()
+        if not terms:
+            return list(qs.order_by(target.order_by)[:limit])
+        if len(" ".join(terms)) < SHORT_QUERY_LENGTH:
+            return self.icontains_search(target, qs, terms, limit)
+        return self.full_search(target, qs, terms, limit)
+
+    def prefix_hit(self, target, terms):
+        return Case(When(target.match(terms[:1], "istartswith"), then=Value(1)), default=Value(0),
+                    output_field=IntegerField())
+
+    def icontains_search(self, target, qs, terms, limit):
+        """Plain ``icontains`` match with prefix hits first; every backend's fallback."""
+        return list(
+            qs.filter(target.match(terms, "icontains"))
+            .annotate(prefix_hit=self.prefix_hit(target, terms))
+            .order_by("-prefix_hit", target.order_by)[:limit]
+        )
+
+    def full_search(self, target, qs, terms, limit):
+        return self.icontains_search(target, qs, terms, limit)
+
+
+class PostgresSearchBackend(SearchBackend):
+    """``pg_trgm`` GIN indexes serve the match; similarity and full-text rank order it."""
+
+    def full_search(self, target, qs, terms, limit):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+
+        q = " ".join(terms)
+        similarities = [TrigramSimilarity(field, q) for field in target.fields]
+        similarity = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        qs = qs.filter(target.match(terms, "icontains")).annotate(
+            prefix_hit=self.prefix_hit(target, terms),
+            similarity=similarity,
+        )
+        ordering = ["-prefix_hit", "-similarity", target.order_by]
+
+        words = [re.sub(r"\W", "", term) for term in terms]
+        words = [word for word in words if word]
+        if words:
+            query = SearchQuery(" & ".join(f"{word}:*" for word in words), search_type="raw", config="simple")
+            qs = qs.annotate(rank=SearchRank(SearchVector(*target.fields, config="simple"), query))
+            ordering.insert(1, "-rank")
+        return list(qs.order_by(*ordering)[:limit])
+
+
+def _like_pattern(term):
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+class SqliteFtsSearchBackend(SearchBackend):
+    """FTS5 trigram table for substring matches, ranked by bm25."""
+
+    def full_search(self, target, qs, terms, limit):
+        long_terms = [term for term in terms if len(term) >= 3]
+        if not long_terms or not fts_available():
+            return self.icontains_search(target, qs, terms, limit)
+
+        # Terms under three characters are not in the trigram index; LIKE checks them in the same query.
+        short_terms = [term for term in terms if len(term) < 3]
+        match = " AND ".join('"{}"'.format(term.replace('"', '""')) for term in long_terms)
+        like = "".join(f" AND body LIKE %s ESCAPE '\\'" for _ in short_terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT object_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND kind = %s{like} ORDER BY rank LIMIT %s",
+                [match, target.kind, *map(_like_pattern, short_terms), limit],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            # Nothing indexed yet (or a stale index): answer from the tables.
+            return self.icontains_search(target, qs, terms, limit)
+
+        objects = qs.filter(pk__in=ids).annotate(prefix_hit=self.prefix_hit(target, terms)).in_bulk()
+        to_pk = target.model._meta.pk.to_python
+        ordered = [objects[pk] for pk in map(to_pk, ids) if pk in objects]
+        ordered.sort(key=lambda obj: -obj.prefix_hit)
+        return ordered
+
+
+def get_backend():
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    if connection.vendor == "sqlite":
+        return SqliteFtsSearchBackend()
+    return SearchBackend()
+
+
+def search(kind, q, limit):
+    """``[{id, text}]`` for the autocomplete ``kind`` (items/containers/companies/customers)."""
+    if getattr(settings, "DAILY_SALE_AUTOCOMPLETE_INDEX", False):
+        from .autocomplete_index import lookup
+        return lookup(kind, q, parse_limit(limit))
+    target = TARGETS[kind]
+    return target.results(get_backend().search(target, q, parse_limit(limit)))
+
+
+# --------------------------
+# SQLite FTS maintenance
+# --------------------------
+def fts_available():
+    """Whether the FTS table exists; looked up once per connection until the next ``migrate``."""
+    if connection.vendor != "sqlite":
+        return False
+    available = getattr(connection, "daily_sale_fts_available", None)
+    if available is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            available = cursor.fetchone() is not None
+        connection.daily_sale_fts_available = available
+    return available
+
+
+def reset_fts_available():
+    for conn in connections.all(initialized_only=True):
+        conn.__dict__.pop("daily_sale_fts_available", None)
+
+
+def _db_pk(target, pk):
+    # Same representation the migration's INSERT ... SELECT stored (e.g. UUID hex on SQLite).
+    return str(target.model._meta.pk.get_db_prep_value(pk, connection))
+
+
+def index_objects(target, objects):
+    objects = list(objects)
+    if not objects or not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"DELETE FROM {FTS_TABLE} WHERE kind = %s AND object_id = %s",
+            [(target.kind, _db_pk(target, obj.pk)) for obj in objects],
+        )
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE} (kind, object_id, body) VALUES (%s, %s, %s)",
+            [(target.kind, _db_pk(target, obj.pk), target.body(obj)) for obj in objects],
+        )
+
+
+def unindex_object(target, pk):
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE kind = %s AND object_id = %s", [target.kind, _db_pk(target, pk)])
+
+
+def rebuild_search_index():
+    """Refill the SQLite FTS table from every search target."""
+    if not fts_available():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    count = 0
+    for target in TARGETS.values():
+        objects = list(target.queryset())
+        index_objects(target, objects)
+        count += len(objects)
+    return count
+
+
+
+def index_instance(instance):
+    """Refresh the FTS row of a saved search target (or of a user's customer profile)."""
+    if not fts_available():
+        return
+    if isinstance(instance, User):
+        target, objects = TARGETS["customers"], TARGETS["customers"].queryset().filter(user=instance)
+    else:
+        target = target_for(instance)
+        objects = target.queryset().filter(pk=instance.pk)
+    index_objects(target, objects)
+
+
+def unindex_instance(instance):
+    unindex_object(target_for(instance), instance.pk)
+
+
+def target_for(instance):
+    for target in TARGETS.values():
+        if isinstance(instance, target.model):
+            return target
+    raise LookupError(f"No search target for {type(instance).__name__}")
@@ -1,10 +1,37 @@
 # daily_sale/services.py
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from uuid import UUID
 import logging
-from django.db.models import Sum
+from django.core.exceptions import ValidationError
+from django.db.models import Sum, Count, Q, F, Value, DecimalField, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 logger = logging.getLogger(__name__)
 
+ZERO = Decimal("0.00")
+
+
+def _decimal_sum(field, **extra):
+    return Coalesce(Sum(field, **extra), Value(ZERO), output_field=DecimalField(max_digits=24, decimal_places=2))
+
+
+def _int_sum(field, **extra):
+    return Coalesce(Sum(field, **extra), Value(0), output_field=IntegerField())
+
+
+def _line_items_quantity():
+    """Summed quantity of one transaction's line items (NULL when it has none)."""
+    from .models import DailySaleTransactionItem
+    line_quantity = DailySaleTransactionItem.objects.filter(
+        transaction=OuterRef("pk")
+    ).order_by().values("transaction").annotate(total=Sum("quantity")).values("total")
+    return Subquery(line_quantity, output_field=IntegerField())
+
+
+def _line_quantity():
+    """Quantity of one transaction: the sum of its line items, or its own quantity without items."""
+    return Coalesce(_line_items_quantity(), F("quantity"), output_field=IntegerField())
+
 class CalculationService:
     
     @staticmethod
@@ -127,62 +154,315 @@ class CalculationService:
         }
 
 
+class InvoiceNumberService:
+    """
+    Hands out ``INV-YYYYMMDD-NNNN`` numbers from a per-day InvoiceSequence row
+    locked with ``select_for_update``: constant time, and concurrent requests
+    queue on the row instead of colliding on the unique invoice_number.
+    """
+
+    @staticmethod
+    def format_number(prefix, day, number):
+        return f"{prefix}-{day:%Y%m%d}-{number:04d}"
+
+    @staticmethod
+    def _legacy_last_number(prefix, day):
+        """Highest suffix already used on ``day``, read once when the day's counter is created."""
+        from .models import DailySaleTransaction
+
+        last_inv = DailySaleTransaction.objects.filter(
+            invoice_number__startswith=f"{prefix}-{day:%Y%m%d}-"
+        ).order_by("-invoice_number").values_list("invoice_number", flat=True).first()
+        if not last_inv:
+            return 0
+        try:
+            return int(last_inv.split("-")[-1])
+        except ValueError:
+            return 0
+
+    @staticmethod
+    def reserve_block(count, day=None, prefix="INV"):
+        """Reserve ``count`` consecutive invoice numbers (e.g. for bulk imports)."""
+        from django.db import transaction as db_transaction
+        from django.utils import timezone
+        from .models import InvoiceSequence
+
+        if count < 1:
+            return []
+        day = day or timezone.localdate()
+        with db_transaction.atomic():
+            sequence, _ = InvoiceSequence.objects.select_for_update().get_or_create(
+                prefix=prefix,
+                day=day,
+                defaults={"last_number": InvoiceNumberService._legacy_last_number(prefix, day)},
+            )
+            first = sequence.last_number + 1
+            sequence.last_number += count
+            sequence.save(update_fields=["last_number", "updated_at"])
+        return [
+            InvoiceNumberService.format_number(prefix, day, number)
+            for number in range(first, first + count)
+        ]
+
+    @staticmethod
+    def next_number(day=None, prefix="INV"):
+        return InvoiceNumberService.reserve_block(1, day=day, prefix=prefix)[0]
+
+
+class LineItemService:
+    """
+    Batched persistence of invoice line items: one ``in_bulk`` for the
+    inventory rows, amounts from CalculationService in memory, and bulk
+    writes instead of a get()/create() pair per line.
+    """
+
+    @staticmethod
+    def parse_items(items_data):
+        """
+        Normalize posted items, skipping rows without an item id. Rows repeating
+        an item at the same unit price are merged into one line; a quantity that
+        is not a whole number of at least 1, a bad number or a repeated item with
+        a different price raises ValidationError.
+        """
+        parsed = {}
+        for row in items_data or []:
+            item_id = str(row.get("item_id") or "").strip()
+            if not item_id:
+                continue
+            try:
+                quantity = Decimal(str(row.get("quantity", 1)))
+                values = {
+                    "unit_price": Decimal(str(row.get("unit_price", 0))),
+                    "discount": Decimal(str(row.get("discount", 0))),
+                }
+            except (InvalidOperation, TypeError, ValueError):
+                raise ValidationError(f"Invalid numbers for item {item_id}.")
+            if not quantity.is_finite() or quantity != quantity.to_integral_value() or quantity < 1:
+                raise ValidationError(f"Quantity for item {item_id} must be a whole number of at least 1.")
+            values["quantity"] = int(quantity)
+
+            existing = parsed.get(item_id)
+            if existing is None:
+                parsed[item_id] = values
+            elif existing["unit_price"] == values["unit_price"]:
+                existing["quantity"] += values["quantity"]
+                existing["discount"] += values["discount"]
+            else:
+                raise ValidationError(f"Item {item_id} is listed twice with different unit prices.")
+        return parsed
+
+    @staticmethod
+    def _resolve_inventory(item_ids):
+        from containers.models import Inventory_List
+
+        valid_ids = []
+        for item_id in item_ids:
+            try:
+                valid_ids.append(UUID(item_id))
+            except ValueError:
+                logger.error(f"Invalid item id: {item_id}")
+        inventory = Inventory_List.objects.only("id", "container_id").in_bulk(valid_ids)
+        return {str(pk): obj for pk, obj in inventory.items()}
+
+    @staticmethod
+    def _apply_amounts(line, values, tax_percent):
+        line.quantity = values["quantity"]
+        line.unit_price = values["unit_price"]
+        line.discount = values["discount"]
+        amounts = CalculationService.calculate_item_amounts(
+            quantity=line.quantity,
+            unit_price=line.unit_price,
+            discount=line.discount,
+            tax_percent=tax_percent,
+        )
+        line.subtotal = amounts["subtotal"]
+        line.tax_amount = amounts["tax_amount"]
+        line.total_amount = amounts["total_amount"]
+        return line
+
+    @staticmethod
+    def _quantity(lines):
+        """Summed line quantity, None without lines (as ``_line_items_quantity``)."""
+        lines = list(lines)
+        return sum(line.quantity for line in lines) if lines else None
+
+    @staticmethod
+    def _record_quantity_change(transaction, old_quantity, new_quantity):
+        """
+        Bulk writes send no signals, so the change in line quantity is pushed
+        to ``items_sold`` here as a delta; a failed delta schedules a recompute.
+        """
+        from django.db import transaction as db_transaction
+        from .summary_queue import mark_dirty
+        from .utils import apply_line_quantity_delta
+
+        try:
+            with db_transaction.atomic():
+                stale = apply_line_quantity_delta(transaction, old_quantity, new_quantity)
+        except Exception as e:
+            logger.exception(f"Error applying line quantity delta, scheduling a recompute: {str(e)}")
+            stale = {transaction.date}
+        mark_dirty(dates=stale)
+
+    @staticmethod
+    def _totals(lines):
+        return {
+            "count": len(lines),
+            "subtotal": sum((line.subtotal for line in lines), Decimal("0")),
+            "discount_total": sum((line.discount for line in lines), Decimal("0")),
+            "tax_amount": sum((line.tax_amount for line in lines), Decimal("0")),
+        }
+
+    @staticmethod
+    def create_items(transaction, items_data):
+        """Insert all line items of a new transaction with one bulk_create."""
+        from .models import DailySaleTransactionItem
+
+        parsed = LineItemService.parse_items(items_data)
+        inventory = LineItemService._resolve_inventory(parsed)
+        lines = [
+            LineItemService._apply_amounts(
+                DailySaleTransactionItem(
+                    transaction=transaction,
+                    item=inventory[item_id],
+                    container_id=inventory[item_id].container_id,
+                ),
+                values,
+                transaction.tax,
+            )
+            for item_id, values in parsed.items()
+            if item_id in inventory
+        ]
+        DailySaleTransactionItem.objects.bulk_create(lines)
+        LineItemService._record_quantity_change(transaction, None, LineItemService._quantity(lines))
+        return LineItemService._totals(lines)
+
+    @staticmethod
+    def sync_items(transaction, items_data):
+        """
+        Bring a transaction's line items in line with the submitted rows:
+        changed lines are bulk-updated, new ones bulk-created and removed ones
+        deleted with a single statement.
+        """
+        from .models import DailySaleTransactionItem
+
+        parsed = LineItemService.parse_items(items_data)
+        existing = {str(line.item_id): line for line in transaction.items.all()}
+        old_quantity = LineItemService._quantity(existing.values())
+        inventory = LineItemService._resolve_inventory(
+            [item_id for item_id in parsed if item_id not in existing]
+        )
+
+        to_create, to_update, kept = [], [], []
+        amount_fields = ("quantity", "unit_price", "discount", "subtotal", "tax_amount", "total_amount")
+        for item_id, values in parsed.items():
+            line = existing.get(item_id)
+            if line is not None:
+                before = tuple(getattr(line, f) for f in amount_fields)
+                LineItemService._apply_amounts(line, values, transaction.tax)
+                if tuple(getattr(line, f) for f in amount_fields) != before:
+                    to_update.append(line)
+                kept.append(line)
+            elif item_id in inventory:
+                line = LineItemService._apply_amounts(
+                    DailySaleTransactionItem(
+                        transaction=transaction,
+                        item=inventory[item_id],
+                        container_id=inventory[item_id].container_id,
+                    ),
+                    values,
+                    transaction.tax,
+                )
+                to_create.append(line)
+                kept.append(line)
+
+        removed = [line.pk for item_id, line in existing.items() if item_id not in parsed]
+        if removed:
+            DailySaleTransactionItem.objects.filter(pk__in=removed).delete()
+        if to_update:
+            DailySaleTransactionItem.objects.bulk_update(to_update, amount_fields)
+        if to_create:
+            DailySaleTransactionItem.objects.bulk_create(to_create)
+        LineItemService._record_quantity_change(transaction, old_quantity, LineItemService._quantity(kept))
+        return LineItemService._totals(kept)
+
+
 class SummaryService:
-    
+
+    @staticmethod
+    def transaction_aggregates(*names):
+        """
+        Conditional aggregate expressions over DailySaleTransaction, keyed by
+        DailySummary field name, so every figure comes from one ``aggregate()``
+        (or ``values().annotate()``) round trip. Pass names to pick a subset.
+        """
+        sale = Q(transaction_type="sale")
+        purchase = Q(transaction_type="purchase")
+        expressions = {
+            "total_sales": _decimal_sum("total_amount", filter=sale),
+            "total_purchases": _decimal_sum("total_amount", filter=purchase),
+            "total_returns": _decimal_sum("total_amount", filter=Q(transaction_type="return")),
+            "total_amount": _decimal_sum("total_amount"),
+            "transactions_count": Count("id"),
+            "sales_count": Count("id", filter=sale),
+            "items_sold": _int_sum(_line_quantity(), filter=sale),
+            "customers_count": Count("customer", filter=sale, distinct=True),
+            "total_tax": _decimal_sum("tax_amount"),
+            "total_discount": _decimal_sum("discount"),
+            "total_paid": _decimal_sum("advance"),
+            "paid_transactions": Count("id", filter=Q(payment_status="paid")),
+            "partial_transactions": Count("id", filter=Q(payment_status="partial")),
+            "unpaid_transactions": Count("id", filter=Q(payment_status="unpaid")),
+            "total_outstanding": _decimal_sum("balance", filter=Q(balance__gt=0)),
+            "outstanding_count": Count("id", filter=Q(balance__gt=0)),
+        }
+        if names:
+            return {name: expressions[name] for name in names}
+        return expressions
+
     @staticmethod
     def get_transaction_stats(queryset):
-        
-        # ================ محاسبه مجموع فروش ================
-        sales_total = queryset.filter(transaction_type='sale').aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0')
-        
-        # ================ محاسبه مجموع خرید ================
-        purchases_total = queryset.filter(transaction_type='purchase').aggregate(
-            total=Sum('total_amount')
-        )['total'] or Decimal('0')
-        
-        # ================ محاسبه معوقات (بر اساس balance) ================
-        # تراکنش‌هایی که balance > 0 دارند (بدهکار هستند)
-        outstanding_qs = queryset.filter(balance__gt=0)
-        outstanding_total = outstanding_qs.aggregate(
-            total=Sum('balance')
-        )['total'] or Decimal('0')
-        outstanding_count = outstanding_qs.count()
-        
-        # ================ محاسبه تعداد کالاهای فروخته شده ================
-        items_sold = 0
-        for transaction in queryset.filter(transaction_type='sale'):
-            if hasattr(transaction, 'items') and transaction.items.exists():
-                items_sold += sum(item.quantity for item in transaction.items.all())
-            else:
-                items_sold += transaction.quantity
-        
-        # ================ محاسبه میانگین تراکنش ================
-        total_count = queryset.count()
+        agg = queryset.order_by().aggregate(
+            **SummaryService.transaction_aggregates(
+                "total_sales", "total_purchases", "total_outstanding",
+                "outstanding_count", "transactions_count", "total_amount", "items_sold",
+            )
+        )
+
+        total_count = agg["transactions_count"]
         avg_transaction = Decimal('0')
         if total_count > 0:
-            total_amount_sum = queryset.aggregate(
-                total=Sum('total_amount')
-            )['total'] or Decimal('0')
-            avg_transaction = total_amount_sum / total_count
-        
-        # لاگ برای دیباگ
-        logger.info("=" * 50)
-        logger.info("📊 SummaryService.get_transaction_stats:")
-        logger.info(f"   - Total Sales: {sales_total:,.2f} AED")
-        logger.info(f"   - Total Purchases: {purchases_total:,.2f} AED")
-        logger.info(f"   - Outstanding Balance: {outstanding_total:,.2f} AED")
-        logger.info(f"   - Outstanding Count: {outstanding_count}")
-        logger.info(f"   - Items Sold: {items_sold}")
-        logger.info(f"   - Avg Transaction: {avg_transaction:,.2f} AED")
-        logger.info("=" * 50)
-        
+            avg_transaction = agg["total_amount"] / total_count
+
         return {
-            'total_sales': sales_total,
-            'total_purchases': purchases_total,
-            'total_outstanding': outstanding_total,
-            'outstanding_count': outstanding_count,
-            'items_sold': items_sold,
+            'total_sales': agg["total_sales"],
+            'total_purchases': agg["total_purchases"],
+            'total_outstanding': agg["total_outstanding"],
+            'outstanding_count': agg["outstanding_count"],
+            'items_sold': agg["items_sold"],
             'avg_transaction': avg_transaction,
-        }
\ No newline at end of file
+            'transactions_count': total_count,
+        }
+
+    @staticmethod
+    def top_items(queryset, limit=10):
+        """
+        Best selling items of the sales in ``queryset`` by revenue. Invoices
+        with line items are counted per line; older transactions without
+        lines by their own item and quantity.
+        """
+        from .models import DailySaleTransactionItem
+
+        sales = queryset.filter(transaction_type="sale").order_by()
+        fields = ("item_id", "item__product_name", "item__code")
+        grouped = [
+            DailySaleTransactionItem.objects.filter(transaction__in=sales).order_by().values(*fields),
+            sales.filter(item__isnull=False, items__isnull=True).values(*fields),
+        ]
+        rows = {}
+        for qs in grouped:
+            for row in qs.annotate(total_sold=_int_sum("quantity"), total_revenue=_decimal_sum("total_amount")):
+                totals = rows.setdefault(row["item_id"], {**row, "total_sold": 0, "total_revenue": ZERO})
+                totals["total_sold"] += row["total_sold"]
+                totals["total_revenue"] += row["total_revenue"]
+        return sorted(rows.values(), key=lambda row: -row["total_revenue"])[:limit]
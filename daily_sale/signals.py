@@ -1,77 +1,230 @@
 # daily_sale/signals.py
 import logging
 from decimal import Decimal
-from django.db.models.signals import pre_save, post_save, post_delete
+from django.db.models import Sum
+from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete, post_migrate
 from django.dispatch import receiver
 from django.db import transaction as db_transaction
+from accounts.models import Company, UserProfile
+from containers.models import Container, Inventory_List
 from .models import DailySaleTransaction, Payment
-from .utils import recompute_daily_summary_for_date, recompute_outstanding_for_customer
+from .services import _line_items_quantity
+from .utils import (
+    SUMMARY_SOURCE_FIELDS,
+    summary_state,
+    apply_transaction_delta,
+    apply_payment_delta,
+)
+from .summary_queue import mark_dirty
+from .lookup_cache import invalidate_active_parties, note_transaction_parties
+from .search import index_instance, reset_fts_available, unindex_instance
+from .autocomplete_index import bump_version
+from .item_autofill import company_item_ids, container_item_ids, invalidate_item_autofill
 
 logger = logging.getLogger(__name__)
 
-@receiver(pre_save, sender=DailySaleTransaction)
-def dst_pre_save(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            old = DailySaleTransaction.objects.only("date", "customer_id").get(pk=instance.pk)
-            instance._old_date = old.date
-            instance._old_customer_id = old.customer_id
-        except DailySaleTransaction.DoesNotExist:
-            instance._old_date = None
-            instance._old_customer_id = None
-    else:
-        instance._old_date = None
-        instance._old_customer_id = None
 
-@receiver(post_save, sender=DailySaleTransaction)
-def dst_post_save(sender, instance, created, **kwargs):
+def _touches_summary(update_fields):
+    if update_fields is None:
+        return True
+    tracked = set(SUMMARY_SOURCE_FIELDS) | {f[:-3] for f in SUMMARY_SOURCE_FIELDS if f.endswith('_id')}
+    return bool(tracked.intersection(update_fields))
+
+
+@receiver(pre_save, sender=DailySaleTransaction)
+def dst_pre_save(sender, instance, update_fields=None, **kwargs):
+    instance._old_summary_state = None
+    instance._old_company_id = None
+    if instance._state.adding or not _touches_summary(update_fields):
+        return
     try:
-        dates_to_update = {instance.date}
-        if getattr(instance, "_old_date", None) and instance._old_date != instance.date:
-            dates_to_update.add(instance._old_date)
+        old = DailySaleTransaction.objects.only(*SUMMARY_SOURCE_FIELDS, "company_id").annotate(
+            line_quantity=_line_items_quantity()
+        ).get(pk=instance.pk)
+        instance._old_summary_state = summary_state(old, old.line_quantity)
+        instance._old_company_id = old.company_id
+    except DailySaleTransaction.DoesNotExist:
+        pass
+
 
-        customers_to_update = set()
-        if instance.customer_id:
-            customers_to_update.add(instance.customer_id)
-        if getattr(instance, "_old_customer_id", None) and instance._old_customer_id != instance.customer_id:
-            customers_to_update.add(instance._old_customer_id)
+@receiver(pre_delete, sender=DailySaleTransaction)
+def dst_pre_delete(sender, instance, **kwargs):
+    # Line items are deleted with the transaction; take their quantity first.
+    line_quantity = instance.items.aggregate(total=Sum("quantity"))["total"]
+    instance._old_summary_state = summary_state(instance, line_quantity)
 
+def _stale_dates(apply_delta, old_state, new_state):
+    """
+    Dates the summary queue must recompute after ``apply_delta``. A failed
+    delta is rolled back with its savepoint, so every date it touched is
+    returned for a full recompute instead.
+    """
+    try:
         with db_transaction.atomic():
-            for d in dates_to_update:
-                recompute_daily_summary_for_date(d)
-            for cid in customers_to_update:
-                if cid: 
-                    recompute_outstanding_for_customer(cid)
+            return apply_delta(old_state, new_state)
+    except Exception as e:
+        logger.exception(f"Error applying summary delta, scheduling a recompute: {str(e)}")
+        return {state["date"] for state in (old_state, new_state) if state}
+
+
+@receiver(post_save, sender=DailySaleTransaction)
+def dst_post_save(sender, instance, created, update_fields=None, **kwargs):
+    if not _touches_summary(update_fields):
+        return
+    old_state = getattr(instance, "_old_summary_state", None)
+    # Saving the header leaves the line items as they were.
+    new_state = summary_state(instance, old_state and old_state["line_quantity"])
+
+    customers_to_update = set()
+    if instance.customer_id:
+        customers_to_update.add(instance.customer_id)
+    if old_state and old_state["customer_id"] != instance.customer_id:
+        customers_to_update.add(old_state["customer_id"])
+
+    mark_dirty(
+        dates=_stale_dates(apply_transaction_delta, old_state, new_state),
+        customer_ids=customers_to_update,
+    )
+
+    try:
+        if old_state and (
+            old_state["customer_id"] != instance.customer_id
+            or getattr(instance, "_old_company_id", None) != instance.company_id
+        ):
+            invalidate_active_parties()
+        else:
+            note_transaction_parties([instance.customer_id], [instance.company_id])
 
         logger.info(f"Transaction {instance.invoice_number} processed successfully")
 
     except Exception as e:
         logger.exception(f"Error processing DailySaleTransaction post_save ({instance.invoice_number}): {str(e)}")
-        
+
 @receiver(post_delete, sender=DailySaleTransaction)
 def dst_post_delete(sender, instance, **kwargs):
+    mark_dirty(
+        dates=_stale_dates(
+            apply_transaction_delta, getattr(instance, "_old_summary_state", None) or summary_state(instance), None
+        ),
+        customer_ids=[instance.customer_id],
+    )
     try:
-        with db_transaction.atomic():
-            if instance.date:
-                recompute_daily_summary_for_date(instance.date)
-            if instance.customer_id:
-                recompute_outstanding_for_customer(instance.customer_id)
-
+        invalidate_active_parties()
         logger.info("Transaction deleted and summaries updated")
     except Exception as e:
         logger.exception(f"Error processing DailySaleTransaction post_delete: {str(e)}")
 
-@receiver([post_save, post_delete], sender=Payment)
-def payment_update_summaries(sender, instance, **kwargs):
+
+def _payment_state(payment):
+    return {"date": payment.date, "amount": payment.amount}
+
+
+@receiver(pre_save, sender=Payment)
+def payment_pre_save(sender, instance, **kwargs):
+    instance._old_payment_state = None
+    if instance._state.adding:
+        return
+    try:
+        old = Payment.objects.only("date", "amount").get(pk=instance.pk)
+        instance._old_payment_state = _payment_state(old)
+    except Payment.DoesNotExist:
+        pass
+
+def _apply_payment_change(instance, old_state, new_state):
     tx = instance.transaction
     if not tx:
         return
+    mark_dirty(
+        dates=_stale_dates(apply_payment_delta, old_state, new_state),
+        customer_ids=[tx.customer_id],
+    )
+    logger.info(f"Payment processed for transaction {tx.invoice_number}")
+
+@receiver(post_save, sender=Payment)
+def payment_update_summaries(sender, instance, **kwargs):
+    _apply_payment_change(instance, getattr(instance, "_old_payment_state", None), _payment_state(instance))
+
+@receiver(post_delete, sender=Payment)
+def payment_delete_summaries(sender, instance, **kwargs):
+    _apply_payment_change(instance, _payment_state(instance), None)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def party_changed(sender, **kwargs):
+    invalidate_active_parties()
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login; names shown in the cached index are unaffected.
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    invalidate_active_parties()
+    _update_search_index(index_instance, instance)
+
+
+@receiver(post_migrate)
+def search_schema_changed(sender, **kwargs):
+    # The FTS table may have been created or dropped; look it up again.
+    reset_fts_available()
+
+
+def _update_search_index(action, instance):
     try:
-        with db_transaction.atomic():
-            if tx.date:
-                recompute_daily_summary_for_date(tx.date)
-            if tx.customer_id:
-                recompute_outstanding_for_customer(tx.customer_id)
-        logger.info(f"Payment processed for transaction {tx.invoice_number}")
+        action(instance)
     except Exception as e:
-        logger.exception(f"Error processing Payment ({tx.invoice_number}): {str(e)}")
\ No newline at end of file
+        logger.exception(f"Error updating search index for {type(instance).__name__} {instance.pk}: {str(e)}")
+    # After commit, so no worker rebuilds its autocomplete index from the old rows.
+    db_transaction.on_commit(bump_version)
+
+
+@receiver(post_save, sender=Inventory_List)
+@receiver(post_save, sender=Container)
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=UserProfile)
+def search_target_saved(sender, instance, **kwargs):
+    _update_search_index(index_instance, instance)
+
+
+@receiver(post_delete, sender=Inventory_List)
+@receiver(post_delete, sender=Container)
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=UserProfile)
+def search_target_deleted(sender, instance, **kwargs):
+    _update_search_index(unindex_instance, instance)
+
+
+def _invalidate_item_autofill(get_item_ids):
+    # Now for this request, and again after commit in case another worker
+    # refilled the cache from the rows as they were before this transaction.
+    try:
+        item_ids = get_item_ids()
+        invalidate_item_autofill(item_ids)
+        db_transaction.on_commit(lambda: invalidate_item_autofill(item_ids))
+    except Exception as e:
+        logger.exception(f"Error invalidating item autofill cache: {str(e)}")
+
+
+@receiver(post_save, sender=Inventory_List)
+@receiver(post_delete, sender=Inventory_List)
+def item_autofill_item_changed(sender, instance, **kwargs):
+    _invalidate_item_autofill(lambda: [instance.pk])
+
+
+# Deletes are caught before SET_NULL detaches the items.
+@receiver(post_save, sender=Container)
+@receiver(pre_delete, sender=Container)
+def item_autofill_container_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        _invalidate_item_autofill(lambda: container_item_ids(instance.pk))
+
+
+@receiver(post_save, sender=Company)
+@receiver(pre_delete, sender=Company)
+def item_autofill_company_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        _invalidate_item_autofill(lambda: company_item_ids(instance.pk))
@@ -0,0 +1,170 @@
+# daily_sale/summary_queue.py
+"""
+Coalesces summary maintenance inside a database transaction.
+
+Signal handlers mark DailySummary dates and customer ids (OutstandingCustomer
+and CustomerClearance) as dirty
+instead of recomputing them straight away. The dirty set is kept per thread
+until the transaction commits, so any number of saves inside
+``@db_transaction.atomic`` ends in a single recompute per key. Outside an
+atomic block the flush runs immediately.
+
+With ``DAILY_SALE_SUMMARY_ASYNC = True`` the flush only writes SummaryJob
+rows; ``manage.py run_summary_worker`` drains them in the background.
+"""
+import logging
+import threading
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import SummaryJob
+from .utils import (
+    recompute_daily_summary_for_date,
+    recompute_outstanding_for_customer,
+    recompute_outstanding_for_customers,
+    recompute_clearance_for_customers,
+)
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def async_enabled():
+    return getattr(settings, "DAILY_SALE_SUMMARY_ASYNC", False)
+
+
+class _DirtySet:
+    def __init__(self):
+        self.dates = set()
+        self.customer_ids = set()
+
+    def flush(self):
+        if getattr(_local, "dirty", None) is self:
+            _local.dirty = None
+        # Take the keys so later callbacks registered for this set find nothing left.
+        dates, self.dates = self.dates, set()
+        customer_ids, self.customer_ids = self.customer_ids, set()
+        if not (dates or customer_ids):
+            return
+        if async_enabled():
+            enqueue_jobs(dates, customer_ids)
+            return
+        try:
+            with db_transaction.atomic():
+                for target_date in sorted(dates):
+                    recompute_daily_summary_for_date(target_date)
+                recompute_outstanding_for_customers(customer_ids)
+                recompute_clearance_for_customers(customer_ids)
+            logger.info(
+                f"Flushed summaries for {len(dates)} date(s) and {len(customer_ids)} customer(s)"
+            )
+        except Exception as e:
+            logger.exception(f"Error flushing summary queue: {str(e)}")
+
+
+def _current():
+    dirty = getattr(_local, "dirty", None)
+    if dirty is None:
+        dirty = _local.dirty = _DirtySet()
+    return dirty
+
+
+def mark_dirty(dates=(), customer_ids=()):
+    """Schedule a recompute of the given summary dates and outstanding customers."""
+    dates = {d for d in dates if d}
+    customer_ids = {c for c in customer_ids if c}
+    if not (dates or customer_ids):
+        return
+    dirty = _current()
+    dirty.dates.update(dates)
+    dirty.customer_ids.update(customer_ids)
+    if not connection.in_atomic_block:
+        dirty.flush()
+        return
+    # Registered on every call: rolling back a savepoint drops the callbacks
+    # registered inside it, and whichever callback reaches the commit flushes
+    # the whole set. Keys left over from a rolled back transaction are simply
+    # recomputed with the next flush.
+    db_transaction.on_commit(dirty.flush)
+
+
+# --------------------------
+# Background job table
+# --------------------------
+def enqueue_jobs(dates=(), customer_ids=()):
+    """Upsert one SummaryJob per key; re-enqueuing a pending key makes it due now."""
+    now = timezone.now()
+    jobs = [
+        SummaryJob(key=f"{SummaryJob.KIND_DAILY_SUMMARY}:{d.isoformat()}",
+                   kind=SummaryJob.KIND_DAILY_SUMMARY, target=d.isoformat(), run_after=now, enqueued_at=now)
+        for d in dates if d
+    ] + [
+        SummaryJob(key=f"{SummaryJob.KIND_OUTSTANDING}:{c}",
+                   kind=SummaryJob.KIND_OUTSTANDING, target=str(c), run_after=now, enqueued_at=now)
+        for c in customer_ids if c
+    ]
+    if not jobs:
+        return
+    try:
+        SummaryJob.objects.bulk_create(
+            jobs,
+            update_conflicts=True,
+            unique_fields=["key"],
+            update_fields=["run_after", "enqueued_at", "attempts", "failed_at", "last_error"],
+        )
+    except Exception as e:
+        logger.exception(f"Error enqueuing summary jobs: {str(e)}")
+
+
+def claim_jobs(limit, lease_seconds=300):
+    """Lock up to ``limit`` due jobs for this worker and return them."""
+    now = timezone.now()
+    with db_transaction.atomic():
+        jobs = list(
+            SummaryJob.objects.select_for_update(skip_locked=True)
+            .filter(run_after__lte=now, failed_at__isnull=True)
+            .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now))
+            .order_by("run_after")[:limit]
+        )
+        if jobs:
+            SummaryJob.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                locked_until=now + timedelta(seconds=lease_seconds)
+            )
+    return jobs
+
+
+def run_job(job, max_attempts=5, backoff_seconds=5):
+    """
+    Execute one claimed job. On success the row is removed unless it was
+    re-enqueued meanwhile; on failure it is retried with exponential backoff.
+    """
+    try:
+        if job.kind == SummaryJob.KIND_DAILY_SUMMARY:
+            target_date = date.fromisoformat(job.target)
+            recompute_daily_summary_for_date(target_date, raise_errors=True)
+        elif job.kind == SummaryJob.KIND_OUTSTANDING:
+            recompute_outstanding_for_customer(job.target, raise_errors=True)
+            recompute_clearance_for_customers([job.target], raise_errors=True)
+        else:
+            raise ValueError(f"Unknown summary job kind: {job.kind}")
+    except Exception as e:
+        attempts = job.attempts + 1
+        now = timezone.now()
+        updated = SummaryJob.objects.filter(pk=job.pk, enqueued_at=job.enqueued_at).update(
+            attempts=attempts,
+            locked_until=None,
+            last_error=str(e),
+            run_after=now + timedelta(seconds=min(backoff_seconds * 2 ** (attempts - 1), 3600)),
+            failed_at=now if attempts >= max_attempts else None,
+        )
+        if not updated:
+            SummaryJob.objects.filter(pk=job.pk).update(locked_until=None)
+        return False
+
+    deleted, _ = SummaryJob.objects.filter(pk=job.pk, enqueued_at=job.enqueued_at).delete()
+    if not deleted:
+        SummaryJob.objects.filter(pk=job.pk).update(locked_until=None)
+    return True
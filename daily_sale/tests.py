@@ -1,3 +1,694 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import Company, UserProfile
+from containers.models import Container, Inventory_List
+from .models import (
+    DailySaleTransaction, DailySaleTransactionItem, DailySummary, MonthlySummary, OutstandingCustomer, Payment,
+    YearlySummary,
+)
+from . import autocomplete_index
+from .item_autofill import AUTOFILL_KEY
+from .pagination import decode_cursor, keyset_page
+from .report import sales_timeseries
+from .reconcile import outstanding_drift, summary_drift, transaction_drift
+from .search import FTS_TABLE, SqliteFtsSearchBackend, TARGETS, fts_available, search
+from .services import InvoiceNumberService, LineItemService, SummaryService
+from .utils import (
+    compute_daily_summary_values, correct_daily_summary, finalize_daily_summaries, finalize_summary_dates,
+    rebuild_outstanding, recompute_daily_summaries_for_range, recompute_daily_summary_for_date,
+    recompute_outstanding_for_customer, recompute_outstanding_for_customers,
+)
 
-# Create your tests here.
+DAY = date(2026, 3, 10)
+OTHER_DAY = date(2026, 3, 12)
+
+
+class SalesTestCase(TestCase):
+    def setUp(self):
+        self.customer = UserProfile.objects.get(user=User.objects.create(username="customer"))
+
+    def create_transaction(self, invoice_number, **fields):
+        fields = {
+            "date": DAY, "transaction_type": "sale", "customer": self.customer,
+            "quantity": 2, "unit_price": Decimal("100"), "tax": Decimal("5"), **fields,
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            return DailySaleTransaction.objects.create(invoice_number=invoice_number, **fields)
+
+    def save(self, obj):
+        with self.captureOnCommitCallbacks(execute=True):
+            obj.save()
+
+    def delete(self, obj):
+        with self.captureOnCommitCallbacks(execute=True):
+            obj.delete()
+
+    def assertSummaryCurrent(self, day):
+        expected = compute_daily_summary_values(day)
+        summary = DailySummary.objects.filter(date=day).first()
+        if expected is None:
+            self.assertIsNone(summary, f"{day} has no transactions but kept a summary")
+            return
+        self.assertIsNotNone(summary, f"{day} has no summary")
+        for field, value in expected.items():
+            self.assertEqual(getattr(summary, field), value, f"{day}: {field}")
+
+
+class SummaryMaintenanceTests(SalesTestCase):
+    def test_create_edit_move_and_delete(self):
+        first = self.create_transaction("T-1")
+        second = self.create_transaction("T-2", transaction_type="purchase", unit_price=Decimal("40"))
+        self.assertSummaryCurrent(DAY)
+
+        first.unit_price = Decimal("150")
+        first.advance = Decimal("50")
+        self.save(first)
+        self.assertSummaryCurrent(DAY)
+
+        second.date = OTHER_DAY
+        self.save(second)
+        self.assertSummaryCurrent(DAY)
+        self.assertSummaryCurrent(OTHER_DAY)
+
+        self.delete(second)
+        self.assertSummaryCurrent(OTHER_DAY)
+        self.assertSummaryCurrent(DAY)
+
+    def test_removing_last_transaction_of_a_day(self):
+        moved = self.create_transaction("T-1")
+        deleted = self.create_transaction("T-2", date=OTHER_DAY)
+        month = MonthlySummary.objects.get(year=DAY.year, month=DAY.month)
+        self.assertEqual(month.days_count, 2)
+
+        moved.date = OTHER_DAY
+        self.save(moved)
+        self.assertSummaryCurrent(DAY)
+        self.assertSummaryCurrent(OTHER_DAY)
+        month.refresh_from_db()
+        self.assertEqual(month.days_count, 1)
+        self.assertEqual(month.transactions_count, 2)
+
+        self.delete(moved)
+        self.delete(deleted)
+        self.assertFalse(DailySummary.objects.exists())
+        self.assertFalse(MonthlySummary.objects.exists())
+        self.assertEqual(summary_drift(DAY, OTHER_DAY), {})
+
+    def test_line_item_changes_move_items_sold(self):
+        parts = [Inventory_List.objects.create(product_name=f"Part {n}", unit_price=10) for n in range(2)]
+        tx = self.create_transaction("T-1", quantity=5)
+        self.assertSummaryCurrent(DAY)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LineItemService.create_items(tx, [
+                {"item_id": str(parts[0].pk), "quantity": 3, "unit_price": 10},
+                {"item_id": str(parts[1].pk), "quantity": 4, "unit_price": 10},
+            ])
+            tx.save()
+        self.assertEqual(DailySummary.objects.get(date=DAY).items_sold, 7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            LineItemService.sync_items(tx, [{"item_id": str(parts[0].pk), "quantity": 9, "unit_price": 10}])
+            tx.save()
+        self.assertSummaryCurrent(DAY)
+
+        tx.transaction_type = "purchase"
+        self.save(tx)
+        self.assertSummaryCurrent(DAY)
+
+        tx.transaction_type = "sale"
+        tx.date = OTHER_DAY
+        self.save(tx)
+        self.assertSummaryCurrent(OTHER_DAY)
+        self.assertEqual(DailySummary.objects.get(date=OTHER_DAY).items_sold, 9)
+
+        self.delete(tx)
+        self.assertSummaryCurrent(OTHER_DAY)
+
+    def test_payment_edit_and_delete(self):
+        tx = self.create_transaction("T-1")
+        with self.captureOnCommitCallbacks(execute=True):
+            payment = Payment.objects.create(transaction=tx, amount=Decimal("60"), date=OTHER_DAY)
+        tx.refresh_from_db()
+        self.assertEqual(tx.advance, Decimal("60"))
+        self.assertEqual(OutstandingCustomer.objects.get(customer=self.customer).total_debt, tx.total_amount - 60)
+
+        payment.amount = Decimal("80")
+        self.save(payment)
+        tx.refresh_from_db()
+        self.assertEqual(tx.balance, tx.total_amount - 80)
+        self.assertEqual(OutstandingCustomer.objects.get(customer=self.customer).total_debt, tx.balance)
+        self.assertEqual(outstanding_drift([self.customer.id]), {})
+
+        self.delete(payment)
+        tx.refresh_from_db()
+        self.assertEqual(tx.advance, Decimal("0"))
+        self.assertEqual(OutstandingCustomer.objects.get(customer=self.customer).total_debt, tx.total_amount)
+        self.assertSummaryCurrent(DAY)
+        self.assertEqual(summary_drift(DAY, OTHER_DAY), {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(transaction=tx, amount=tx.total_amount, date=DAY)
+        self.assertFalse(OutstandingCustomer.objects.filter(customer=self.customer).exists())
+
+
+class LineItemServiceTests(SalesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.parts = [Inventory_List.objects.create(product_name=f"Part {n}", unit_price=10) for n in range(3)]
+        self.tx = self.create_transaction("T-1")
+
+    def row(self, part, quantity, unit_price="10", discount="0"):
+        return {"item_id": str(part.pk), "quantity": quantity, "unit_price": unit_price, "discount": discount}
+
+    def lines(self):
+        return {line.item_id: line for line in DailySaleTransactionItem.objects.filter(transaction=self.tx)}
+
+    def test_sync_updates_creates_and_deletes_lines(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            LineItemService.create_items(self.tx, [self.row(self.parts[0], 2), self.row(self.parts[1], 1)])
+        kept_pk = self.lines()[self.parts[0].pk].pk
+
+        with self.captureOnCommitCallbacks(execute=True):
+            totals = LineItemService.sync_items(self.tx, [
+                self.row(self.parts[0], 4, discount="5"),
+                self.row(self.parts[2], 3, unit_price="20"),
+            ])
+        lines = self.lines()
+        self.assertEqual(set(lines), {self.parts[0].pk, self.parts[2].pk})
+        self.assertEqual(lines[self.parts[0].pk].pk, kept_pk)
+        self.assertEqual(lines[self.parts[0].pk].quantity, 4)
+        self.assertEqual(lines[self.parts[0].pk].total_amount, Decimal("36.75"))
+        self.assertEqual(lines[self.parts[2].pk].total_amount, Decimal("63.00"))
+        self.assertEqual(totals, {
+            "count": 2,
+            "subtotal": Decimal("100.00"),
+            "discount_total": Decimal("5"),
+            "tax_amount": Decimal("4.75"),
+        })
+
+    def test_duplicate_rows_are_merged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            totals = LineItemService.create_items(self.tx, [
+                self.row(self.parts[0], 2, discount="1"),
+                self.row(self.parts[0], "3", discount="2"),
+            ])
+        self.assertEqual(totals["count"], 1)
+        line = self.lines()[self.parts[0].pk]
+        self.assertEqual((line.quantity, line.discount, line.subtotal), (5, Decimal("3"), Decimal("50.00")))
+
+    def test_invalid_rows_are_rejected(self):
+        for rows in (
+            [self.row(self.parts[0], "1.5")],
+            [self.row(self.parts[0], 0)],
+            [self.row(self.parts[0], -2)],
+            [self.row(self.parts[0], "many")],
+            [self.row(self.parts[0], 1), self.row(self.parts[0], 1, unit_price="12")],
+        ):
+            with self.subTest(rows=rows), self.assertRaises(ValidationError):
+                LineItemService.parse_items(rows)
+        self.assertEqual(LineItemService.parse_items([self.row(self.parts[0], "2.0")])[str(self.parts[0].pk)]["quantity"], 2)
+
+
+class OutstandingLedgerTests(SalesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.paid, self.drifted, self.idle = (
+            UserProfile.objects.get(user=User.objects.create(username=name)) for name in ("paid", "drifted", "idle")
+        )
+        self.customers = [self.customer.id, self.paid.id, self.drifted.id, self.idle.id]
+        partly_paid = self.create_transaction("T-1")
+        self.create_transaction("T-2", date=OTHER_DAY)
+        settled = self.create_transaction("T-3", customer=self.paid)
+        drifted = self.create_transaction("T-4", customer=self.drifted)
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(transaction=partly_paid, amount=Decimal("50"), date=DAY)
+            Payment.objects.create(transaction=settled, amount=settled.total_amount, date=DAY)
+        # Writes that bypass the signals.
+        DailySaleTransaction.objects.filter(pk=drifted.pk).update(balance=Decimal("12"))
+        self.make_stale()
+
+    def make_stale(self):
+        OutstandingCustomer.objects.filter(customer=self.customer).update(total_debt=Decimal("1"))
+        for customer in (self.paid, self.idle):
+            OutstandingCustomer.objects.update_or_create(customer=customer, defaults={"total_debt": Decimal("9")})
+        # rebuild_outstanding deletes the rows it did not refresh by their updated_at.
+        OutstandingCustomer.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+
+    def ledger(self):
+        return {
+            row.customer_id: (row.total_debt, row.transactions_count, row.last_transaction)
+            for row in OutstandingCustomer.objects.all()
+        }
+
+    def per_customer_ledger(self):
+        for customer_id in self.customers:
+            recompute_outstanding_for_customer(customer_id)
+        expected = self.ledger()
+        self.assertEqual(set(expected), {self.customer.id, self.drifted.id})
+        self.assertEqual(expected[self.drifted.id], (Decimal("12.00"), 1, DAY))
+        self.make_stale()
+        return expected
+
+    def test_bulk_recompute_matches_per_customer(self):
+        expected = self.per_customer_ledger()
+        recompute_outstanding_for_customers(map(str, self.customers))
+        self.assertEqual(self.ledger(), expected)
+
+    def test_rebuild_matches_per_customer(self):
+        expected = self.per_customer_ledger()
+        self.assertEqual(rebuild_outstanding(), (2, 2))
+        self.assertEqual(self.ledger(), expected)
+
+        self.make_stale()
+        self.assertEqual(rebuild_outstanding(chunk_size=1), (2, 2))
+        self.assertEqual(self.ledger(), expected)
+
+
+class DailySummaryRangeTests(SalesTestCase):
+    EMPTY_DAY = date(2026, 3, 11)
+    FINAL_DAY = date(2026, 3, 14)
+    DAYS = (DAY, EMPTY_DAY, OTHER_DAY, FINAL_DAY)
+
+    def setUp(self):
+        super().setUp()
+        tx = self.create_transaction("T-1")
+        self.create_transaction("T-2", transaction_type="purchase")
+        self.create_transaction("T-3", date=OTHER_DAY)
+        self.create_transaction("T-4", date=self.FINAL_DAY)
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(transaction=tx, amount=Decimal("40"), date=OTHER_DAY)
+        finalize_summary_dates([self.FINAL_DAY])
+        self.make_stale()
+
+    def make_stale(self):
+        # Writes that bypass the signals: drifted days, a day without
+        # transactions and a finalized day that must keep its snapshot.
+        DailySummary.objects.filter(date__in=[DAY, OTHER_DAY, self.FINAL_DAY]).update(total_sales=Decimal("1"))
+        DailySummary.objects.update_or_create(date=self.EMPTY_DAY, defaults={"total_sales": Decimal("5")})
+
+    def summaries(self):
+        fields = [f.name for f in DailySummary._meta.fields if f.name not in ("id", "updated_at")]
+        return list(DailySummary.objects.order_by("date").values(*fields))
+
+    def test_range_recompute_matches_per_day(self):
+        for day in self.DAYS:
+            recompute_daily_summary_for_date(day)
+        expected = self.summaries()
+        self.assertFalse(DailySummary.objects.filter(date=self.EMPTY_DAY).exists())
+        self.assertEqual(DailySummary.objects.get(date=self.FINAL_DAY).total_sales, Decimal("1"))
+        self.make_stale()
+
+        self.assertEqual(recompute_daily_summaries_for_range(DAY, self.FINAL_DAY), (2, 1))
+        self.assertEqual(self.summaries(), expected)
+        self.assertSummaryCurrent(DAY)
+        self.assertSummaryCurrent(OTHER_DAY)
+        # Rollups are rebuilt from the day rows rather than patched with deltas.
+        month = MonthlySummary.objects.get(year=DAY.year, month=DAY.month)
+        self.assertEqual(month.days_count, 3)
+        self.assertEqual(month.total_sales, sum(row["total_sales"] for row in expected))
+
+    def test_forced_range_rebuilds_finalized_days(self):
+        self.assertEqual(recompute_daily_summaries_for_range(DAY, self.FINAL_DAY, force=True), (3, 1))
+        for day in self.DAYS:
+            self.assertSummaryCurrent(day)
+        self.assertTrue(DailySummary.objects.get(date=self.FINAL_DAY).is_final)
+
+
+class FinalizationTests(SalesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.closed = self.create_transaction("T-1")
+        self.create_transaction("T-2", date=date(2026, 4, 2))
+        self.assertEqual(finalize_daily_summaries(date(2026, 3, 31)), (1, 1, 0))
+        self.snapshot = DailySummary.objects.get(date=DAY).total_sales
+
+    def test_finalized_day_ignores_late_edits(self):
+        self.closed.unit_price = Decimal("300")
+        with self.assertLogs("daily_sale.utils", "WARNING"):
+            self.save(self.closed)
+            self.create_transaction("T-3")
+        summary = DailySummary.objects.get(date=DAY)
+        self.assertTrue(summary.is_final)
+        self.assertEqual(summary.total_sales, self.snapshot)
+        self.assertEqual(MonthlySummary.objects.get(year=2026, month=3).total_sales, self.snapshot)
+
+    def test_correct_daily_summary_rebuilds_the_closed_day(self):
+        self.closed.unit_price = Decimal("300")
+        with self.assertLogs("daily_sale.utils", "WARNING"):
+            self.save(self.closed)
+        correct_daily_summary(DAY)
+        self.assertSummaryCurrent(DAY)
+        summary = DailySummary.objects.get(date=DAY)
+        self.assertTrue(summary.is_final)
+        self.assertEqual(summary.total_sales, self.closed.total_amount)
+        month = MonthlySummary.objects.get(year=2026, month=3)
+        self.assertTrue(month.is_final)
+        self.assertEqual(month.total_sales, self.closed.total_amount)
+
+    def test_only_ended_months_are_closed(self):
+        self.assertTrue(MonthlySummary.objects.get(year=2026, month=3).is_final)
+        self.assertFalse(MonthlySummary.objects.get(year=2026, month=4).is_final)
+        self.assertFalse(YearlySummary.objects.get(year=2026).is_final)
+        self.assertFalse(DailySummary.objects.get(date=date(2026, 4, 2)).is_final)
+
+        late = self.create_transaction("T-3", date=date(2026, 4, 2))
+        april = MonthlySummary.objects.get(year=2026, month=4)
+        self.assertEqual(april.transactions_count, 2)
+        self.assertEqual(YearlySummary.objects.get(year=2026).total_sales, self.snapshot + 2 * late.total_amount)
+
+
+class SalesTimeseriesTests(SalesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.closed = self.create_transaction("T-1", date=date(2026, 3, 2))
+        self.create_transaction("T-2", date=date(2026, 3, 4))
+        self.create_transaction("T-3", date=date(2026, 3, 18), transaction_type="purchase")
+        self.create_transaction("T-4", date=date(2026, 5, 6))
+        self.amount = self.closed.total_amount
+
+    def series(self, start, end, group_by):
+        return [
+            (row["date"], row["total_sales"], row["transactions_count"])
+            for row in sales_timeseries(start, end, group_by)
+        ]
+
+    def test_week_and_month_buckets_are_zero_filled(self):
+        self.assertEqual(self.series(date(2026, 3, 3), date(2026, 3, 22), "week"), [
+            (date(2026, 3, 2), self.amount, 1),
+            (date(2026, 3, 9), 0, 0),
+            (date(2026, 3, 16), 0, 1),
+        ])
+        self.assertEqual(self.series(date(2026, 3, 1), date(2026, 5, 31), "month"), [
+            (date(2026, 3, 1), 2 * self.amount, 3),
+            (date(2026, 4, 1), 0, 0),
+            (date(2026, 5, 1), self.amount, 1),
+        ])
+
+    def test_finalized_days_come_from_the_snapshot(self):
+        self.assertEqual(finalize_summary_dates([date(2026, 3, 2)]), 1)
+        self.closed.unit_price = Decimal("300")
+        with self.assertLogs("daily_sale.utils", "WARNING"):
+            self.save(self.closed)
+        # The live date in the same bucket still follows the transactions.
+        self.create_transaction("T-5", date=date(2026, 3, 4))
+
+        march = sales_timeseries(date(2026, 3, 1), date(2026, 3, 31), "month")[0]
+        self.assertEqual(march["total_sales"], 3 * self.amount)
+        self.assertEqual(march["transactions_count"], 4)
+        self.assertEqual(march["items_sold"], 6)
+
+
+class KeysetCursorTests(SalesTestCase):
+    def setUp(self):
+        super().setUp()
+        for number in range(7):
+            self.create_transaction(f"T-{number}", date=date(2026, 3, 1 + number % 3))
+        self.qs = DailySaleTransaction.objects.all()
+        self.ordered = list(self.qs.order_by("-date", "-created_at", "-id").values_list("pk", flat=True))
+
+    def test_round_trip(self):
+        first = keyset_page(self.qs, per_page=3)
+        second = keyset_page(self.qs, first.next_cursor, per_page=3)
+        third = keyset_page(self.qs, second.next_cursor, per_page=3)
+        self.assertEqual([tx.pk for page in (first, second, third) for tx in page], self.ordered)
+        self.assertFalse(first.has_previous)
+        self.assertFalse(third.has_next)
+
+        back = keyset_page(self.qs, second.previous_cursor, per_page=3)
+        self.assertEqual([tx.pk for tx in back], [tx.pk for tx in first])
+
+    def test_tampered_cursor_is_ignored(self):
+        cursor = keyset_page(self.qs, per_page=3).next_cursor
+        tampered = cursor[:-1] + ("A" if cursor[-1] != "A" else "B")
+        with self.assertLogs("daily_sale.pagination", "WARNING"):
+            self.assertEqual(decode_cursor(tampered, DailySaleTransaction, ["date", "created_at", "id"]), (None, "next"))
+        with self.assertLogs("daily_sale.pagination", "WARNING"):
+            page = keyset_page(self.qs, tampered, per_page=3)
+        self.assertEqual([tx.pk for tx in page], self.ordered[:3])
+
+
+class InvoiceNumberServiceTests(TestCase):
+    def test_numbers_are_unique_and_sequential(self):
+        numbers = [InvoiceNumberService.next_number(day=DAY) for _ in range(3)]
+        numbers += InvoiceNumberService.reserve_block(3, day=DAY)
+        self.assertEqual(numbers, [f"INV-20260310-{n:04d}" for n in range(1, 7)])
+        self.assertEqual(InvoiceNumberService.next_number(day=OTHER_DAY), "INV-20260312-0001")
+
+    def test_continues_after_existing_invoices(self):
+        DailySaleTransaction.objects.create(invoice_number="INV-20260310-0007", date=DAY)
+        self.assertEqual(InvoiceNumberService.next_number(day=DAY), "INV-20260310-0008")
+
+
+class ReconcileSalesTests(SalesTestCase):
+    def reconcile(self, **options):
+        out = StringIO()
+        call_command("reconcile_sales", stdout=out, **options)
+        return out.getvalue()
+
+    def test_detects_and_repairs_drift(self):
+        tx = self.create_transaction("T-1")
+        self.create_transaction("T-2", date=OTHER_DAY)
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(transaction=tx, amount=Decimal("30"), date=DAY)
+        self.assertIn("No drift found", self.reconcile())
+
+        # Writes that bypass the signals.
+        Payment.objects.bulk_create([Payment(transaction=tx, amount=Decimal("20"), date=DAY)])
+        DailySummary.objects.filter(date=OTHER_DAY).update(total_sales=Decimal("1"))
+        OutstandingCustomer.objects.filter(customer=self.customer).delete()
+
+        report = self.reconcile()
+        self.assertIn("Transactions: 1 with drifted payment fields", report)
+        self.assertIn("run with --fix", report)
+        self.assertEqual(DailySaleTransaction.objects.get(pk=tx.pk).advance, Decimal("30"))
+
+        self.assertIn("Repaired", self.reconcile(fix=True))
+        tx.refresh_from_db()
+        self.assertEqual(tx.advance, Decimal("50"))
+        self.assertFalse(transaction_drift().exists())
+        self.assertEqual(summary_drift(DAY, OTHER_DAY), {})
+        self.assertEqual(outstanding_drift([self.customer.id]), {})
+        self.assertIn("No drift found", self.reconcile())
+
+    def test_finalized_days_are_not_counted_as_repaired(self):
+        self.create_transaction("T-1")
+        DailySummary.objects.filter(date=DAY).update(is_final=True, total_sales=Decimal("1"))
+        report = self.reconcile(fix=True, only=["summaries"])
+        self.assertIn("Repaired 0 drifted row(s)", report)
+        self.assertEqual(DailySummary.objects.get(date=DAY).total_sales, Decimal("1"))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        for n in range(12):
+            Inventory_List.objects.create(product_name=f"Brake Disc {n}", code=f"BD{n:02d}")
+        Inventory_List.objects.create(product_name="Brake Pad", code="XY7")
+
+    def names(self, q, limit=25):
+        return [row["text"] for row in search("items", q, limit)]
+
+    def test_short_terms_are_filtered_before_the_limit(self):
+        self.assertEqual(self.names("brake xy", limit=1), ["Brake Pad"])
+        self.assertEqual(len(self.names("brake 1", limit=3)), 3)
+        self.assertEqual(self.names("ke"), self.names("KE"))
+
+    def test_falls_back_to_icontains_without_fts_hits(self):
+        if not fts_available():
+            self.skipTest("SQLite FTS table not available")
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        target = TARGETS["items"]
+        found = SqliteFtsSearchBackend().search(target, "brake pad", 5)
+        self.assertEqual([item.product_name for item in found], ["Brake Pad"])
+
+
+class CustomerViewTests(SalesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+        self.customer.user.first_name = "Owing"
+        self.customer.user.save()
+        self.settled = UserProfile.objects.get(user=User.objects.create(username="settled", first_name="Settled"))
+        self.unpaid = self.create_transaction("T-1")
+        partly_paid = self.create_transaction("T-2", date=OTHER_DAY)
+        paid = self.create_transaction("T-3", customer=self.settled)
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(transaction=partly_paid, amount=Decimal("50"), date=OTHER_DAY)
+            Payment.objects.create(transaction=paid, amount=paid.total_amount, date=DAY)
+        self.owed = self.unpaid.total_amount * 2 - 50
+
+    def get(self, name, **params):
+        response = self.client.get(reverse(f"daily_sale:{name}"), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("error", response.context)
+        return response
+
+    def test_outstanding_view(self):
+        response = self.get("outstanding")
+        rows = response.context["outstanding_customers"]
+        self.assertEqual([row["customer_id"] for row in rows], [str(self.customer.id)])
+        self.assertEqual(rows[0]["remaining_balance"], self.owed)
+        self.assertEqual(rows[0]["debt_transactions_count"], 2)
+        self.assertEqual(response.context["total_summary"]["total_paid"], Decimal("50"))
+        self.assertContains(response, "Owing")
+
+        self.assertEqual(self.get("outstanding", search="nobody").context["outstanding_customers"], [])
+
+    def test_cleared_transactions_require_every_sale_paid(self):
+        # One paid sale does not clear a customer who still owes on others.
+        paid = self.create_transaction("T-4")
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(transaction=paid, amount=paid.total_amount, date=DAY)
+
+        for clearance_table in (False, True):
+            with self.subTest(clearance_table=clearance_table), \
+                    override_settings(DAILY_SALE_CLEARANCE_TABLE=clearance_table):
+                response = self.get("cleared_transactions", period="all")
+                rows = response.context["cleared_customers"]
+                self.assertEqual([row["customer_id"] for row in rows], [str(self.settled.id)])
+                self.assertEqual(rows[0]["total_transactions"], 1)
+                self.assertEqual(len(rows[0]["transactions"]), 1)
+                self.assertEqual(response.context["stats"]["total_customers"], 1)
+
+    def test_customer_detail_query_count_is_constant(self):
+        url = reverse("daily_sale:customer_detail", kwargs={"customer_id": self.customer.id})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total_paid"], Decimal("50"))
+        self.assertEqual(response.context["total_balance"], self.owed)
+
+        part = Inventory_List.objects.create(product_name="Part", unit_price=10)
+        for number in range(4):
+            self.create_transaction(f"T-{number + 10}", item=part)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["transactions"]), 6)
+        self.assertEqual(len(response.context["open_transactions"]), 6)
+
+
+class SalesStatsTests(SalesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.parts = [Inventory_List.objects.create(product_name=f"Part {n}", code=f"P{n}", unit_price=10) for n in range(2)]
+        invoice = self.create_transaction("T-1", item=self.parts[0])
+        purchase = self.create_transaction("T-2", transaction_type="purchase")
+        with self.captureOnCommitCallbacks(execute=True):
+            LineItemService.create_items(invoice, [
+                {"item_id": str(self.parts[0].pk), "quantity": 3, "unit_price": 10},
+                {"item_id": str(self.parts[1].pk), "quantity": 4, "unit_price": 10},
+            ])
+            LineItemService.create_items(purchase, [{"item_id": str(self.parts[0].pk), "quantity": 50, "unit_price": 1}])
+        # A sale saved before line items existed counts its own item and quantity.
+        self.create_transaction("T-3", item=self.parts[1], quantity=5)
+
+    def test_items_sold_counts_line_quantities(self):
+        stats = SummaryService.get_transaction_stats(DailySaleTransaction.objects.all())
+        self.assertEqual(stats["items_sold"], 12)
+        self.assertEqual(DailySummary.objects.get(date=DAY).items_sold, 12)
+
+    def test_top_items_use_line_quantities(self):
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+        response = self.client.get(reverse("daily_sale:daily_summary"), {"report_type": "daily", "date": DAY.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row["item__product_name"], row["total_sold"], row["total_revenue"]) for row in response.context["top_items"]],
+            [("Part 1", 9, Decimal("567.00")), ("Part 0", 3, Decimal("31.50"))],
+        )
+
+
+@override_settings(DAILY_SALE_AUTOCOMPLETE_INDEX=True)
+class AutocompleteIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete_index._indexes.clear()
+        self.addCleanup(autocomplete_index._indexes.clear)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item = Inventory_List.objects.create(product_name="Brake Disc", code="BD1")
+
+    def names(self, q):
+        return [row["text"] for row in search("items", q, 10)]
+
+    def test_bumped_version_rebuilds_the_index(self):
+        self.assertEqual(self.names("bra"), ["Brake Disc"])
+        index = autocomplete_index.get_index("items")
+
+        # Without a version bump the worker keeps answering from its index.
+        Inventory_List.objects.filter(pk=self.item.pk).update(product_name="Clutch Plate")
+        self.assertIs(autocomplete_index.get_index("items"), index)
+        self.assertEqual(self.names("clu"), [])
+
+        version = autocomplete_index.current_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Inventory_List.objects.create(product_name="Brake Pad", code="BP1")
+        self.assertNotEqual(autocomplete_index.current_version(), version)
+        self.assertIsNot(autocomplete_index.get_index("items"), index)
+        self.assertEqual(self.names("bra"), ["Brake Pad"])
+        self.assertEqual(self.names("clu"), ["Clutch Plate"])
+
+
+class ItemAutofillTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create(username="staff", is_staff=True))
+        self.company = Company.objects.create(name="Almuqbil Trading")
+        self.container = Container.objects.create(container_number="MSCU1234567", name="Shanghai lot", company=self.company)
+        self.item, self.other = (
+            Inventory_List.objects.create(product_name=name, unit_price=10, container=self.container)
+            for name in ("Brake Disc", "Brake Pad")
+        )
+
+    def get(self, item, **headers):
+        return self.client.get(reverse("daily_sale:ajax_item_autofill"), {"item_id": str(item.pk)}, **headers)
+
+    def save(self, obj):
+        with self.captureOnCommitCallbacks(execute=True):
+            obj.save()
+
+    def test_etag_and_not_modified(self):
+        response = self.get(self.item)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["container_name"], "Shanghai lot")
+        self.assertEqual(response.json()["company_name"], "Almuqbil Trading")
+        etag = response["ETag"]
+
+        response = self.get(self.item, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_saved_item_or_container_changes_payload_and_etag(self):
+        etag = self.get(self.item)["ETag"]
+        self.get(self.other)
+
+        self.item.unit_price = 25
+        self.save(self.item)
+        # Only the saved item's entry is dropped.
+        self.assertIsNone(cache.get(AUTOFILL_KEY.format(self.item.pk)))
+        self.assertIsNotNone(cache.get(AUTOFILL_KEY.format(self.other.pk)))
+        response = self.get(self.item, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["unit_price"], 25.0)
+        self.assertNotEqual(response["ETag"], etag)
+
+        etags = {item.pk: self.get(item)["ETag"] for item in (self.item, self.other)}
+        self.container.name = "Jebel Ali lot"
+        self.save(self.container)
+        for item in (self.item, self.other):
+            response = self.get(item, HTTP_IF_NONE_MATCH=etags[item.pk])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["container_name"], "Jebel Ali lot")
+
+        self.company.name = "Almuqbil Group"
+        self.save(self.company)
+        self.assertEqual(self.get(self.other).json()["company_name"], "Almuqbil Group")
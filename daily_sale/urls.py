@@ -14,6 +14,7 @@ urlpatterns = [
     path("outstanding/", views.outstanding_view, name="outstanding"),
     path('customer/transaction/<uuid:transaction_id>/edit/', views.customer_transaction_edit, name='customer_transaction_edit'),
     path('customers/', views.customer_detail, name='customer_detail'),
+    path('customers/<uuid:customer_id>/', views.customer_detail, name='customer_detail'),
     path('ajax/items/', views.ajax_search_items, name='ajax_search_items'),
     path('ajax/companies/', views.ajax_search_companies, name='ajax_search_companies'),
     path('ajax/customers/', views.ajax_search_customers, name='ajax_search_customers'),
@@ -2,47 +2,34 @@
 import logging
 from decimal import Decimal
 from datetime import timedelta
-from django.db import transaction as db_transaction
-from django.db.models import Sum, Count, Q
+from django.db import connection, transaction as db_transaction
+from django.db.models import Sum, Count, Q, F, Case, When, Value, ExpressionWrapper, DecimalField, FloatField, Subquery, OuterRef, Max, Min
+from django.db.models.functions import Cast, Coalesce, ExtractMonth, ExtractYear
 from django.utils import timezone
-from .models import DailySaleTransaction, Payment, DailySummary, OutstandingCustomer
+from .models import (
+    DailySaleTransaction,
+    Payment,
+    DailySummary,
+    MonthlySummary,
+    YearlySummary,
+    OutstandingCustomer,
+    CustomerClearance,
+)
+from .services import SummaryService
+from .report import sales_timeseries as report_timeseries
 
 logger = logging.getLogger(__name__)
-def _aggregate_transactions(qs, tx_type=None):
-    """Aggregate total, count, items for a queryset of transactions"""
-    if tx_type:
-        qs = qs.filter(transaction_type=tx_type)
-    
-    result = qs.aggregate(
-        total=Sum('total_amount'),
-        count=Count('id'),
-    )
-
-    if tx_type == 'sale':
-        items_sold_result = qs.aggregate(
-            items_sold=Sum('quantity')
-        )
-        result['items_sold'] = items_sold_result['items_sold']
-    else:
-        result['items_sold'] = None
-    
-    return result
-
 def get_sales_summary(start_date, end_date):
     try:
-        sales_agg = _aggregate_transactions(DailySaleTransaction.objects.filter(date__range=[start_date, end_date]), 'sale')
-        purchase_agg = _aggregate_transactions(DailySaleTransaction.objects.filter(date__range=[start_date, end_date]), 'purchase')
-
-        total_sales = sales_agg['total'] or Decimal('0.00')
-        total_purchases = purchase_agg['total'] or Decimal('0.00')
-        net_revenue = total_sales - total_purchases
-
+        agg = DailySaleTransaction.objects.filter(date__range=[start_date, end_date]).aggregate(
+            **SummaryService.transaction_aggregates('total_sales', 'total_purchases', 'sales_count', 'items_sold')
+        )
         return {
-            'total_sales': total_sales,
-            'total_purchases': total_purchases,
-            'net_revenue': net_revenue,
-            'transactions_count': sales_agg['count'] or 0,
-            'items_sold': sales_agg['items_sold'] or 0,
+            'total_sales': agg['total_sales'],
+            'total_purchases': agg['total_purchases'],
+            'net_revenue': agg['total_sales'] - agg['total_purchases'],
+            'transactions_count': agg['sales_count'],
+            'items_sold': agg['items_sold'],
         }
     except Exception as e:
         logger.exception("Error in get_sales_summary")
@@ -51,43 +38,59 @@ def get_sales_summary(start_date, end_date):
 
 def sales_timeseries(start_date, end_date, group_by='day'):
     try:
-        if DailySummary.objects.filter(date__range=[start_date, end_date]).exists():
-            return _timeseries_from_summary(start_date, end_date)
-        return _timeseries_from_transactions(start_date, end_date)
+        return report_timeseries(start_date, end_date, group_by=group_by)
     except Exception:
         logger.exception("Error in sales_timeseries")
         return []
 
-def _timeseries_from_summary(start_date, end_date):
-    summaries = DailySummary.objects.filter(date__range=[start_date, end_date]).order_by('date')
-    return [
-        {
-            'date': s.date,
-            'total_sales': s.total_sales,
-            'total_purchases': s.total_purchases,
-            'transactions_count': s.transactions_count,
-            'items_sold': s.items_sold,
-        } for s in summaries
-    ]
-
-def _timeseries_from_transactions(start_date, end_date):
-    timeseries = []
-    delta = end_date - start_date
-    for i in range(delta.days + 1):
-        current_date = start_date + timedelta(days=i)
-        sales_agg = _aggregate_transactions(DailySaleTransaction.objects.filter(date=current_date), 'sale')
-        purchase_agg = _aggregate_transactions(DailySaleTransaction.objects.filter(date=current_date), 'purchase')
-        timeseries.append({
-            'date': current_date,
-            'total_sales': sales_agg['total'] or Decimal('0.00'),
-            'total_purchases': purchase_agg['total'] or Decimal('0.00'),
-            'transactions_count': sales_agg['count'] or 0,
-            'items_sold': sales_agg['items_sold'] or 0,
-        })
-    return timeseries
-
-
-def recompute_daily_summary_for_date(target_date):
+
+DAILY_SUMMARY_AGGREGATES = (
+    'total_sales', 'total_purchases', 'transactions_count', 'items_sold',
+    'customers_count', 'total_tax', 'total_discount', 'total_paid',
+    'paid_transactions', 'partial_transactions', 'unpaid_transactions',
+    'total_outstanding',
+)
+
+
+# DailySummary fields that add up across days; customers_count does not, so rollups skip it.
+ROLLUP_FIELDS = (
+    'total_sales', 'total_purchases', 'total_profit', 'net_balance', 'transactions_count',
+    'items_sold', 'total_tax', 'total_discount', 'total_paid', 'paid_transactions',
+    'partial_transactions', 'unpaid_transactions', 'total_outstanding',
+)
+
+
+def summary_values_from_aggregates(agg, payments_total):
+    """Derive the remaining DailySummary fields from a transaction aggregate row."""
+    values = {field: agg[field] for field in DAILY_SUMMARY_AGGREGATES}
+    values['total_profit'] = agg['total_sales'] - agg['total_purchases']
+    values['net_balance'] = agg['total_sales'] - (payments_total or Decimal('0.00'))
+    values['avg_transaction_value'] = (
+        agg['total_sales'] / agg['transactions_count'] if agg['transactions_count'] else Decimal('0.00')
+    )
+    return values
+
+
+def compute_daily_summary_values(target_date):
+    """
+    All DailySummary fields for one date: one conditional aggregate over the
+    day's transactions plus one sum over the day's payments. Returns None when
+    the date has no transactions.
+    """
+    agg = DailySaleTransaction.objects.filter(date=target_date).aggregate(
+        **SummaryService.transaction_aggregates(*DAILY_SUMMARY_AGGREGATES)
+    )
+    if not agg['transactions_count']:
+        return None
+    payments_total = Payment.objects.filter(date=target_date).aggregate(total=Sum('amount'))['total']
+    return summary_values_from_aggregates(agg, payments_total)
+
+
+def recompute_daily_summary_for_date(target_date, raise_errors=False, force=False):
+    """
+    Rebuild the DailySummary row of ``target_date``. Finalized days are left
+    untouched unless ``force`` is set (see ``correct_daily_summary``).
+    """
     if not target_date:
         logger.warning("recompute_daily_summary_for_date called with no date")
         return None
@@ -95,141 +98,652 @@ def recompute_daily_summary_for_date(target_date):
     logger.info(f"Recomputing DailySummary for {target_date}")
     try:
         with db_transaction.atomic():
-            transactions = DailySaleTransaction.objects.filter(date=target_date)
-            if not transactions.exists():
-                DailySummary.objects.filter(date=target_date).delete()
-                return None
+            existing = DailySummary.objects.select_for_update().filter(date=target_date).first()
+            if existing and existing.is_final and not force:
+                logger.info(f"Summary for {target_date} is final, skipping recompute")
+                return existing
 
-            sales_agg = _aggregate_transactions(transactions, 'sale')
-            purchase_agg = _aggregate_transactions(transactions, 'purchase')
-
-            total_sales = sales_agg['total'] or Decimal('0.00')
-            total_purchases = purchase_agg['total'] or Decimal('0.00')
-            transactions_count = transactions.count()
-            items_sold = sales_agg['items_sold'] or 0
-            customers_count = transactions.filter(transaction_type='sale').values('customer').distinct().count()
-            total_profit = total_sales - total_purchases
-            payments_total = Payment.objects.filter(date=target_date).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-            net_balance = total_sales - payments_total
-            
-            # محاسبه آمار اضافی
-            total_tax = transactions.aggregate(total=Sum('tax_amount'))['total'] or Decimal('0.00')
-            total_discount = transactions.aggregate(total=Sum('discount'))['total'] or Decimal('0.00')
-            total_paid = transactions.aggregate(total=Sum('advance'))['total'] or Decimal('0.00')
-            
-            paid_transactions = transactions.filter(payment_status='paid').count()
-            partial_transactions = transactions.filter(payment_status='partial').count()
-            unpaid_transactions = transactions.filter(payment_status='unpaid').count()
-            
-            total_outstanding = transactions.filter(balance__gt=0).aggregate(
-                total=Sum('balance')
-            )['total'] or Decimal('0.00')
-            
-            avg_transaction_value = Decimal('0.00')
-            if transactions_count > 0:
-                avg_transaction_value = total_sales / transactions_count
+            old = {field: getattr(existing, field) for field in ROLLUP_FIELDS} if existing else {}
+            values = compute_daily_summary_values(target_date)
+            if values is None:
+                if existing:
+                    existing.delete()
+                    apply_rollup_delta(target_date, {**{f: -v for f, v in old.items()}, 'days_count': -1})
+                return None
 
             summary, created = DailySummary.objects.update_or_create(
                 date=target_date,
-                defaults={
-                    'total_sales': total_sales,
-                    'total_purchases': total_purchases,
-                    'total_profit': total_profit,
-                    'net_balance': net_balance,
-                    'transactions_count': transactions_count,
-                    'items_sold': items_sold,
-                    'customers_count': customers_count,
-                    'total_tax': total_tax,
-                    'total_discount': total_discount,
-                    'total_paid': total_paid,
-                    'paid_transactions': paid_transactions,
-                    'partial_transactions': partial_transactions,
-                    'unpaid_transactions': unpaid_transactions,
-                    'total_outstanding': total_outstanding,
-                    'avg_transaction_value': avg_transaction_value,
-                    'updated_at': timezone.now(),
-                    'is_final': False,
-                }
+                defaults={**values, 'updated_at': timezone.now(), 'is_final': bool(existing and existing.is_final)},
             )
+            apply_rollup_delta(target_date, {
+                **{field: values[field] - old.get(field, 0) for field in ROLLUP_FIELDS},
+                'days_count': 0 if existing else 1,
+            })
             logger.info(f"{'Created' if created else 'Updated'} summary for {target_date}")
-            logger.info(f"   Sales: {total_sales:,.2f} AED")
-            logger.info(f"   Outstanding: {total_outstanding:,.2f} AED")
-            logger.info(f"   Items: {items_sold}")
+            logger.info(f"   Sales: {values['total_sales']:,.2f} AED")
+            logger.info(f"   Outstanding: {values['total_outstanding']:,.2f} AED")
+            logger.info(f"   Items: {values['items_sold']}")
             return summary
     except Exception as e:
         logger.exception(f"Error in recompute_daily_summary_for_date: {e}")
+        if raise_errors:
+            raise
         return None
 
-def recompute_outstanding_for_customer(customer_id):
+# Fields on DailySaleTransaction that feed DailySummary. Signal handlers snapshot
+# these before a save so that only the difference is applied to the summary row.
+SUMMARY_SOURCE_FIELDS = (
+    'date', 'transaction_type', 'customer_id', 'quantity', 'total_amount',
+    'tax_amount', 'discount', 'advance', 'balance', 'payment_status',
+)
+
+
+def summary_state(tx, line_quantity=None):
+    """
+    Snapshot of the summary-relevant fields of a transaction. ``line_quantity``
+    is the summed quantity of its line items, None when it has none (the
+    header ``quantity`` counts then, as in ``items_sold``).
+    """
+    return {**{field: getattr(tx, field) for field in SUMMARY_SOURCE_FIELDS}, 'line_quantity': line_quantity}
+
+
+def _items_sold(state):
+    if state['transaction_type'] != 'sale':
+        return 0
+    return state['line_quantity'] if state['line_quantity'] is not None else state['quantity'] or 0
+
+
+def _summary_contribution(state):
+    """What a single transaction adds to the DailySummary row of its date."""
+    is_sale = state['transaction_type'] == 'sale'
+    is_purchase = state['transaction_type'] == 'purchase'
+    total = state['total_amount'] or Decimal('0.00')
+    sales = total if is_sale else Decimal('0.00')
+    purchases = total if is_purchase else Decimal('0.00')
+    balance = state['balance'] or Decimal('0.00')
+    status = state['payment_status']
+    return {
+        'total_sales': sales,
+        'total_purchases': purchases,
+        'total_profit': sales - purchases,
+        'net_balance': sales,
+        'transactions_count': 1,
+        'items_sold': _items_sold(state),
+        'total_tax': state['tax_amount'] or Decimal('0.00'),
+        'total_discount': state['discount'] or Decimal('0.00'),
+        'total_paid': state['advance'] or Decimal('0.00'),
+        'paid_transactions': 1 if status == 'paid' else 0,
+        'partial_transactions': 1 if status == 'partial' else 0,
+        'unpaid_transactions': 1 if status == 'unpaid' else 0,
+        'total_outstanding': balance if balance > 0 else Decimal('0.00'),
+    }
+
+
+def _customer_day_key(state):
+    if state and state['transaction_type'] == 'sale' and state['customer_id']:
+        return state['customer_id'], state['date']
+    return None
+
+
+def _customers_count_expression(target_date):
+    """Distinct customers cannot be maintained by +/-1 safely, so count them in SQL."""
+    customers = DailySaleTransaction.objects.filter(
+        date=target_date, transaction_type='sale', customer__isnull=False
+    ).order_by().values('date').annotate(c=Count('customer', distinct=True)).values('c')
+    return Coalesce(Subquery(customers), Value(0))
+
+
+def apply_summary_delta(target_date, delta, refresh_customers=False):
+    """
+    Apply signed field deltas to the DailySummary row of ``target_date`` with a
+    single ``F()`` update. Returns False when the date has no summary row yet,
+    in which case the caller should schedule a full recompute. A row left
+    without transactions is deleted, as a full recompute would. The same
+    change is pushed to the month and year rollups. Finalized rows are never
+    changed here.
+    """
+    delta = {field: value for field, value in delta.items() if value}
+    if not target_date or not (delta or refresh_customers):
+        return True
+
+    updates = {field: F(field) + value for field, value in delta.items()}
+    if refresh_customers:
+        updates['customers_count'] = _customers_count_expression(target_date)
+    new_sales = F('total_sales') + delta.get('total_sales', 0)
+    new_count = F('transactions_count') + delta.get('transactions_count', 0)
+    if connection.vendor == 'sqlite':
+        # SQLite keeps whole-number decimals as integers and would divide them as such.
+        new_count = Cast(new_count, FloatField())
+    updates['avg_transaction_value'] = Case(
+        When(Q(transactions_count__gt=-delta.get('transactions_count', 0)),
+             then=ExpressionWrapper(new_sales / new_count, output_field=DecimalField())),
+        default=Value(Decimal('0.00')),
+        output_field=DecimalField(),
+    )
+    updates['updated_at'] = timezone.now()
+
+    if DailySummary.objects.filter(date=target_date, is_final=False).update(**updates):
+        rollup_delta = delta
+        if delta.get('transactions_count', 0) < 0:
+            emptied = DailySummary.objects.filter(date=target_date, is_final=False, transactions_count=0)
+            remaining = emptied.values(*ROLLUP_FIELDS).first()
+            if remaining:
+                emptied.delete()
+                # The rollups lose the whole row, not only this change.
+                rollup_delta = {field: delta.get(field, 0) - remaining[field] for field in ROLLUP_FIELDS}
+                rollup_delta['days_count'] = -1
+        apply_rollup_delta(target_date, rollup_delta)
+        return True
+    if DailySummary.objects.filter(date=target_date, is_final=True).exists():
+        logger.warning(f"DailySummary {target_date} is final; change not applied (use correct_daily_summary)")
+        return True
+    return False
+
+
+def apply_transaction_delta(old_state, new_state):
+    """
+    Push the difference between two transaction snapshots into DailySummary.
+    ``old_state`` is None on create, ``new_state`` is None on delete. Returns
+    the dates that still need a full recompute.
+    """
+    deltas = {}
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if not state or not state['date']:
+            continue
+        day = deltas.setdefault(state['date'], {})
+        for field, value in _summary_contribution(state).items():
+            day[field] = day.get(field, 0) + sign * value
+
+    refresh_dates = set()
+    old_key = _customer_day_key(old_state)
+    new_key = _customer_day_key(new_state)
+    if old_key != new_key:
+        refresh_dates = {key[1] for key in (old_key, new_key) if key and key[1]}
+
+    return {
+        target_date for target_date in set(deltas) | refresh_dates
+        if not apply_summary_delta(
+            target_date, deltas.get(target_date, {}), refresh_customers=target_date in refresh_dates,
+        )
+    }
+
+
+def apply_line_quantity_delta(tx, old_quantity, new_quantity):
+    """
+    Push a change of a saved transaction's line items into ``items_sold``.
+    Line items are bulk-written without signals, so the caller passes their
+    summed quantity before and after (None when there were none). Returns the
+    dates that still need a full recompute.
+    """
+    state = summary_state(tx)
+    delta = _items_sold({**state, 'line_quantity': new_quantity}) - _items_sold({**state, 'line_quantity': old_quantity})
+    if not delta or apply_summary_delta(tx.date, {'items_sold': delta}):
+        return set()
+    return {tx.date}
+
+
+def apply_payment_delta(old_state, new_state):
+    """
+    Payments only move ``net_balance`` of the day they were received on.
+    Returns the dates that still need a full recompute.
+    """
+    deltas = {}
+    for state, sign in ((old_state, 1), (new_state, -1)):
+        if state and state['date']:
+            deltas[state['date']] = deltas.get(state['date'], 0) + sign * (state['amount'] or Decimal('0.00'))
+    return {
+        target_date for target_date, amount in deltas.items()
+        if not apply_summary_delta(target_date, {'net_balance': amount})
+    }
+
+
+def payments_total_subquery(outer_ref='pk'):
+    """Sum of a transaction's payments as a correlated subquery (0 when none)."""
+    payments = Payment.objects.filter(transaction=OuterRef(outer_ref)).order_by().values(
+        'transaction'
+    ).annotate(total=Sum('amount')).values('total')
+    return Coalesce(Subquery(payments), Value(Decimal('0.00')), output_field=DecimalField(max_digits=20, decimal_places=2))
+
+
+OUTSTANDING_AGGREGATES = {
+    'total_debt': Coalesce(Sum('balance', filter=Q(balance__gt=0)), Value(Decimal('0.00')),
+                           output_field=DecimalField(max_digits=24, decimal_places=2)),
+    'transactions_count': Count('id', filter=Q(balance__gt=0)),
+    'last_transaction': Max('date', filter=Q(balance__gt=0)),
+}
+
+
+def _outstanding_rows(customer_ids):
+    """One grouped query: ``{customer_id: aggregates}`` for customers that still owe money."""
+    rows = DailySaleTransaction.objects.filter(customer_id__in=customer_ids).order_by().values(
+        'customer_id'
+    ).annotate(**OUTSTANDING_AGGREGATES).filter(total_debt__gt=0)
+    return {row['customer_id']: row for row in rows}
+
+
+def _save_outstanding(customer_ids, rows):
+    """Upsert OutstandingCustomer for ``rows`` and drop the other ``customer_ids``."""
+    now = timezone.now()
+    if rows:
+        OutstandingCustomer.objects.bulk_create(
+            [
+                OutstandingCustomer(
+                    customer_id=customer_id,
+                    total_debt=row['total_debt'],
+                    transactions_count=row['transactions_count'],
+                    last_transaction=row['last_transaction'],
+                    updated_at=now,
+                )
+                for customer_id, row in rows.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=['total_debt', 'transactions_count', 'last_transaction', 'updated_at'],
+        )
+    cleared = [c for c in customer_ids if c not in rows]
+    deleted = 0
+    if cleared:
+        deleted, _ = OutstandingCustomer.objects.filter(customer_id__in=cleared).delete()
+    return deleted
+
+
+def recompute_outstanding_for_customer(customer_id, raise_errors=False):
     if not customer_id:
         logger.warning("recompute_outstanding_for_customer called with no customer_id")
         return
 
     try:
         with db_transaction.atomic():
-            transactions = DailySaleTransaction.objects.filter(customer_id=customer_id)
-            
-            if not transactions.exists():
-                OutstandingCustomer.objects.filter(customer_id=customer_id).delete()
-                logger.info(f"No transactions found for customer {customer_id}, removed from outstanding")
-                return
-
-            total_debt = Decimal('0.00')
-            tx_count = 0
-            last_tx_date = None
-            
-            for tx in transactions:
-                if tx.balance > Decimal('0.00'):
-                    total_debt += tx.balance
-                    tx_count += 1
-                    if last_tx_date is None or tx.date > last_tx_date:
-                        last_tx_date = tx.date
-
-            if total_debt > Decimal('0.00'):
-                obj, created = OutstandingCustomer.objects.update_or_create(
-                    customer_id=customer_id,
-                    defaults={
-                        'total_debt': total_debt,
-                        'transactions_count': tx_count,
-                        'last_transaction': last_tx_date,
-                        'updated_at': timezone.now(),
-                    }
-                )
-                logger.info(f"Updated outstanding for customer {customer_id}: {total_debt:,.2f} AED ({'created' if created else 'updated'})")
-            else:
-                deleted_count, _ = OutstandingCustomer.objects.filter(customer_id=customer_id).delete()
-                if deleted_count > 0:
-                    logger.info(f"Removed customer {customer_id} from outstanding (no debt)")
-                else:
-                    logger.info(f"Customer {customer_id} already not in outstanding")
+            row = DailySaleTransaction.objects.filter(customer_id=customer_id).aggregate(**OUTSTANDING_AGGREGATES)
+
+            if row['total_debt'] > Decimal('0.00'):
+                _save_outstanding([customer_id], {customer_id: row})
+                logger.info(f"Updated outstanding for customer {customer_id}: {row['total_debt']:,.2f} AED")
+            elif _save_outstanding([customer_id], {}):
+                logger.info(f"Removed customer {customer_id} from outstanding (no debt)")
 
     except Exception as e:
         logger.exception(f"Error in recompute_outstanding_for_customer {customer_id}: {str(e)}")
+        if raise_errors:
+            raise
+
+
+def recompute_outstanding_for_customers(customer_ids, raise_errors=False):
+    """Bulk variant of ``recompute_outstanding_for_customer``: one grouped query for all ids."""
+    # Normalise ids (e.g. strings from SummaryJob.target) to the values the grouped query returns.
+    to_pk = OutstandingCustomer._meta.get_field('customer').target_field.to_python
+    customer_ids = {to_pk(c) for c in customer_ids if c}
+    if not customer_ids:
+        return
+    if len(customer_ids) == 1:
+        return recompute_outstanding_for_customer(customer_ids.pop(), raise_errors=raise_errors)
+
+    try:
+        with db_transaction.atomic():
+            rows = _outstanding_rows(customer_ids)
+            removed = _save_outstanding(customer_ids, rows)
+        logger.info(f"Updated outstanding for {len(rows)} customer(s), removed {removed}")
+    except Exception as e:
+        logger.exception(f"Error in recompute_outstanding_for_customers: {str(e)}")
+        if raise_errors:
+            raise
+
+def rebuild_outstanding(chunk_size=None):
+    """
+    Rebuild the whole OutstandingCustomer table from transactions.
+
+    Debtors come from one ``GROUP BY customer_id`` query (paged by customer id
+    when ``chunk_size`` is given) and are bulk upserted; rows not refreshed by
+    this run are deleted in a single statement. Returns ``(upserted, deleted)``.
+    """
+    started = timezone.now()
+    grouped = DailySaleTransaction.objects.filter(customer__isnull=False).order_by().values(
+        'customer_id'
+    ).annotate(**OUTSTANDING_AGGREGATES).filter(total_debt__gt=0)
+
+    upserted = 0
+    last_customer_id = None
+    while True:
+        qs = grouped
+        if chunk_size:
+            if last_customer_id is not None:
+                qs = qs.filter(customer_id__gt=last_customer_id)
+            qs = qs.order_by('customer_id')[:chunk_size]
+        rows = {row['customer_id']: row for row in qs}
+        if rows:
+            with db_transaction.atomic():
+                _save_outstanding([], rows)
+            upserted += len(rows)
+        if not chunk_size or len(rows) < chunk_size:
+            break
+        last_customer_id = list(rows)[-1]
+
+    deleted, _ = OutstandingCustomer.objects.filter(updated_at__lt=started).delete()
+    logger.info(f"Rebuilt outstanding ledger: {upserted} upserted, {deleted} removed")
+    return upserted, deleted
+
+
+CLEARANCE_FIELDS = ('total_cleared_amount', 'transactions_count', 'first_transaction_date', 'last_payment_date')
+
+
+def cleared_customer_rows(start_date=None, end_date=None):
+    """
+    Customers whose sales (between ``start_date`` and ``end_date`` when given)
+    are all paid: one ``GROUP BY customer_id`` over DailySaleTransaction with
+    the cleared total, sale count, first sale date and last payment date.
+    The last payment comes from a correlated subquery so the payments join
+    does not multiply the sums.
+    """
+    sales = DailySaleTransaction.objects.filter(customer__isnull=False, transaction_type='sale')
+    payments = Payment.objects.filter(
+        transaction__customer_id=OuterRef('customer_id'), transaction__transaction_type='sale'
+    )
+    if start_date and end_date:
+        sales = sales.filter(date__range=(start_date, end_date))
+        payments = payments.filter(transaction__date__range=(start_date, end_date))
+    last_payment = payments.order_by().values('transaction__customer_id').annotate(last=Max('date')).values('last')
+
+    return sales.order_by().values('customer_id').annotate(
+        total_cleared_amount=Coalesce(Sum('total_amount'), Value(Decimal('0.00')),
+                                      output_field=DecimalField(max_digits=24, decimal_places=2)),
+        transactions_count=Count('id'),
+        unpaid_count=Count('id', filter=~Q(payment_status='paid')),
+        first_transaction_date=Min('date'),
+    ).filter(unpaid_count=0).annotate(last_payment_date=Subquery(last_payment))
+
+
+def recompute_clearance_for_customers(customer_ids, raise_errors=False):
+    """Upsert CustomerClearance for the cleared ``customer_ids`` and drop the rest."""
+    to_pk = CustomerClearance._meta.get_field('customer').target_field.to_python
+    customer_ids = {to_pk(c) for c in customer_ids if c}
+    if not customer_ids:
+        return
+
+    try:
+        with db_transaction.atomic():
+            rows = list(cleared_customer_rows().filter(customer_id__in=customer_ids))
+            _save_clearances(rows)
+            CustomerClearance.objects.filter(customer_id__in=customer_ids).exclude(
+                customer_id__in=[row['customer_id'] for row in rows]
+            ).delete()
+    except Exception as e:
+        logger.exception(f"Error in recompute_clearance_for_customers: {str(e)}")
+        if raise_errors:
+            raise
+
+
+def _save_clearances(rows):
+    if not rows:
+        return
+    now = timezone.now()
+    CustomerClearance.objects.bulk_create(
+        [
+            CustomerClearance(customer_id=row['customer_id'], updated_at=now,
+                              **{field: row[field] for field in CLEARANCE_FIELDS})
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['customer'],
+        update_fields=[*CLEARANCE_FIELDS, 'updated_at'],
+    )
+
+
+def rebuild_clearances():
+    """Rebuild the whole CustomerClearance table. Returns ``(upserted, deleted)``."""
+    started = timezone.now()
+    with db_transaction.atomic():
+        rows = list(cleared_customer_rows())
+        _save_clearances(rows)
+        deleted, _ = CustomerClearance.objects.filter(updated_at__lt=started).delete()
+    logger.info(f"Rebuilt customer clearances: {len(rows)} upserted, {deleted} removed")
+    return len(rows), deleted
+
+
+def daily_summary_values_for_range(start_date, end_date):
+    """
+    ``{date: DailySummary field values}`` for every day with transactions
+    between ``start_date`` and ``end_date``, from one grouped transaction
+    query and one grouped payment query.
+    """
+    aggregates = DailySaleTransaction.objects.filter(date__range=(start_date, end_date)).order_by().values(
+        'date'
+    ).annotate(**SummaryService.transaction_aggregates(*DAILY_SUMMARY_AGGREGATES))
+    payments = dict(
+        Payment.objects.filter(date__range=(start_date, end_date)).order_by().values('date')
+        .annotate(total=Sum('amount')).values_list('date', 'total')
+    )
+    return {
+        agg['date']: summary_values_from_aggregates(agg, payments.get(agg['date']))
+        for agg in aggregates
+        if agg['transactions_count']
+    }
+
+
+def recompute_daily_summaries_for_range(start_date, end_date, force=False):
+    """
+    Recompute every DailySummary between ``start_date`` and ``end_date``
+    (inclusive) with one grouped transaction query and one grouped payment
+    query, written by a single bulk upsert. Summaries for dates that no
+    longer have transactions are deleted. Finalized days are skipped unless
+    ``force`` is set, in which case they are rebuilt and stay final.
+    Returns ``(written, deleted)``.
+    """
+    with db_transaction.atomic():
+        final_dates = set(
+            DailySummary.objects.filter(date__range=(start_date, end_date), is_final=True)
+            .values_list('date', flat=True)
+        )
+        now = timezone.now()
+        summaries = [
+            DailySummary(date=day, updated_at=now, is_final=day in final_dates, **values)
+            for day, values in daily_summary_values_for_range(start_date, end_date).items()
+            if force or day not in final_dates
+        ]
+        if summaries:
+            DailySummary.objects.bulk_create(
+                summaries,
+                update_conflicts=True,
+                unique_fields=['date'],
+                update_fields=[
+                    *DAILY_SUMMARY_AGGREGATES, 'total_profit', 'net_balance',
+                    'avg_transaction_value', 'updated_at', 'is_final',
+                ],
+            )
+        stale = DailySummary.objects.filter(date__range=(start_date, end_date)).exclude(
+            date__in=[summary.date for summary in summaries]
+        )
+        if not force:
+            stale = stale.exclude(is_final=True)
+        deleted, _ = stale.delete()
+        refresh_rollups(start_date, end_date, force=force)
+
+    logger.info(f"Recomputed {len(summaries)} summaries for {start_date}..{end_date}, removed {deleted}")
+    return len(summaries), deleted
+
+
+def apply_rollup_delta(target_date, delta):
+    """
+    Add a DailySummary change of ``target_date`` to its MonthlySummary and
+    YearlySummary rows with one ``F()`` update each (``days_count`` in
+    ``delta`` counts day rows added or removed). Finalized periods are left
+    alone; a period without a row yet is built with ``refresh_rollups``, and
+    periods left without days are deleted.
+    """
+    delta = {field: value for field, value in delta.items() if value and (field in ROLLUP_FIELDS or field == 'days_count')}
+    if not target_date or not delta:
+        return
+    updates = {field: F(field) + value for field, value in delta.items()}
+    updates['updated_at'] = timezone.now()
+
+    month = MonthlySummary.objects.filter(year=target_date.year, month=target_date.month)
+    year = YearlySummary.objects.filter(year=target_date.year)
+    if not month.filter(is_final=False).update(**updates):
+        if not month.exists():
+            refresh_rollups(target_date, target_date)
+        return
+    if not year.filter(is_final=False).update(**updates):
+        if not year.exists():
+            refresh_rollups(target_date, target_date)
+        return
+    if delta.get('days_count', 0) < 0:
+        month.filter(is_final=False, days_count=0).delete()
+        year.filter(is_final=False, days_count=0).delete()
+
+
+def _month_end(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+def refresh_rollups(start_date, end_date, force=False):
+    """
+    Rebuild the MonthlySummary rows of every month touching ``start_date..end_date``
+    from DailySummary, then the YearlySummary rows of those years from the
+    months. Periods left without daily rows are deleted. Finalized periods
+    are kept as they are unless ``force`` is set.
+    """
+    if not start_date or not end_date:
+        return
+    first_day = min(start_date, end_date).replace(day=1)
+    last_day = _month_end(max(start_date, end_date))
+    sums = {field: Sum(field) for field in ROLLUP_FIELDS}
+
+    with db_transaction.atomic():
+        now = timezone.now()
+        month_scope = MonthlySummary.objects.filter(
+            Q(year__gt=first_day.year) | Q(year=first_day.year, month__gte=first_day.month),
+            Q(year__lt=last_day.year) | Q(year=last_day.year, month__lte=last_day.month),
+        )
+        year_scope = YearlySummary.objects.filter(year__range=(first_day.year, last_day.year))
+        final_months = set(month_scope.filter(is_final=True).values_list('year', 'month'))
+        final_years = set(year_scope.filter(is_final=True).values_list('year', flat=True))
+
+        months = DailySummary.objects.filter(date__range=(first_day, last_day)).annotate(
+            year=ExtractYear('date'), month=ExtractMonth('date')
+        ).order_by().values('year', 'month').annotate(**sums, days_count=Count('id'))
+        monthly = [
+            MonthlySummary(updated_at=now, is_final=(row['year'], row['month']) in final_months, **row)
+            for row in months
+            if force or (row['year'], row['month']) not in final_months
+        ]
+        if monthly:
+            MonthlySummary.objects.bulk_create(
+                monthly,
+                update_conflicts=True,
+                unique_fields=['year', 'month'],
+                update_fields=[*ROLLUP_FIELDS, 'days_count', 'updated_at', 'is_final'],
+            )
+        stale_months = month_scope.filter(updated_at__lt=now)
+        (stale_months if force else stale_months.exclude(is_final=True)).delete()
+
+        years = MonthlySummary.objects.filter(year__range=(first_day.year, last_day.year)).order_by().values(
+            'year'
+        ).annotate(**sums, days_count=Sum('days_count'))
+        yearly = [
+            YearlySummary(updated_at=now, is_final=row['year'] in final_years, **row)
+            for row in years
+            if force or row['year'] not in final_years
+        ]
+        if yearly:
+            YearlySummary.objects.bulk_create(
+                yearly,
+                update_conflicts=True,
+                unique_fields=['year'],
+                update_fields=[*ROLLUP_FIELDS, 'days_count', 'updated_at', 'is_final'],
+            )
+        stale_years = year_scope.filter(updated_at__lt=now)
+        (stale_years if force else stale_years.exclude(is_final=True)).delete()
+
+    logger.info(f"Refreshed rollups for {first_day:%Y-%m}..{last_day:%Y-%m}: {len(monthly)} month(s), {len(yearly)} year(s)")
+
+
+def summary_date_bounds():
+    """First and last date covered by transactions or existing summaries, or ``(None, None)``."""
+    tx_bounds = DailySaleTransaction.objects.aggregate(first=Min('date'), last=Max('date'))
+    summary_bounds = DailySummary.objects.aggregate(first=Min('date'), last=Max('date'))
+    first = min(filter(None, (tx_bounds['first'], summary_bounds['first'])), default=None)
+    last = max(filter(None, (tx_bounds['last'], summary_bounds['last'])), default=None)
+    return first, last
+
 
 def generate_daily_summaries_for_range(start_date, end_date):
-    success = error = 0
-    for i in range((end_date - start_date).days + 1):
-        if recompute_daily_summary_for_date(start_date + timedelta(days=i)):
-            success += 1
-        else:
-            error += 1
-    logger.info(f"Generated {success} summaries, {error} errors")
-    return success, error
+    try:
+        written, _ = recompute_daily_summaries_for_range(start_date, end_date)
+    except Exception as e:
+        logger.exception(f"Error generating summaries for {start_date}..{end_date}: {str(e)}")
+        return 0, 1
+    logger.info(f"Generated {written} summaries")
+    return written, 0
 
 def recompute_all_summaries(start_date=None, end_date=None):
-    qs = DailySaleTransaction.objects.all()
-    if start_date: qs = qs.filter(date__gte=start_date)
-    if end_date: qs = qs.filter(date__lte=end_date)
-    dates = qs.values_list('date', flat=True).distinct()
-    success = error = 0
-    for d in dates:
-        if recompute_daily_summary_for_date(d):
-            success += 1
-        else:
-            error += 1
+    """
+    Full reconciliation pass. Signals keep DailySummary current with deltas;
+    run this periodically to correct any drift.
+    """
+    first, last = summary_date_bounds()
+    start_date = start_date or first
+    end_date = end_date or last
+    if start_date is None or end_date is None:
+        return 0, 0
+    success, error = generate_daily_summaries_for_range(start_date, end_date)
     logger.info(f"Recompute complete: {success} success, {error} errors")
     return success, error
 
+def finalize_daily_summaries(up_to, start_date=None):
+    """
+    Close every day up to ``up_to`` (inclusive): open days are recomputed once
+    more, then frozen with ``is_final``. Months and years that ended on or
+    before ``up_to`` are finalized too. Later transaction or payment changes
+    on closed days leave the snapshots alone until ``correct_daily_summary``
+    is called. Returns ``(days, months, years)`` newly finalized.
+    """
+    if start_date is None:
+        bounds = DailySummary.objects.aggregate(
+            first_open=Min('date', filter=Q(is_final=False)),
+            last_final=Max('date', filter=Q(is_final=True)),
+        )
+        candidates = [bounds['first_open']]
+        candidates.append(bounds['last_final'] + timedelta(days=1) if bounds['last_final'] else summary_date_bounds()[0])
+        start_date = min(filter(None, candidates), default=None)
+
+    next_day = up_to + timedelta(days=1)
+    with db_transaction.atomic():
+        if start_date and start_date <= up_to:
+            recompute_daily_summaries_for_range(start_date, up_to)
+        now = timezone.now()
+        days = DailySummary.objects.filter(date__lte=up_to, is_final=False).update(is_final=True, updated_at=now)
+        months = MonthlySummary.objects.filter(
+            Q(year__lt=next_day.year) | Q(year=next_day.year, month__lt=next_day.month),
+            is_final=False,
+        ).update(is_final=True, updated_at=now)
+        years = YearlySummary.objects.filter(year__lt=next_day.year, is_final=False).update(is_final=True, updated_at=now)
+
+    logger.info(f"Finalized summaries up to {up_to}: {days} day(s), {months} month(s), {years} year(s)")
+    return days, months, years
+
+
+def finalize_summary_dates(dates):
+    """Recompute and freeze the given days only (rollups are closed by ``finalize_daily_summaries``)."""
+    finalized = 0
+    with db_transaction.atomic():
+        for target_date in sorted(set(dates)):
+            summary = recompute_daily_summary_for_date(target_date, raise_errors=True)
+            if summary and not summary.is_final:
+                finalized += DailySummary.objects.filter(pk=summary.pk).update(is_final=True)
+    return finalized
+
+
+def correct_daily_summary(target_date):
+    """
+    Correction path for closed days: rebuild a finalized DailySummary (and its
+    month/year rollups) from the current transactions, keeping it final.
+    """
+    with db_transaction.atomic():
+        summary = recompute_daily_summary_for_date(target_date, raise_errors=True, force=True)
+        refresh_rollups(target_date, target_date, force=True)
+    logger.info(f"Corrected summary for {target_date}")
+    return summary
+
+
 def is_customer_fully_paid(customer_id):
     """
     بررسی می‌کند که آیا مشتری تمام تراکنش‌هایش را پرداخت کرده است یا نه
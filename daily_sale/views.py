@@ -18,26 +18,35 @@ from django.http import JsonResponse, HttpResponse
 from django.core.paginator import Paginator
 from django.utils import timezone
 from decimal import Decimal, ROUND_HALF_UP
-from django.db.models import Sum, Q, Count, Avg
+from django.db.models import Sum, Q, Count, Avg, F, Value, OuterRef, Subquery, ExpressionWrapper, Prefetch, prefetch_related_objects
 from django.db import connection
 import json
 from datetime import datetime, timedelta, date
-from django.db.models.functions import Coalesce
+from django.db.models.functions import Coalesce, Concat, Lower, NullIf, Trim
 from django.db.models import DecimalField
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 import csv
 from django.utils.encoding import smart_str
-from .models import DailySaleTransaction, Payment, DailySaleTransactionItem,OutstandingCustomer, DailySaleTransaction
+from .models import DailySaleTransaction, Payment, DailySaleTransactionItem,OutstandingCustomer, DailySaleTransaction, CustomerClearance
 from containers.models import Container
 from .forms import DailySaleTransactionForm, PaymentForm
 from django.contrib.auth.models import User
-from .report import get_sales_summary, sales_timeseries, parse_date_param
+from .report import get_sales_summary, sales_timeseries, parse_date_param, daily_report_rows, monthly_report_rows, REPORT_DAY_FIELDS
 from accounts.models import Company, UserProfile
 from containers.models import Inventory_List
-from .utils import recompute_daily_summary_for_date, recompute_outstanding_for_customer
-from .services import CalculationService
+from .utils import cleared_customer_rows, CLEARANCE_FIELDS
+from .services import CalculationService, LineItemService, InvoiceNumberService, SummaryService
+from .pagination import keyset_page, estimated_count
+from .lookup_cache import active_customers, active_companies, search_entries
+from .search import search, parse_limit
+from .item_autofill import autofill_entries, combined_etag, parse_item_ids
+from django.utils.cache import get_conditional_response
+from django.conf import settings
+from django.core.exceptions import ValidationError
 logger = logging.getLogger(__name__)
 
+MAX_PER_PAGE = 100
+
 TAX_RATE = Decimal('0.10')
 
 
@@ -143,9 +152,8 @@ def customer_detail(request, customer_id=None):
             tx_id = request.POST.get("transaction_id")
             if tx_id:
                 payment.transaction = get_object_or_404(DailySaleTransaction, id=tx_id)
-                payment.save()
-                payment.transaction.save()
-                recompute_outstanding_for_customer(customer.id)
+                with db_transaction.atomic():
+                    payment.save()
                 messages.success(request, "Payment recorded successfully.")
                 return redirect(reverse("daily_sale:customer_detail", kwargs={"customer_id": customer.id}))
         else:
@@ -153,43 +161,71 @@ def customer_detail(request, customer_id=None):
     else:
         payment_form = PaymentForm()
 
-    recompute_outstanding_for_customer(customer.id)
-    transactions = DailySaleTransaction.objects.filter(customer=customer).select_related('item').order_by('-date')
+    # صفحه فقط خواندنی است؛ اصلاح مغایرت‌ها با دستور reconcile انجام می‌شود
+    transactions = DailySaleTransaction.objects.filter(customer=customer)
+    # پرداخت‌ها از همان فیلدهای advance/balance خوانده می‌شوند که OutstandingCustomer از آن‌ها ساخته می‌شود
+    money = DecimalField(max_digits=24, decimal_places=2)
+    totals = transactions.aggregate(
+        total_sales=Coalesce(Sum('total_amount'), Value(Decimal('0.00')), output_field=money),
+        total_tax=Coalesce(Sum('tax_amount'), Value(Decimal('0.00')), output_field=money),
+        total_paid=Coalesce(Sum('advance'), Value(Decimal('0.00')), output_field=money),
+        total_balance=Coalesce(Sum('balance'), Value(Decimal('0.00')), output_field=money),
+    )
+
+    try:
+        per_page = min(max(int(request.GET.get('per_page', 25)), 1), MAX_PER_PAGE)
+    except ValueError:
+        per_page = 25
+    paginator = Paginator(
+        transactions.select_related('item').order_by('-date', '-created_at', '-id'), per_page
+    )
+    page_obj = paginator.get_page(request.GET.get('page'))
+
     tx_data = []
-    for tx in transactions:
-        paid_amount = Payment.objects.filter(transaction=tx).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        if tx.advance != paid_amount:
-            tx.advance = paid_amount
-            tx.save()
+    for tx in page_obj.object_list:
+        product_name = tx.item.product_name if tx.item else '-'
         tx_data.append({
             'id': tx.id,
             'date': tx.date,
             'type': tx.get_transaction_type_display() if hasattr(tx, 'get_transaction_type_display') else tx.transaction_type,
-            'item': tx.item.name if tx.item else '-',
+            'item': product_name,
+            'product_name': product_name,
             'quantity': tx.quantity,
             'unit_price': tx.item.unit_price if tx.item else Decimal('0.00'),
             'subtotal': tx.subtotal,
             'tax_amount': tx.tax_amount,
             'total_amount': tx.total_amount,
-            'paid_amount': paid_amount,
+            'total_with_tax': tx.total_amount,
+            'paid_amount': tx.advance,
             'balance': tx.balance,
+            'remaining_amount': tx.balance,
             'payment_status': tx.get_payment_status_display(),
             'note': tx.note,
         })
 
-    total_sales = sum(tx['total_amount'] or Decimal('0.00') for tx in tx_data)
-    total_tax = sum(tx['tax_amount'] for tx in tx_data)
-    total_paid = sum(tx['paid_amount'] for tx in tx_data)
-    total_balance = sum(tx['balance'] for tx in tx_data)
+    open_transactions = [
+        {
+            'id': tx.id,
+            'date': tx.date,
+            'item': tx.item.product_name if tx.item else '-',
+            'remaining_amount': tx.balance,
+        }
+        for tx in transactions.filter(balance__gt=0).select_related('item').order_by('-date')
+    ]
 
     context = {
         'customer': customer,
         'transactions': tx_data,
-        'total_sales': total_sales,
-        'total_tax': total_tax,
-        'total_paid': total_paid,
-        'total_balance': total_balance,
-        'tax_rate': (getattr(transactions.first(), 'tax', 0)) if transactions else 0,
+        'open_transactions': open_transactions,
+        'page_obj': page_obj,
+        'paginator': paginator,
+        'per_page': per_page,
+        'total_sales': totals['total_sales'],
+        'total_tax': totals['total_tax'],
+        'total_paid': totals['total_paid'],
+        'total_balance': totals['total_balance'],
+        'total_remaining': totals['total_balance'],
+        'tax_rate': transactions.order_by('-date').values_list('tax', flat=True).first() or 0,
         'is_self_view': is_self_view,
         'is_admin': request.user.is_staff,
         'payment_form': payment_form,
@@ -211,6 +247,9 @@ def transaction_create(request):
                 transaction.created_by = request.user
                 advance = Decimal(request.POST.get("advance", "0") or "0")
                 transaction.advance = advance
+                if not transaction.invoice_number:
+                    transaction.invoice_number = InvoiceNumberService.next_number()
+                    logger.info(f" Invoice number assigned: {transaction.invoice_number}")
                 transaction.save()
                 logger.info(f"Transaction created: {transaction.id}")
                 items_json = request.POST.get("items_data", "[]")
@@ -226,50 +265,17 @@ def transaction_create(request):
                     transaction.delete()
                     return render(request, "daily_sale/transaction_create.html", {"form": form})
                 
-                subtotal_total = Decimal('0')
-                discount_total = Decimal('0')
-                tax_total = Decimal('0')
-                
-                for item_data in items_list:
-                    raw_item_id = item_data.get("item_id")
-                    if not raw_item_id:
-                        continue
-                    
-                    try:
-                        inventory = Inventory_List.objects.get(pk=raw_item_id)
-                        quantity = Decimal(str(item_data.get("quantity", 1)))
-                        unit_price = Decimal(str(item_data.get("unit_price", 0)))
-                        discount = Decimal(str(item_data.get("discount", 0)))
-                        
-                        item_calc = CalculationService.calculate_item_amounts(
-                            quantity=quantity,
-                            unit_price=unit_price,
-                            discount=discount,
-                            tax_percent=transaction.tax
-                        )
-                        
-                        subtotal_total += item_calc["subtotal"]
-                        discount_total += discount
-                        tax_total += item_calc["tax_amount"]
-                        
-                        container_obj = inventory.container if inventory.container else None
-                        
-                        DailySaleTransactionItem.objects.create(
-                            transaction=transaction,
-                            item=inventory,
-                            container=container_obj,
-                            quantity=quantity,
-                            unit_price=unit_price,
-                            discount=discount,
-                            subtotal=item_calc["subtotal"],
-                            tax_amount=item_calc["tax_amount"],
-                            total_amount=item_calc["total_amount"],
-                        )
-                        items_created += 1
-                        
-                    except Exception as e:
-                        logger.error(f"Error saving item: {str(e)}")
-                        continue
+                try:
+                    totals = LineItemService.create_items(transaction, items_list)
+                except ValidationError as e:
+                    logger.error(f"Invalid items: {e.messages}")
+                    messages.error(request, " ".join(e.messages))
+                    transaction.delete()
+                    return render(request, "daily_sale/transaction_create.html", {"form": form})
+                items_created = totals["count"]
+                subtotal_total = totals["subtotal"]
+                discount_total = totals["discount_total"]
+                tax_total = totals["tax_amount"]
                 
                 if items_created == 0:
                     logger.error("No items created")
@@ -296,27 +302,6 @@ def transaction_create(request):
                 
                 transaction.save()
 
-                if not transaction.invoice_number:
-                    date_str = datetime.now().strftime('%Y%m%d')
-                    prefix = "INV"
-
-                    last_inv = DailySaleTransaction.objects.filter(
-                        invoice_number__startswith=f"{prefix}-{date_str}-"
-                    ).order_by('-invoice_number').first()
-
-                    if last_inv:
-                        try:
-                            last_num = int(last_inv.invoice_number.split('-')[-1])
-                            new_num = last_num + 1
-                        except ValueError:
-                            new_num = 1
-                    else:
-                        new_num = 1
-
-                    transaction.invoice_number = f"{prefix}-{date_str}-{new_num:04d}"
-                    transaction.save(update_fields=["invoice_number"])
-                    logger.info(f" Invoice number assigned: {transaction.invoice_number}")
-
                 if advance > Decimal("0"):
                     Payment.objects.create(
                         transaction=transaction,
@@ -419,7 +404,11 @@ def transaction_list(request):
         company_id = request.GET.get("company", "")
         invoice_number = request.GET.get("invoice", "").strip()
         payment_status = request.GET.get("payment_status", "")
-        items_per_page = int(request.GET.get("per_page", 25))
+        try:
+            items_per_page = min(max(int(request.GET.get("per_page", 25)), 1), MAX_PER_PAGE)
+        except ValueError:
+            items_per_page = 25
+        cursor_mode = request.GET.get("pagination") == "cursor" or "cursor" in request.GET
         export_csv = request.GET.get("export") == "csv"
         
         # Query
@@ -431,8 +420,7 @@ def transaction_list(request):
         ).prefetch_related(
             "items",
             "items__item",
-            "payments"
-        ).order_by("-date", "-created_at")
+        ).order_by("-date", "-created_at", "-id")
         
         # filters
         if start_date:
@@ -450,30 +438,37 @@ def transaction_list(request):
         if payment_status:
             qs = qs.filter(payment_status=payment_status)
         
-        total_count = qs.count()
+        stats = None
 
-        from .services import SummaryService
-        stats = SummaryService.get_transaction_stats(qs)
-        paginator = Paginator(qs, items_per_page)
-        page_number = request.GET.get("page", 1)
-        
-        try:
-            page_obj = paginator.page(page_number)
-        except PageNotAnInteger:
-            page_obj = paginator.page(1)
-        except EmptyPage:
-            page_obj = paginator.page(paginator.num_pages)
+        if cursor_mode:
+            # صفحه‌بندی keyset: بدون COUNT، OFFSET و aggregate آمار
+            paginator = None
+            page_obj = keyset_page(qs, request.GET.get("cursor"), items_per_page)
+            total_count = None
+            if getattr(settings, "DAILY_SALE_ESTIMATED_COUNTS", False):
+                total_count = estimated_count(qs)
+            cursor_params = request.GET.copy()
+            cursor_params.pop("cursor", None)
+            cursor_params.pop("page", None)
+            cursor_params["pagination"] = "cursor"
+            cursor_query = cursor_params.urlencode()
+        else:
+            stats = SummaryService.get_transaction_stats(qs)
+            total_count = stats['transactions_count']
+            paginator = Paginator(qs, items_per_page)
+            page_number = request.GET.get("page", 1)
+            cursor_query = ""
+
+            try:
+                page_obj = paginator.page(page_number)
+            except PageNotAnInteger:
+                page_obj = paginator.page(1)
+            except EmptyPage:
+                page_obj = paginator.page(paginator.num_pages)
 
         transactions_with_details = []
         for transaction in page_obj:
-            paid_amount = transaction.payments.aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0')
-            if transaction.advance != paid_amount:
-                transaction.advance = paid_amount
-                transaction.paid = paid_amount
-            
-            transaction.paid_amount = paid_amount
+            transaction.paid_amount = transaction.advance
             transaction.remaining_balance = transaction.balance
             transaction_items = transaction.items.all()
             
@@ -519,13 +514,8 @@ def transaction_list(request):
             
             transactions_with_details.append(transaction)
 
-        customers = UserProfile.objects.filter(
-            daily_transactions__isnull=False
-        ).distinct().order_by('user__first_name')[:50]
-        
-        companies = Company.objects.filter(
-            daily_transactions__isnull=False
-        ).distinct().order_by('name')[:50]
+        customers = active_customers()[:50]
+        companies = active_companies()[:50]
 
         start_date_str = start_date.strftime("%Y-%m-%d") if start_date else ""
         end_date_str = end_date.strftime("%Y-%m-%d") if end_date else ""
@@ -549,17 +539,21 @@ def transaction_list(request):
             "today": datetime.now().date(),
             "thirty_days_ago": thirty_days_ago,
             "paginator": paginator,
-            "current_page": page_obj.number,
+            "current_page": getattr(page_obj, "number", None),
+            "cursor_mode": cursor_mode,
+            "cursor_query": cursor_query,
         }
 
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             data = {
                 'success': True,
                 'total_count': total_count,
-                'total_sales': str(stats['total_sales']),
-                'total_outstanding': str(stats['total_outstanding']),
-                'page_count': paginator.num_pages,
-                'current_page': page_obj.number,
+                'total_sales': str(stats['total_sales']) if stats else None,
+                'total_outstanding': str(stats['total_outstanding']) if stats else None,
+                'page_count': paginator.num_pages if paginator else None,
+                'current_page': getattr(page_obj, 'number', None),
+                'next_cursor': getattr(page_obj, 'next_cursor', None),
+                'previous_cursor': getattr(page_obj, 'previous_cursor', None),
             }
             return JsonResponse(data)
         
@@ -595,9 +589,7 @@ def transaction_list(request):
 def transaction_delete(request, pk):
     try:
         transaction = get_object_or_404(DailySaleTransaction, pk=pk)
-        transaction_date = transaction.date
         transaction.delete()
-        recompute_daily_summary_for_date(transaction_date)
         
         messages.success(request, "Transaction deleted successfully!")
     except Exception as e:
@@ -722,45 +714,30 @@ def daily_summary(request):
         
         if end_date > today:
             end_date = today
-        transactions = DailySaleTransaction.objects.filter(
-            date__range=[start_date, end_date]
-        ).select_related('customer', 'company', 'item')
-        sales_stats = transactions.filter(transaction_type='sale').aggregate(
-            total_sales=Coalesce(Sum('total_amount', output_field=DecimalField()), Decimal('0.00')),
-            avg_sale=Coalesce(Avg('total_amount', output_field=DecimalField()), Decimal('0.00')),
-            count_sales=Count('id'),
-            total_quantity=Coalesce(Sum('quantity', output_field=DecimalField()), Decimal('0.00'))
-        )
-        
-        purchase_stats = transactions.filter(transaction_type='purchase').aggregate(
-            total_purchases=Coalesce(Sum('total_amount', output_field=DecimalField()), Decimal('0.00')),
-            avg_purchase=Coalesce(Avg('total_amount', output_field=DecimalField()), Decimal('0.00')),
-            count_purchases=Count('id')
-        )
-        
-        payments = Payment.objects.filter(date__range=[start_date, end_date])
-        payment_stats = payments.aggregate(
-            total_cash_in=Coalesce(Sum('amount', output_field=DecimalField()), Decimal('0.00')),
-            count_payments=Count('id')
-        )
-        
+        transactions = DailySaleTransaction.objects.filter(date__range=[start_date, end_date])
+        if report_type == 'yearly':
+            # گزارش سالانه ماه‌به‌ماه از جدول MonthlySummary خوانده می‌شود
+            day_rows = monthly_report_rows(start_date, end_date)
+        else:
+            day_rows = daily_report_rows(start_date, end_date)
+        totals = {
+            field: sum((row[field] for row in day_rows.values()), Decimal('0'))
+            for field in REPORT_DAY_FIELDS + ('cash_in',)
+        }
+
         payment_status = {
-            'paid': transactions.filter(payment_status='paid').count(),
-            'partial': transactions.filter(payment_status='partial').count(),
-            'unpaid': transactions.filter(payment_status='unpaid').count(),
-            'total': transactions.count()
+            'paid': int(totals['paid_transactions']),
+            'partial': int(totals['partial_transactions']),
+            'unpaid': int(totals['unpaid_transactions']),
+            'total': int(totals['transactions_count'])
         }
+        total_outstanding = totals['total_outstanding']
         
-        outstanding_result = transactions.filter(
-            Q(payment_status='unpaid') | Q(payment_status='partial')
-        ).aggregate(total=Coalesce(Sum('balance', output_field=DecimalField()), Decimal('0.00')))
-        total_outstanding = outstanding_result['total']
-        
-        cash_in = payment_stats['total_cash_in']
-        cash_out = purchase_stats['total_purchases']
+        cash_in = totals['cash_in']
+        cash_out = totals['total_purchases']
         net_profit = cash_in - cash_out
         
-        total_sales = sales_stats['total_sales']
+        total_sales = totals['total_sales']
         if total_sales and total_sales > 0:
             collection_rate = (cash_in / total_sales * 100)
         else:
@@ -778,32 +755,24 @@ def daily_summary(request):
             transaction_count=Count('id')
         ).order_by('-total_spent')[:10]
 
-        top_items = transactions.filter(
-            transaction_type='sale', 
-            item__isnull=False
-        ).values(
-            'item__product_name',
-            'item__code'
-        ).annotate(
-            total_sold=Coalesce(Sum('quantity', output_field=DecimalField()), Decimal('0.00')),
-            total_revenue=Coalesce(Sum('total_amount', output_field=DecimalField()), Decimal('0.00'))
-        ).order_by('-total_revenue')[:10]
+        # مقدار فروش از ردیف‌های فاکتور خوانده می‌شود، نه از quantity سرفصل
+        top_items = SummaryService.top_items(transactions)
     
+        # سری روزانه از همان ردیف‌های گروه‌بندی‌شده ساخته می‌شود؛ بدون کوئری به ازای هر روز
         daily_series = []
-        current_date = start_date
+        current_date = start_date.replace(day=1) if report_type == 'yearly' else start_date
         while current_date <= end_date:
-            day_trans = transactions.filter(date=current_date)
-            day_sales = day_trans.filter(transaction_type='sale').aggregate(
-                total=Sum('total_amount')
-            )['total'] or Decimal('0')
-            
+            row = day_rows.get(current_date, {})
             daily_series.append({
                 'date': current_date,
-                'total_sales': float(day_sales),
-                'transactions_count': day_trans.count(),
+                'total_sales': float(row.get('total_sales') or 0),
+                'transactions_count': row.get('transactions_count') or 0,
                 'month_name': current_date.strftime('%B') if report_type == 'yearly' else None
             })
-            current_date += timedelta(days=1)
+            if report_type == 'yearly':
+                current_date = (current_date + timedelta(days=32)).replace(day=1)
+            else:
+                current_date += timedelta(days=1)
         chart_labels = []
         chart_data = []
         
@@ -823,9 +792,9 @@ def daily_summary(request):
             'target_date': target_date,
             'report_type': report_type,
             'total_sales': total_sales,
-            'total_purchases': purchase_stats['total_purchases'],
+            'total_purchases': totals['total_purchases'],
             'total_transactions': payment_status['total'],
-            'total_quantity': sales_stats['total_quantity'],
+            'total_quantity': totals['items_sold'],
             'cash_in_total': cash_in,
             'cash_out_total': cash_out,
             'net_profit': net_profit,
@@ -918,12 +887,27 @@ def calculate_navigation_dates(target_date, report_type, today):
 def outstanding_view(request):
     try:
         search_query = request.GET.get('search', '')
-        from .models import OutstandingCustomer
-        
+        try:
+            per_page = min(max(int(request.GET.get('per_page', 25)), 1), MAX_PER_PAGE)
+        except ValueError:
+            per_page = 25
+
+        open_transactions = DailySaleTransaction.objects.filter(
+            customer=OuterRef('customer'), balance__gt=0
+        ).order_by().values('customer')
+        money = DecimalField(max_digits=24, decimal_places=2)
+
+        # یک کوئری برای لیست مشتریان با جمع‌های محاسبه‌شده در SQL
         outstanding_customers_qs = OutstandingCustomer.objects.filter(
             total_debt__gt=0
-        ).select_related('customer', 'customer__user')
-        
+        ).select_related('customer', 'customer__user').annotate(
+            open_total=Coalesce(Subquery(open_transactions.annotate(s=Sum('total_amount')).values('s')), Value(Decimal('0')), output_field=money),
+            open_paid=Coalesce(Subquery(open_transactions.annotate(s=Sum('advance')).values('s')), Value(Decimal('0')), output_field=money),
+            open_count=Coalesce(Subquery(open_transactions.annotate(c=Count('id')).values('c')), Value(0)),
+        ).annotate(
+            remaining=ExpressionWrapper(F('open_total') - F('open_paid'), output_field=money),
+        ).filter(remaining__gt=0).order_by('-total_debt', 'pk')
+
         if search_query:
             outstanding_customers_qs = outstanding_customers_qs.filter(
                 Q(customer__user__username__icontains=search_query) |
@@ -931,77 +915,75 @@ def outstanding_view(request):
                 Q(customer__user__last_name__icontains=search_query) |
                 Q(customer__phone__icontains=search_query)
             )
+
+        totals = outstanding_customers_qs.aggregate(
+            total_debt=Coalesce(Sum('remaining'), Value(Decimal('0')), output_field=money),
+            total_paid=Coalesce(Sum('open_paid'), Value(Decimal('0')), output_field=money),
+            total_customers=Count('id'),
+            total_transactions=Coalesce(Sum('open_count'), Value(0)),
+        )
+
+        paginator = Paginator(outstanding_customers_qs, per_page)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        page_customers = list(page_obj.object_list)
+        prefetch_related_objects(page_customers, Prefetch(
+            'customer__daily_transactions',
+            queryset=DailySaleTransaction.objects.filter(balance__gt=0).order_by('-date'),
+            to_attr='open_transactions',
+        ))
+
         outstanding_customers = []
-        total_debt_all = Decimal('0')
-        total_paid_all = Decimal('0')
-        total_customers = 0
-        
-        for oc in outstanding_customers_qs:
+        for oc in page_customers:
             customer = oc.customer
             customer_name = customer.full_name or (customer.user.get_full_name() if customer.user else str(customer))
-            
-            transactions = DailySaleTransaction.objects.filter(
-                customer=customer,
-                balance__gt=0
-            ).select_related('item').order_by('-date')
-            
-            tx_list = []
-            customer_total_amount = Decimal('0')
-            customer_total_paid = Decimal('0')
-            
-            for tx in transactions:
-                paid_from_payments = tx.payments.aggregate(
-                    total=Sum('amount')
-                )['total'] or Decimal('0')
-                
-                tx_list.append({
-                    'id': tx.id, 
-                    'invoice_number': tx.invoice_number or f"TRX-{str(tx.id)[:8]}",
-                    'transaction_date': tx.date,
-                    'total_amount': tx.total_amount,
-                    'total_paid': paid_from_payments,
-                    'remaining_debt': tx.balance,
-                    'balance_type': 'debt',
-                    'payment_status': tx.payment_status,
-                    'payment_status_display': tx.get_payment_status_display(),
-                })
-                
-                customer_total_amount += tx.total_amount
-                customer_total_paid += paid_from_payments
-            if customer_total_amount - customer_total_paid > 0:
-                remaining = customer_total_amount - customer_total_paid
-                
-                outstanding_customers.append({
-                    'customer_id': str(customer.id),
-                    'customer_name': customer_name,
-                    'customer_phone': customer.phone or 'No Phone',
-                    'customer_email': customer.user.email if customer.user else '',
-                    'transactions': tx_list,
-                    'total_debt': customer_total_amount,
-                    'total_paid': customer_total_paid,
-                    'remaining_balance': remaining,
-                    'debt_transactions_count': len(tx_list),
-                    'balance_type': 'debt',
-                    'balance_class': 'danger',
-                    'balance_text': f'Debt: AED {remaining:,.0f}',
-                })
-                
-                total_debt_all += remaining
-                total_paid_all += customer_total_paid
-                total_customers += 1
-        
+            tx_list = [{
+                'id': tx.id,
+                'invoice_number': tx.invoice_number or f"TRX-{str(tx.id)[:8]}",
+                'transaction_date': tx.date,
+                'total_amount': tx.total_amount,
+                'total_paid': tx.advance,
+                'remaining_debt': tx.balance,
+                'balance_type': 'debt',
+                'payment_status': tx.payment_status,
+                'payment_status_display': tx.get_payment_status_display(),
+            } for tx in customer.open_transactions]
+
+            outstanding_customers.append({
+                'customer_id': str(customer.id),
+                'customer_name': customer_name,
+                'customer_phone': customer.phone or 'No Phone',
+                'customer_email': customer.user.email if customer.user else '',
+                'transactions': tx_list,
+                'total_debt': oc.open_total,
+                'total_paid': oc.open_paid,
+                'remaining_balance': oc.remaining,
+                'debt_transactions_count': oc.open_count,
+                'balance_type': 'debt',
+                'balance_class': 'danger',
+                'balance_text': f'Debt: AED {oc.remaining:,.0f}',
+            })
+
+        page_params = request.GET.copy()
+        page_params.pop('page', None)
+
+        total_customers = totals['total_customers']
         context = {
             'outstanding_customers': outstanding_customers,
             'total_summary': {
-                'total_debt': total_debt_all,
-                'total_paid': total_paid_all,
+                'total_debt': totals['total_debt'],
+                'total_paid': totals['total_paid'],
                 'total_customers': total_customers,
-                'total_transactions': sum(c['debt_transactions_count'] for c in outstanding_customers),
+                'total_transactions': totals['total_transactions'],
             },
             'search_query': search_query,
             'customers_count': total_customers,
             'has_data': total_customers > 0,
             'is_admin': request.user.is_staff,
+            'page_obj': page_obj,
+            'paginator': paginator,
+            'per_page': per_page,
+            'page_query': page_params.urlencode(),
+            'page_offset': page_obj.start_index() - 1 if total_customers else 0,
         }
         
         return render(request, 'daily_sale/old_transactions.html', context)
@@ -1057,49 +1039,13 @@ def customer_transaction_edit(request, transaction_id):
                     edited_tx = form.save(commit=False)
                     edited_tx.save()
                     
-                    # حذف آیتم‌های قبلی
-                    DailySaleTransactionItem.objects.filter(transaction=edited_tx).delete()
-                    
-                    # ایجاد آیتم‌های جدید
+                    # همگام‌سازی آیتم‌ها (فقط تغییرات)
                     items_json = request.POST.get("items_data", "[]")
                     items_list = json.loads(items_json)
-                    
-                    subtotal_total = Decimal('0')
-                    discount_total = Decimal('0')
-                    tax_total = Decimal('0')
-                    
-                    for item_data in items_list:
-                        item_id = item_data.get("item_id")
-                        if not item_id:
-                            continue
-                        
-                        inventory = Inventory_List.objects.get(pk=item_id)
-                        quantity = Decimal(str(item_data.get("quantity", 1)))
-                        unit_price = Decimal(str(item_data.get("unit_price", 0)))
-                        discount = Decimal(str(item_data.get("discount", 0)))
-                        
-                        item_calc = CalculationService.calculate_item_amounts(
-                            quantity=quantity,
-                            unit_price=unit_price,
-                            discount=discount,
-                            tax_percent=edited_tx.tax
-                        )
-                        
-                        subtotal_total += item_calc["subtotal"]
-                        discount_total += discount
-                        tax_total += item_calc["tax_amount"]
-                        
-                        DailySaleTransactionItem.objects.create(
-                            transaction=edited_tx,
-                            item=inventory,
-                            container=inventory.container if inventory.container else None,
-                            quantity=quantity,
-                            unit_price=unit_price,
-                            discount=discount,
-                            subtotal=item_calc["subtotal"],
-                            tax_amount=item_calc["tax_amount"],
-                            total_amount=item_calc["total_amount"],
-                        )
+                    totals = LineItemService.sync_items(edited_tx, items_list)
+                    subtotal_total = totals["subtotal"]
+                    discount_total = totals["discount_total"]
+                    tax_total = totals["tax_amount"]
                     
                     # محاسبه نهایی تراکنش
                     net_amount = max(subtotal_total - discount_total, Decimal("0"))
@@ -1124,14 +1070,8 @@ def customer_transaction_edit(request, transaction_id):
                     edited_tx.paid = advance
                     edited_tx.save()
                     
-                    # بازمحاسبه خلاصه روزانه
-                    recompute_daily_summary_for_date(edited_tx.date)
-                    
                     # ========== بررسی وضعیت مشتری ==========
                     if edited_tx.customer:
-                        # بازمحاسبه بدهی مشتری
-                        recompute_outstanding_for_customer(edited_tx.customer.id)
-                        
                         # بررسی وضعیت پرداخت همه تراکنش‌های مشتری
                         all_customer_transactions = DailySaleTransaction.objects.filter(
                             customer=edited_tx.customer
@@ -1154,6 +1094,9 @@ def customer_transaction_edit(request, transaction_id):
                     else:
                         return redirect('daily_sale:transaction_list')
                     
+            except ValidationError as e:
+                logger.error(f"Invalid items: {e.messages}")
+                messages.error(request, " ".join(e.messages))
             except Exception as e:
                 logger.error(f"Error editing transaction: {str(e)}")
                 messages.error(request, f"Error updating transaction: {str(e)}")
@@ -1205,68 +1148,125 @@ class SimpleJSONEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super().default(obj)
 
+CLEARED_SORT_ORDERING = {
+    'date_desc': (F('last_payment_date').desc(nulls_last=True), 'customer_id'),
+    'date_asc': (F('last_payment_date').asc(nulls_first=True), 'customer_id'),
+    'amount_desc': ('-total_cleared_amount', 'customer_id'),
+    'amount_asc': ('total_cleared_amount', 'customer_id'),
+    'name_asc': ('customer_sort_name', 'customer_id'),
+    'name_desc': ('-customer_sort_name', 'customer_id'),
+}
+
+
+def _customer_sort_name():
+    # همان نامی که در جدول نمایش داده می‌شود: نام کامل یا نام کاربری
+    full_name = Trim(Concat('customer__user__first_name', Value(' '), 'customer__user__last_name'))
+    return Lower(Coalesce(NullIf(full_name, Value('')), 'customer__user__username'))
+
+
 @login_required
 def cleared_transactions(request):
     try:
         search_query = request.GET.get('search', '')
         period = request.GET.get('period', 'month')
         sort_by = request.GET.get('sort', 'date_desc')
+        if sort_by not in CLEARED_SORT_ORDERING:
+            sort_by = 'date_desc'
         highlight_customer = request.GET.get('highlight')
+        try:
+            per_page = min(max(int(request.GET.get('per_page', 25)), 1), MAX_PER_PAGE)
+        except ValueError:
+            per_page = 25
         today = timezone.now().date()
         if period == 'all':
             start_date = date(2000, 1, 1)
             end_date = today
         else:
             start_date, end_date = calculate_simple_date_range(period, today)
-        customers = UserProfile.objects.filter(
-            role=UserProfile.ROLE_CUSTOMER
-        ).select_related('user')
-        
+
+        # یک کوئری گروه‌بندی‌شده به جای حلقه روی تک‌تک مشتریان
+        if period == 'all' and getattr(settings, 'DAILY_SALE_CLEARANCE_TABLE', False):
+            cleared_qs = CustomerClearance.objects.values('customer_id', *CLEARANCE_FIELDS)
+        elif period == 'all':
+            cleared_qs = cleared_customer_rows()
+        else:
+            cleared_qs = cleared_customer_rows(start_date, end_date)
+        cleared_qs = cleared_qs.filter(customer__role=UserProfile.ROLE_CUSTOMER)
+
         if search_query:
-            customers = customers.filter(
-                Q(user__username__icontains=search_query) |
-                Q(user__first_name__icontains=search_query) |
-                Q(user__last_name__icontains=search_query) |
-                Q(phone__icontains=search_query) |
-                Q(user__email__icontains=search_query)
+            cleared_qs = cleared_qs.filter(
+                Q(customer__user__username__icontains=search_query) |
+                Q(customer__user__first_name__icontains=search_query) |
+                Q(customer__user__last_name__icontains=search_query) |
+                Q(customer__phone__icontains=search_query) |
+                Q(customer__user__email__icontains=search_query)
             )
-        
+
+        totals = cleared_qs.aggregate(
+            total_customers=Count('customer_id'),
+            total_amount=Sum('total_cleared_amount'),
+            total_transactions=Sum('transactions_count'),
+        )
+        total_customers = totals['total_customers']
+        total_cleared_amount = totals['total_amount'] or Decimal('0')
+
+        if sort_by.startswith('name'):
+            cleared_qs = cleared_qs.alias(customer_sort_name=_customer_sort_name())
+        paginator = Paginator(cleared_qs.order_by(*CLEARED_SORT_ORDERING[sort_by]), per_page)
+        page_obj = paginator.get_page(request.GET.get('page'))
+        rows = list(page_obj.object_list)
+
+        customer_ids = [row['customer_id'] for row in rows]
+        profiles = UserProfile.objects.select_related('user').in_bulk(customer_ids)
+        paid_sales = DailySaleTransaction.objects.filter(
+            customer_id__in=customer_ids, transaction_type='sale', payment_status='paid'
+        )
+        if period != 'all':
+            paid_sales = paid_sales.filter(date__range=[start_date, end_date])
+        details = {}
+        for tx in paid_sales.annotate(payment_count=Count('payments')).order_by('date'):
+            total_amount = tx.total_amount or Decimal('0')
+            details.setdefault(tx.customer_id, []).append({
+                'id': str(tx.id),
+                'invoice_number': tx.invoice_number or f"TRX-{tx.id}",
+                'date': tx.date,
+                'total_amount': total_amount,
+                'total_paid': tx.advance,
+                'discount': tx.discount or Decimal('0'),
+                'payable_amount': total_amount,
+                'status': 'Paid',
+                'payment_count': tx.payment_count,
+                'remaining': Decimal('0'),
+            })
+
         cleared_customers = []
-        total_cleared_amount = Decimal('0')
-        total_transactions_count = 0
-        
-        for customer in customers:
-            customer_status = check_customer_clear_status_simple(customer, start_date, end_date)
-            
-            if customer_status['is_cleared'] and customer_status['total_transactions'] > 0:
-                customer_name = customer.user.get_full_name() or customer.user.username if customer.user else str(customer)
-                customer_email = customer.user.email if customer.user else ''
-                
-                customer_info = {
-                    'customer_id': str(customer.id),
-                    'customer_name': customer_name,
-                    'customer_phone': getattr(customer, 'phone', ''),
-                    'customer_email': customer_email,
-                    'total_cleared_amount': customer_status['total_cleared_amount'],
-                    'total_transactions': customer_status['total_transactions'],
-                    'last_payment_date': customer_status['last_payment_date'],
-                    'first_transaction_date': customer_status['first_transaction_date'],
-                    'clear_status': 'Fully Paid',
-                    'clear_days': customer_status['clear_days'],
-                    'transactions': customer_status['transactions_details'],
-                    'highlight': str(customer.id) == highlight_customer, 
-                }
-                
-                cleared_customers.append(customer_info)
-                total_cleared_amount += customer_status['total_cleared_amount']
-                total_transactions_count += customer_status['total_transactions']
-        cleared_customers = sort_cleared_customers(cleared_customers, sort_by)
-        
+        for row in rows:
+            customer = profiles[row['customer_id']]
+            customer_name = customer.user.get_full_name() or customer.user.username if customer.user else str(customer)
+            last_payment_date = row['last_payment_date']
+            cleared_customers.append({
+                'customer_id': str(customer.id),
+                'customer_name': customer_name,
+                'customer_phone': getattr(customer, 'phone', ''),
+                'customer_email': customer.user.email if customer.user else '',
+                'total_cleared_amount': row['total_cleared_amount'],
+                'total_transactions': row['transactions_count'],
+                'last_payment_date': last_payment_date,
+                'first_transaction_date': row['first_transaction_date'],
+                'clear_status': 'Fully Paid',
+                'clear_days': (today - last_payment_date).days if last_payment_date else 0,
+                'transactions': details.get(customer.id, []),
+                'highlight': str(customer.id) == highlight_customer,
+            })
+
+        page_params = request.GET.copy()
+        page_params.pop('page', None)
+
         stats = {
-            'total_customers': len(cleared_customers),
+            'total_customers': total_customers,
             'total_amount': total_cleared_amount,
-            'avg_amount_per_customer': total_cleared_amount / len(cleared_customers) if cleared_customers else Decimal('0'),
-            'total_transactions': total_transactions_count,
+            'avg_amount_per_customer': total_cleared_amount / total_customers if total_customers else Decimal('0'),
+            'total_transactions': totals['total_transactions'] or 0,
             'period_start': start_date,
             'period_end': end_date,
         }
@@ -1280,8 +1280,13 @@ def cleared_transactions(request):
             'start_date': start_date,
             'end_date': end_date,
             'today': today,
-            'customers_count': len(cleared_customers),
+            'customers_count': total_customers,
             'highlight_customer': highlight_customer,
+            'page_obj': page_obj,
+            'paginator': paginator,
+            'per_page': per_page,
+            'page_query': page_params.urlencode(),
+            'page_offset': page_obj.start_index() - 1 if total_customers else 0,
             'periods': [
                 ('week', 'Last Week'),
                 ('month', 'Last Month'),
@@ -1308,6 +1313,7 @@ def cleared_transactions(request):
             'error_message': f'Error loading data: {str(e)}',
             'cleared_customers': [],
             'customers_count': 0,
+            'page_offset': 0,
             'stats': {
                 'total_customers': 0,
                 'total_amount': Decimal('0'),
@@ -1332,103 +1338,6 @@ def cleared_transactions(request):
         }
         return render(request, 'daily_sale/cleared_transactions.html', context)
 
-def sort_cleared_customers(customers, sort_by):
-    if sort_by == 'date_desc':
-        customers.sort(key=lambda x: x['last_payment_date'] or datetime.min, reverse=True)
-    elif sort_by == 'date_asc':
-        customers.sort(key=lambda x: x['last_payment_date'] or datetime.min)
-    elif sort_by == 'amount_desc':
-        customers.sort(key=lambda x: x['total_cleared_amount'], reverse=True)
-    elif sort_by == 'amount_asc':
-        customers.sort(key=lambda x: x['total_cleared_amount'])
-    elif sort_by == 'name_asc':
-        customers.sort(key=lambda x: (x['customer_name'] or '').lower())
-    elif sort_by == 'name_desc':
-        customers.sort(key=lambda x: (x['customer_name'] or '').lower(), reverse=True)
-    return customers
-
-def check_customer_clear_status_simple(customer, start_date, end_date):
-    try:
-        transactions = customer.daily_transactions.filter(
-            date__range=[start_date, end_date],
-            transaction_type='sale'
-        ).order_by('date')
-        
-        if not transactions.exists():
-            return {
-                'is_cleared': False,
-                'total_cleared_amount': Decimal('0'),
-                'total_transactions': 0,
-                'last_payment_date': None,
-                'first_transaction_date': None,
-                'clear_days': 0,
-                'transactions_details': []
-            }
-        
-        total_cleared = Decimal('0')
-        transactions_details = []
-        last_payment_date = None
-        first_transaction_date = None
-        paid_transactions = transactions.filter(payment_status='paid')
-        
-        for transaction in paid_transactions:
-            total_amount = transaction.total_amount or Decimal('0')
-            total_cleared += total_amount
-            last_payment = transaction.payments.order_by('-date').first()
-            if last_payment:
-                payment_date = last_payment.date
-                if isinstance(payment_date, datetime):
-                    payment_date = payment_date.date()
-                
-                if not last_payment_date or payment_date > last_payment_date:
-                    last_payment_date = payment_date
-            transaction_date = transaction.date
-            if isinstance(transaction_date, datetime):
-                transaction_date = transaction_date.date()
-            
-            if not first_transaction_date or transaction_date < first_transaction_date:
-                first_transaction_date = transaction_date
-            transaction_detail = {
-                'id': str(transaction.id),
-                'invoice_number': transaction.invoice_number or f"TRX-{transaction.id}",
-                'date': transaction_date,
-                'total_amount': total_amount,
-                'total_paid': transaction.advance,
-                'discount': transaction.discount or Decimal('0'),
-                'payable_amount': total_amount,
-                'status': 'Paid',
-                'payment_count': transaction.payments.count(),
-                'remaining': Decimal('0'),
-            }
-            transactions_details.append(transaction_detail)
-        clear_days = 0
-        if last_payment_date:
-            if isinstance(last_payment_date, datetime):
-                last_payment_date = last_payment_date.date()
-            clear_days = (timezone.now().date() - last_payment_date).days
-        
-        return {
-            'is_cleared': len(transactions_details) > 0,
-            'total_cleared_amount': total_cleared,
-            'total_transactions': len(transactions_details),
-            'last_payment_date': last_payment_date,
-            'first_transaction_date': first_transaction_date,
-            'clear_days': clear_days,
-            'transactions_details': transactions_details,
-        }
-        
-    except Exception as e:
-        logger.error(f"Error checking clear status for customer {customer.id}: {str(e)}")
-        return {
-            'is_cleared': False,
-            'total_cleared_amount': Decimal('0'),
-            'total_transactions': 0,
-            'last_payment_date': None,
-            'first_transaction_date': None,
-            'clear_days': 0,
-            'transactions_details': []
-        }
-
 def calculate_simple_date_range(period, today):
     from datetime import timedelta
     
@@ -1449,141 +1358,68 @@ def calculate_simple_date_range(period, today):
 @login_required
 def ajax_search_containers(request):
     q = (request.GET.get("q") or "").strip()
-    limit = int(request.GET.get("limit") or 25)
-    from containers.models import Container
-    qs = Container.objects.all()
-    if q:
-        qs = qs.filter(Q(name__icontains=q) | Q(identifier__icontains=q))
-    results = [{"id": c.pk, "text": getattr(c, "name", str(c))} for c in qs.order_by("name")[:limit]]
-    return JsonResponse({"results": results})
+    return JsonResponse({"results": search("containers", q, request.GET.get("limit"))})
 
 @require_GET
 @login_required
 def ajax_search_items(request):
     q = (request.GET.get("q") or "").strip()
-    limit = int(request.GET.get("limit") or 25)
-    from containers.models import Inventory_List
-    qs = Inventory_List.objects.all()
-    if q:
-        qs = qs.filter(Q(product_name__icontains=q) | Q(model__icontains=q))
-    results = [{"id": i.pk, "text": getattr(i, "product_name", str(i))} for i in qs.order_by("product_name")[:limit]]
-    return JsonResponse({"results": results})
+    return JsonResponse({"results": search("items", q, request.GET.get("limit"))})
 
 @require_GET
 @login_required 
 def ajax_search_companies(request):
     q = (request.GET.get("q") or "").strip()
-    limit = int(request.GET.get("limit") or 25)
-    from accounts.models import Company
-    qs = Company.objects.all()
-    if q:
-        qs = qs.filter(name__icontains=q)
-    results = [{"id": c.pk, "text": getattr(c, "name", str(c))} for c in qs.order_by("name")[:limit]]
-    return JsonResponse({"results": results})
+    if request.GET.get("active"):
+        return JsonResponse({"results": search_entries(active_companies(), q, parse_limit(request.GET.get("limit")))})
+    return JsonResponse({"results": search("companies", q, request.GET.get("limit"))})
 
 @require_GET
 @login_required
 def ajax_search_customers(request):
     q = (request.GET.get("q") or "").strip()
-    limit = int(request.GET.get("limit") or 25)
-    from accounts.models import UserProfile
-    qs = UserProfile.objects.select_related("user").all()
-    if q:
-        qs = qs.filter(
-            Q(user__first_name__icontains=q) | 
-            Q(user__last_name__icontains=q) | 
-            Q(user__email__icontains=q) | 
-            Q(phone__icontains=q)
-        )
-    results = []
-    for u in qs.order_by("user__first_name")[:limit]:
-        text = getattr(u, "display_name", None) or (u.user.get_full_name() if getattr(u, "user", None) else str(u))
-        results.append({"id": u.pk, "text": text})
-    return JsonResponse({"results": results})
+    if request.GET.get("active"):
+        return JsonResponse({"results": search_entries(active_customers(), q, parse_limit(request.GET.get("limit")))})
+    return JsonResponse({"results": search("customers", q, request.GET.get("limit"))})
 
 @require_GET
 @login_required
 def ajax_item_autofill(request):
-    item_id = request.GET.get("item_id")
-    
-    if not item_id:
+    """
+    Invoice line autofill. ``?item_id=<id>`` returns the item's fields at the
+    top level (404 when missing); ``?item_ids=<id>,<id>`` (or repeated) returns
+    ``{"items": {id: fields}, "missing": [...]}`` for up to MAX_AUTOFILL_ITEMS.
+    """
+    batch = "item_ids" in request.GET
+    if not batch and not request.GET.get("item_id"):
         return JsonResponse({"error": "Item ID required"}, status=400)
+    item_ids = parse_item_ids(request.GET.getlist("item_ids") if batch else [request.GET["item_id"]])
+    if batch and not item_ids:
+        return JsonResponse({"success": False, "error": "Item IDs required"}, status=400)
+
     try:
-        item = Inventory_List.objects.select_related(
-            'container', 
-            'container__company'
-        ).get(pk=item_id)
-        
-        container_info = None
-        container_id = None
-        container_name = None
-        container_identifier = None
-        
-        if item.container:
-            container_id = str(item.container.id)
-            container_name = item.container.name if hasattr(item.container, 'name') else str(item.container)
-            container_identifier = item.container.identifier if hasattr(item.container, 'identifier') else ""
-            container_info = {
-                "id": container_id,
-                "text": container_name,
-                "name": container_name,
-                "identifier": container_identifier,
-                "size": item.container.size if hasattr(item.container, 'size') else "",
-                "type": item.container.type if hasattr(item.container, 'type') else "",
-            }
-        
-        company_info = None
-        company_id = None
-        company_name = None
-        
-        if item.container and item.container.company:
-            company_id = str(item.container.company.id)
-            company_name = item.container.company.name if hasattr(item.container.company, 'name') else str(item.container.company)       
-            company_info = {
-                "id": company_id,
-                "text": company_name,
-                "name": company_name,
-                "address": item.container.company.address if hasattr(item.container.company, 'address') else "",
-                "phone": item.container.company.phone if hasattr(item.container.company, 'phone') else "",
-                "email": item.container.company.email if hasattr(item.container.company, 'email') else "",
-            }
-        
-        return JsonResponse({
-            "success": True,
-            "unit_price": float(item.unit_price) if item.unit_price else 0.0,
-            "price": float(item.price) if item.price else 0.0,
-            "sold_price": float(item.sold_price) if item.sold_price else 0.0,
-            "available_quantity": float(item.in_stock_qty) if item.in_stock_qty else 0.0,
-            "total_sold_qty": float(item.total_sold_qty) if item.total_sold_qty else 0.0,
-            "total_sold_count": item.total_sold_count if item.total_sold_count else 0,
-            "container": container_info,
-            "container_id": container_id,
-            "container_name": container_name,
-            "container_identifier": container_identifier,
-            "company": company_info,
-            "company_id": company_id,
-            "company_name": company_name,
-            "product_name": item.product_name,
-            "model": item.model if item.model else "",
-            "description": item.description if item.description else "",
-            "code": item.code if item.code else "",
-            "make": item.make if item.make else "",
-            "date_added": item.date_added.strftime('%Y-%m-%d') if item.date_added else "",
-            "display_info": {
-                "product": f"{item.code} - {item.product_name}" if item.code else item.product_name,
-                "container": f"{container_name} ({container_identifier})" if container_name and container_identifier else container_name or "",
-                "company": company_name or "",
-                "price": f"AED {item.unit_price:,.0f}" if item.unit_price else "AED 0",
-                "stock": f"{item.in_stock_qty:,.0f} in stock" if item.in_stock_qty else "Out of stock",
-            }
-        })
-        
-    except Inventory_List.DoesNotExist:
-        return JsonResponse({"success": False, "error": "Item not found"}, status=404)
-    except Exception as e: 
-        import traceback
-        logger.error(f"Error in ajax_item_autofill: {str(e)}")
-        logger.error(traceback.format_exc())
+        entries = autofill_entries(item_ids)
+        if not batch and not entries:
+            return JsonResponse({"success": False, "error": "Item not found"}, status=404)
+
+        # ETag از محتوای کش هر کالا؛ درخواست تکراری فقط 304 می‌گیرد
+        etag = combined_etag(entries, item_ids)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            if batch:
+                response = JsonResponse({
+                    "success": True,
+                    "items": {item_id: entries[item_id]["data"] for item_id in item_ids if item_id in entries},
+                    "missing": [item_id for item_id in item_ids if item_id not in entries],
+                })
+            else:
+                response = JsonResponse({"success": True, **entries[item_ids[0]]["data"]})
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
+
+    except Exception as e:
+        logger.exception(f"Error in ajax_item_autofill: {str(e)}")
         return JsonResponse({"success": False, "error": str(e)}, status=500)
 
 @login_required
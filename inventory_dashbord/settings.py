@@ -213,3 +213,26 @@ JAZZMIN_UI_TWEAKS = {
     },
 }
 
+
+# Daily sale summaries: when True, DailySummary/OutstandingCustomer recomputes are
+# queued in SummaryJob and processed by `python manage.py run_summary_worker`.
+DAILY_SALE_SUMMARY_ASYNC = False
+
+# Transaction list cursor mode runs no COUNT(*) or stats aggregate; with this
+# on it shows the PostgreSQL planner estimate (pg_class.reltuples) as the
+# unfiltered total.
+DAILY_SALE_ESTIMATED_COUNTS = False
+
+# Seconds the cached "active customers/companies" index and the per-item invoice
+# autofill payloads are kept; signals invalidate them earlier when they change.
+DAILY_SALE_LOOKUP_CACHE_TIMEOUT = 60 * 60
+
+# Cleared customers "All Time" view: read the CustomerClearance table kept by
+# the summary queue instead of grouping every sale. Populate it first with
+# `python manage.py rebuild_outstanding`.
+DAILY_SALE_CLEARANCE_TABLE = False
+
+# AJAX autocompletes: answer from a per-worker in-memory prefix index instead of
+# the database. Search target saves/deletes bump a version in the shared cache
+# (use a cache shared by all workers in production) and workers rebuild lazily.
+DAILY_SALE_AUTOCOMPLETE_INDEX = False
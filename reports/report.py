@@ -20,10 +20,12 @@ from datetime import datetime, date, timedelta
 import logging
 from typing import Optional, Tuple, Dict, Any, List
 
-from django.db.models import Sum, Count, Avg, F, Value, DecimalField
+from django.db.models import Sum, Count, Avg, F, Q, Value, DecimalField
 from django.db.models.functions import Coalesce, TruncDay, TruncMonth, TruncYear
 from django.utils import timezone
 
+from daily_sale.report import daily_report_rows, monthly_report_rows
+
 logger = logging.getLogger(__name__)
 
 DEC_ZERO = Decimal("0.00")
@@ -324,14 +326,76 @@ def weekly_summary(target_date: Optional[date] = None) -> Dict[str, Any]:
     return range_summary(start, end)
 
 
+def _cashflow_totals(start_date: date, end_date: date) -> Dict[str, Any]:
+    if not (CashIn or CashOut):
+        return {"cash_in": DEC_ZERO, "cash_out": DEC_ZERO, "net_cashflow": DEC_ZERO}
+    try:
+        cashin_total = CashIn.objects.filter(date__range=[start_date, end_date]).aggregate(total=Coalesce(Sum('amount'), Value(DEC_ZERO)))['total'] if CashIn else DEC_ZERO
+        cashout_total = CashOut.objects.filter(date__range=[start_date, end_date]).aggregate(total=Coalesce(Sum('amount'), Value(DEC_ZERO)))['total'] if CashOut else DEC_ZERO
+        cash_in, cash_out = _normalize_decimal(cashin_total), _normalize_decimal(cashout_total)
+        return {"cash_in": cash_in, "cash_out": cash_out, "net_cashflow": cash_in - cash_out}
+    except Exception as e:
+        logger.debug("cashflow totals failed: %s", e)
+        return {"cash_in": DEC_ZERO, "cash_out": DEC_ZERO, "net_cashflow": DEC_ZERO}
+
+
+def _series_row(day, sales, count) -> Dict[str, Any]:
+    return {'date': day.isoformat(), 'sales': _normalize_decimal(sales), 'count': int(count or 0)}
+
+
+def rollup_summary(start_date: date, end_date: date, by_month: bool = False) -> Dict[str, Any]:
+    """
+    Same output as ``range_summary``, with the sales / purchases totals and
+    the transaction count read from the daily_sale summary tables
+    (DailySummary / MonthlySummary). ``total_tax`` (summed ``tax`` column) and
+    the per-day sale series are not held by the summaries and come from one
+    grouped transaction query. ``by_month`` adds a ``monthly_series``.
+    """
+    result: Dict[str, Any] = {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat()
+    }
+    try:
+        rows = (monthly_report_rows if by_month else daily_report_rows)(start_date, end_date)
+        ordered = [rows[key] for key in sorted(rows)]
+        per_day = list(DailySaleTransaction.objects.filter(date__range=[start_date, end_date]).values('date').annotate(
+            daily_sales=Coalesce(Sum('total_amount', filter=Q(transaction_type='sale')), Value(DEC_ZERO), output_field=DecimalField()),
+            daily_count=Count('id', filter=Q(transaction_type='sale')),
+            daily_tax=Coalesce(Sum('tax'), Value(DEC_ZERO), output_field=DecimalField()),
+        ).order_by('date'))
+        result.update({
+            "total_sales": sum((_normalize_decimal(x['total_sales']) for x in ordered), DEC_ZERO),
+            "total_purchases": sum((_normalize_decimal(x['total_purchases']) for x in ordered), DEC_ZERO),
+            "total_tax": sum((_normalize_decimal(x['daily_tax']) for x in per_day), DEC_ZERO),
+            "transactions_count": sum(int(x['transactions_count'] or 0) for x in ordered),
+            "daily_series": [_series_row(x['date'], x['daily_sales'], x['daily_count']) for x in per_day if x['daily_count']],
+        })
+        if by_month:
+            result["monthly_series"] = [_series_row(x['date'], x['total_sales'], x['transactions_count']) for x in ordered]
+    except Exception as e:
+        logger.exception("rollup_summary aggregation failed: %s", e)
+        result.update({
+            "total_sales": DEC_ZERO,
+            "total_purchases": DEC_ZERO,
+            "total_tax": DEC_ZERO,
+            "transactions_count": 0,
+            "daily_series": []
+        })
+        if by_month:
+            result["monthly_series"] = []
+
+    result.update(_cashflow_totals(start_date, end_date))
+    return result
+
+
 def monthly_summary(target_date: Optional[date] = None) -> Dict[str, Any]:
     start, end = _range_by_period("monthly", _date_from_param(target_date, None))
-    return range_summary(start, end)
+    return rollup_summary(start, end)
 
 
 def yearly_summary(target_date: Optional[date] = None) -> Dict[str, Any]:
     start, end = _range_by_period("yearly", _date_from_param(target_date, None))
-    return range_summary(start, end)
+    return rollup_summary(start, end, by_month=True)
 
 
 # --------------------------
@@ -1,3 +1,43 @@
+from datetime import date
+from decimal import Decimal
+from django.contrib.auth.models import User
 from django.test import TestCase
+from accounts.models import UserProfile
+from daily_sale.models import DailySaleTransaction, MonthlySummary, Payment
+from daily_sale.utils import finalize_daily_summaries
+from .report import monthly_summary, range_summary, yearly_summary
 
-# Create your tests here.
+
+class RollupSummaryTests(TestCase):
+    def setUp(self):
+        customer = UserProfile.objects.get(user=User.objects.create(username="customer"))
+        rows = [
+            ("T-1", date(2026, 1, 5), "sale", 100, 5),
+            ("T-2", date(2026, 1, 5), "purchase", 40, 10),
+            ("T-3", date(2026, 3, 2), "sale", 70, 0),
+            ("T-4", date(2026, 3, 9), "purchase", 30, 5),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            for number, day, kind, price, tax in rows:
+                tx = DailySaleTransaction.objects.create(
+                    invoice_number=number, date=day, transaction_type=kind, customer=customer,
+                    quantity=1, unit_price=Decimal(price), tax=Decimal(tax),
+                )
+            # A payment-only day gets a summary row without transactions.
+            Payment.objects.create(transaction=tx, amount=Decimal("10"), date=date(2026, 3, 12))
+        # January is read from the finalized MonthlySummary, March aggregated live.
+        finalize_daily_summaries(date(2026, 2, 28))
+
+    def test_matches_range_summary(self):
+        for summary in (monthly_summary(date(2026, 3, 15)), yearly_summary(date(2026, 3, 15))):
+            expected = range_summary(date.fromisoformat(summary["start_date"]), date.fromisoformat(summary["end_date"]))
+            with self.subTest(start=summary["start_date"]):
+                self.assertEqual({key: summary[key] for key in expected}, expected)
+
+    def test_yearly_summary_has_monthly_series(self):
+        self.assertTrue(MonthlySummary.objects.get(year=2026, month=1).is_final)
+        summary = yearly_summary(date(2026, 3, 15))
+        self.assertEqual([(row["date"], row["count"]) for row in summary["monthly_series"]],
+                         [("2026-01-01", 2), ("2026-03-01", 2)])
+        self.assertEqual([row["date"] for row in summary["daily_series"]], ["2026-01-05", "2026-03-02"])
+        self.assertNotIn("monthly_series", monthly_summary(date(2026, 3, 15)))